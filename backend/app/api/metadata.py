@@ -2,11 +2,13 @@
 API endpoints for metadata
 """
 
-from fastapi import APIRouter, HTTPException, Path
+from fastapi import APIRouter, HTTPException, Path, Request
 import logging
 
 from ..models.specimen import ImageInfo, AtlasInfo, ModelInfo
 from ..services.tile_service import TileService
+from ..services.response_cache import file_version, response_cache
+from ..services.volume_reader import version_path
 from ..config import settings, get_specimen_config
 
 logger = logging.getLogger(__name__)
@@ -17,6 +19,7 @@ tile_service = TileService()
 
 @router.get("/specimens/{specimen_id}/image-info", response_model=ImageInfo)
 async def get_image_info(
+    request: Request,
     specimen_id: str = Path(..., description="Specimen ID")
 ):
     """Get image metadata information"""
@@ -26,8 +29,10 @@ async def get_image_info(
         raise HTTPException(status_code=404, detail=f"Specimen {specimen_id} not found")
     
     try:
-        info = tile_service.get_image_info(specimen_id)
-        return ImageInfo(**info)
+        key = ("image-info", specimen_id, file_version(version_path(settings.get_image_path(specimen_id))))
+        entry = await response_cache.get_or_build_async(
+            key, lambda: ImageInfo(**tile_service.get_image_info(specimen_id)))
+        return response_cache.respond(entry, request.headers)
         
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -37,6 +42,7 @@ async def get_image_info(
 
 @router.get("/specimens/{specimen_id}/atlas-info", response_model=AtlasInfo)
 async def get_atlas_info(
+    request: Request,
     specimen_id: str = Path(..., description="Specimen ID")
 ):
     """Get atlas metadata information"""
@@ -46,8 +52,11 @@ async def get_atlas_info(
         raise HTTPException(status_code=404, detail=f"Specimen {specimen_id} not found")
     
     try:
-        info = tile_service.get_atlas_info(specimen_id)
-        return AtlasInfo(**info)
+        key = ("atlas-info", specimen_id, file_version(version_path(settings.get_atlas_path(specimen_id))),
+               file_version(settings.get_regions_file()))
+        entry = await response_cache.get_or_build_async(
+            key, lambda: AtlasInfo(**tile_service.get_atlas_info(specimen_id)))
+        return response_cache.respond(entry, request.headers)
         
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -96,6 +105,7 @@ async def get_model_info(
 
 @router.get("/specimens/{specimen_id}/metadata")
 async def get_complete_metadata(
+    request: Request,
     specimen_id: str = Path(..., description="Specimen ID")
 ):
     """Get complete metadata for a specimen"""
@@ -106,50 +116,71 @@ async def get_complete_metadata(
         raise HTTPException(status_code=404, detail=f"Specimen {specimen_id} not found")
     
     try:
-        metadata = {
-            "specimen": specimen_config,
-            "image": None,
-            "atlas": None,
-            "model": None
-        }
-        
-        # Get image info if available
-        if specimen_config.get("has_image", False):
-            try:
-                image_info = tile_service.get_image_info(specimen_id)
-                metadata["image"] = image_info
-            except Exception as e:
-                logger.warning(f"Could not get image info: {e}")
-        
-        # Get atlas info if available
-        if specimen_config.get("has_atlas", False):
-            try:
-                atlas_info = tile_service.get_atlas_info(specimen_id)
-                metadata["atlas"] = atlas_info
-            except Exception as e:
-                logger.warning(f"Could not get atlas info: {e}")
-        
-        # Get model info if available
-        if specimen_config.get("has_model", False):
-            try:
-                model_path = settings.get_model_path(specimen_id)
-                if model_path.exists():
-                    file_size = model_path.stat().st_size
-                    metadata["model"] = {
-                        "specimen_id": specimen_id,
-                        "file_path": str(model_path),
-                        "scale_factor": settings.mesh_scale_factor,
-                        "file_size": file_size
-                    }
-            except Exception as e:
-                logger.warning(f"Could not get model info: {e}")
-        
-        return metadata
+        key = ("metadata", specimen_id,
+               *(file_version(version_path(path))
+                 for path in (settings.get_image_path(specimen_id),
+                              settings.get_atlas_path(specimen_id),
+                              settings.get_model_path(specimen_id),
+                              settings.get_regions_file())))
+        # Not cached if a section the specimen has failed, it may work next time
+        failed = []
+        entry = await response_cache.get_or_build_async(
+            key, lambda: _complete_metadata(specimen_id, specimen_config, failed),
+            cacheable=lambda: not failed)
+        return response_cache.respond(entry, request.headers)
         
     except Exception as e:
         logger.error(f"Failed to get complete metadata: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve metadata")
 
+def _complete_metadata(specimen_id: str, specimen_config: dict, failed: list) -> dict:
+    """Image, atlas and model information of a specimen, None for those unavailable
+
+    Sections that could not be read are appended to failed.
+    """
+    metadata = {
+        "specimen": specimen_config,
+        "image": None,
+        "atlas": None,
+        "model": None
+    }
+    
+    # Get image info if available
+    if specimen_config.get("has_image", False):
+        try:
+            image_info = tile_service.get_image_info(specimen_id)
+            metadata["image"] = image_info
+        except Exception as e:
+            logger.warning(f"Could not get image info: {e}")
+            failed.append("image")
+    
+    # Get atlas info if available
+    if specimen_config.get("has_atlas", False):
+        try:
+            atlas_info = tile_service.get_atlas_info(specimen_id)
+            metadata["atlas"] = atlas_info
+        except Exception as e:
+            logger.warning(f"Could not get atlas info: {e}")
+            failed.append("atlas")
+    
+    # Get model info if available
+    if specimen_config.get("has_model", False):
+        try:
+            model_path = settings.get_model_path(specimen_id)
+            if model_path.exists():
+                file_size = model_path.stat().st_size
+                metadata["model"] = {
+                    "specimen_id": specimen_id,
+                    "file_path": str(model_path),
+                    "scale_factor": settings.mesh_scale_factor,
+                    "file_size": file_size
+                }
+        except Exception as e:
+            logger.warning(f"Could not get model info: {e}")
+            failed.append("model")
+    
+    return metadata
+
 @router.get("/specimens/{specimen_id}/config-info")
 async def get_config_info(
     specimen_id: str = Path(..., description="Specimen ID")
@@ -2,9 +2,8 @@
 API endpoints for brain regions
 """
 
-import json
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Query, Path
+from fastapi import APIRouter, HTTPException, Query, Path, Request
 import logging
 
 from ..models.region import (
@@ -13,6 +12,8 @@ from ..models.region import (
 )
 from ..models.specimen import ViewType
 from ..services.tile_service import TileService
+from ..services.region_service import get_region_search_index, load_region_hierarchy
+from ..services.response_cache import file_version, response_cache
 from ..config import settings, get_specimen_config
 
 logger = logging.getLogger(__name__)
@@ -21,48 +22,9 @@ router = APIRouter()
 # Initialize services
 tile_service = TileService()
 
-# Cache for region data
-_region_cache = None
-
-def load_region_hierarchy() -> RegionHierarchy:
-    """Load region hierarchy from JSON file"""
-    global _region_cache
-    
-    if _region_cache is None:
-        regions_file = settings.get_regions_file()
-        
-        if not regions_file.exists():
-            raise FileNotFoundError(f"Regions file not found: {regions_file}")
-        
-        try:
-            with open(regions_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # Convert region data to Region objects
-            regions = [Region(**region) for region in data['regions']]
-            
-            # Convert region_lookup values to Region objects
-            region_lookup = {
-                str(k): Region(**v) for k, v in data['region_lookup'].items()
-            }
-            
-            _region_cache = RegionHierarchy(
-                metadata=data['metadata'],
-                regions=regions,
-                hierarchy=data['hierarchy'],
-                region_lookup=region_lookup
-            )
-            
-            logger.info(f"Loaded {len(regions)} brain regions")
-            
-        except Exception as e:
-            logger.error(f"Failed to load regions: {e}")
-            raise
-    
-    return _region_cache
-
 @router.get("/specimens/{specimen_id}/regions", response_model=RegionResponse)
 async def get_regions(
+    request: Request,
     specimen_id: str = Path(..., description="Specimen ID"),
     level: Optional[int] = Query(None, ge=1, le=4, description="Hierarchy level (1-4)"),
     search: Optional[str] = Query(None, description="Search query for region names"),
@@ -76,13 +38,23 @@ async def get_regions(
         raise HTTPException(status_code=404, detail=f"Specimen {specimen_id} not found")
     
     try:
+        # Version taken before loading, so a concurrent rewrite is never cached as current
+        regions_version = file_version(settings.get_regions_file())
         hierarchy = load_region_hierarchy()
         
+        if not (search or level or parent_id):
+            # Unfiltered listing is the same for every request
+            entry = response_cache.get_or_build(
+                ("regions", max_results, regions_version),
+                lambda: _region_response(hierarchy, hierarchy.regions, max_results))
+            return response_cache.respond(entry, request.headers)
+        
         # Apply filters
         filtered_regions = hierarchy.regions
         
         if search:
-            filtered_regions = hierarchy.search_regions(search)
+            # Same ranked matches as /regions/search, all of them so the filters below see every one
+            filtered_regions = get_region_search_index().search(search, limit=len(hierarchy.regions))
         
         if level:
             level_regions = hierarchy.get_regions_by_level(level)
@@ -94,37 +66,55 @@ async def get_regions(
                 filtered_regions = level_regions
         
         if parent_id:
-            # Filter by parent (this would need to be implemented based on hierarchy structure)
-            pass
-        
-        # Limit results
-        total_count = len(hierarchy.regions)
-        filtered_count = len(filtered_regions)
-        
-        if len(filtered_regions) > max_results:
-            filtered_regions = filtered_regions[:max_results]
-        
-        # Generate statistics
-        stats = RegionStatistics(
-            total_regions=total_count,
-            regions_by_level={
-                f"level_{i}": len(hierarchy.get_regions_by_level(i)) 
-                for i in range(1, 5)
-            },
-            hierarchy_depth=4
-        )
+            child_ids = {r.id for r in hierarchy.get_children(parent_id)}
+            filtered_regions = [r for r in filtered_regions if r.id in child_ids]
         
-        return RegionResponse(
-            regions=filtered_regions,
-            total_count=total_count,
-            filtered_count=filtered_count,
-            statistics=stats
-        )
+        return _region_response(hierarchy, filtered_regions, max_results)
         
     except Exception as e:
         logger.error(f"Failed to get regions: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve regions")
 
+def _region_response(hierarchy: RegionHierarchy, filtered_regions: List[Region],
+                     max_results: int) -> RegionResponse:
+    """Region listing limited to max_results, with the load time statistics"""
+    return RegionResponse(
+        regions=filtered_regions[:max_results],
+        total_count=len(hierarchy.regions),
+        filtered_count=len(filtered_regions),
+        statistics=hierarchy.get_statistics()
+    )
+
+# Declared before /regions/{region_id}, which would otherwise capture "search"
+@router.get("/specimens/{specimen_id}/regions/search")
+async def search_regions(
+    specimen_id: str = Path(..., description="Specimen ID"),
+    q: str = Query(..., min_length=1, description="Search query"),
+    max_results: int = Query(50, ge=1, le=200, description="Maximum results")
+):
+    """Search brain regions by name, abbreviation or Chinese name
+    
+    Results are ranked: exact matches, then prefixes, word prefixes,
+    substrings and finally near matches tolerating typos.
+    """
+    
+    # Verify specimen exists
+    if not get_specimen_config(specimen_id):
+        raise HTTPException(status_code=404, detail=f"Specimen {specimen_id} not found")
+    
+    try:
+        matching_regions = get_region_search_index().search(q, limit=max_results)
+        
+        return {
+            "query": q,
+            "results": matching_regions,
+            "total_matches": len(matching_regions)
+        }
+        
+    except Exception as e:
+        logger.error(f"Failed to search regions: {e}")
+        raise HTTPException(status_code=500, detail="Failed to search regions")
+
 @router.get("/specimens/{specimen_id}/regions/{region_id}", response_model=Region)
 async def get_region(
     specimen_id: str = Path(..., description="Specimen ID"),
@@ -197,6 +187,7 @@ async def pick_region(
 
 @router.get("/specimens/{specimen_id}/regions-hierarchy")
 async def get_region_hierarchy(
+    request: Request,
     specimen_id: str = Path(..., description="Specimen ID")
 ):
     """Get complete region hierarchy structure"""
@@ -206,49 +197,19 @@ async def get_region_hierarchy(
         raise HTTPException(status_code=404, detail=f"Specimen {specimen_id} not found")
     
     try:
+        key = ("regions-hierarchy", file_version(settings.get_regions_file()))
         hierarchy = load_region_hierarchy()
-        return {
+        statistics = hierarchy.get_statistics()
+        entry = response_cache.get_or_build(key, lambda: {
             "metadata": hierarchy.metadata,
             "hierarchy": hierarchy.hierarchy,
             "statistics": {
-                "total_regions": len(hierarchy.regions),
-                "regions_by_level": {
-                    f"level_{i}": len(hierarchy.get_regions_by_level(i)) 
-                    for i in range(1, 5)
-                }
+                "total_regions": statistics.total_regions,
+                "regions_by_level": statistics.regions_by_level
             }
-        }
+        })
+        return response_cache.respond(entry, request.headers)
         
     except Exception as e:
         logger.error(f"Failed to get hierarchy: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve hierarchy")
-
-@router.get("/specimens/{specimen_id}/regions/search")
-async def search_regions(
-    specimen_id: str = Path(..., description="Specimen ID"),
-    q: str = Query(..., min_length=1, description="Search query"),
-    max_results: int = Query(50, ge=1, le=200, description="Maximum results")
-):
-    """Search brain regions by name or abbreviation"""
-    
-    # Verify specimen exists
-    if not get_specimen_config(specimen_id):
-        raise HTTPException(status_code=404, detail=f"Specimen {specimen_id} not found")
-    
-    try:
-        hierarchy = load_region_hierarchy()
-        matching_regions = hierarchy.search_regions(q)
-        
-        # Limit results
-        if len(matching_regions) > max_results:
-            matching_regions = matching_regions[:max_results]
-        
-        return {
-            "query": q,
-            "results": matching_regions,
-            "total_matches": len(matching_regions)
-        }
-        
-    except Exception as e:
-        logger.error(f"Failed to search regions: {e}")
-        raise HTTPException(status_code=500, detail="Failed to search regions")
@@ -0,0 +1,34 @@
+"""
+API endpoints for runtime cache and pool statistics
+"""
+
+from fastapi import APIRouter
+
+from . import tiles
+from ..services.chunk_cache import chunk_cache, slab_cache
+from ..services.handler_pool import handler_pool
+from ..services.prefetch import prefetcher
+from ..services.render_pool import render_pool_stats
+from ..services.response_cache import response_cache
+from ..services.tile_archive import tile_archives
+from ..services.tile_cache import tile_cache
+from ..services.tile_executor import tile_executor
+
+router = APIRouter()
+
+@router.get("/stats")
+async def get_stats():
+    """Get counters of the file handle pool, data caches, tile archives, prefetcher, request coalescing, the tile executor and renderer processes"""
+    return {
+        "handler_pool": handler_pool.stats(),
+        "chunk_cache": chunk_cache.stats() if chunk_cache else None,
+        "slab_cache": slab_cache.stats() if slab_cache else None,
+        "tile_cache": tile_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "tile_archives": tile_archives.stats(),
+        "prefetch": prefetcher.stats(),
+        "tile_flights": tiles.tile_flights.stats(),
+        "tile_batcher": tiles.tile_batcher.stats(),
+        "tile_executor": tile_executor.stats(),
+        "render_pool": render_pool_stats(),
+    }
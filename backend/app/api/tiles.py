@@ -2,16 +2,30 @@
 API endpoints for image tiles
 """
 
-from typing import Optional
-from fastapi import APIRouter, HTTPException, Query, Path
-from fastapi.responses import Response
+import asyncio
+import json
+import struct
+from collections import defaultdict
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, Header, HTTPException, Query, Path, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.concurrency import run_in_threadpool
 import logging
 import time
+from functools import partial
 
-from ..models.specimen import ViewType
+from ..models.specimen import BatchTileDescriptor, TileBatchRequest, TileKind, ViewType
 from ..services.tile_service import TileService
-from ..config import get_specimen_config
+from ..services.tile_cache import tile_cache
+from ..services.tile_archive import ArchiveTileResponse, tile_archives
+from ..services.prefetch import prefetcher
+from ..services.coalesce import MicroBatcher, SingleFlight
+from ..services.render_pool import run_extraction
+from ..services.tile_executor import PRIORITY_BATCH, PRIORITY_VIEWPORT, TileQueueFull, tile_executor
+from ..services.encoders import MEDIA_TYPES, negotiate_format
+from ..services.intensity import RenderParams, TRANSFER_FUNCTIONS
+from ..services.region_service import OVERLAY_MODES
+from ..config import get_specimen_config, settings
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -19,8 +33,38 @@ router = APIRouter()
 # Initialize tile service
 tile_service = TileService()
 
+# Output formats per tile kind; atlas labels only get lossless formats
+IMAGE_TILE_FORMATS = ("jpeg", "png", "webp", "avif")
+ATLAS_TILE_FORMATS = ("png", "webp")
+
+async def _archived_tile(kind: TileKind, specimen_id: str, view: ViewType, level: int,
+                         z: int, y: int, x: int, channel: int, tile_size: Optional[int],
+                         tile_format: str) -> Optional[memoryview]:
+    """Tile from the specimen's tile archive, None if it is not archived"""
+    if not settings.tile_archives or tile_size not in (None, tile_service.default_tile_size):
+        return None
+    return await tile_archives.lookup_async(specimen_id, tile_service, kind.value, view, level,
+                                            z, y, x, channel, tile_format)
+
+def _viewer_id(request: Request) -> Optional[str]:
+    """Viewer a tile request comes from, keying its prefetch stream
+    
+    The X-Viewer-Id header if the client sends one, else the client address:
+    the first X-Forwarded-For address when the peer is a trusted proxy (see
+    settings.forwarded_allow_ips), the peer address otherwise.
+    """
+    viewer = request.headers.get("x-viewer-id")
+    if viewer:
+        return "viewer:" + viewer
+    peer = request.client.host if request.client else None
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded and ("*" in settings.forwarded_allow_ips or peer in settings.forwarded_allow_ips):
+        return forwarded.split(",")[0].strip()
+    return peer
+
 @router.get("/specimens/{specimen_id}/image/{view}/{level}/{z}/{y}/{x}")
 async def get_image_tile(
+    request: Request,
     specimen_id: str = Path(..., description="Specimen ID"),
     view: ViewType = Path(..., description="View type (sagittal, coronal, horizontal)"),
     level: int = Path(..., ge=0, le=99, description="Resolution level (e.g. 0-7)"),
@@ -28,12 +72,30 @@ async def get_image_tile(
     y: int = Path(..., ge=0, description="Y coordinate (pixel position)"),
     x: int = Path(..., ge=0, description="X coordinate (pixel position)"),
     channel: int = Query(0, ge=0, le=999, description="Channel (e.g. 0-3)"),
-    tile_size: Optional[int] = Query(None, ge=8, le=65536, description="Tile size")
+    tile_size: Optional[int] = Query(None, ge=8, le=65536, description="Tile size"),
+    format: Optional[str] = Query(None, description="Output format (jpeg, png, webp, avif)"),
+    min_value: Optional[float] = Query(None, alias="min", description="Intensity shown as black"),
+    max_value: Optional[float] = Query(None, alias="max", description="Intensity shown as white"),
+    gamma: Optional[float] = Query(None, gt=0, le=10, description="Gamma applied after the transfer function"),
+    transfer: Optional[str] = Query(None, description=f"Transfer function ({', '.join(TRANSFER_FUNCTIONS)})"),
+    overlay: Optional[str] = Query(None, description=f"Atlas region overlay ({', '.join(OVERLAY_MODES)})"),
+    overlay_alpha: float = Query(0.4, ge=0, le=1, description="Opacity of the region overlay"),
+    accept: Optional[str] = Header(None)
 ):
     """Get image tile for specified pixel coordinates and parameters
     
     Coordinates (z,y,x) specify the origin (top-left corner) of the tile in 3D volume.
     tile_size: size of the extracted square tile (defaults to 512)
+    format: output format; without it, lossy WebP (or AVIF if enabled) is sent
+    to clients whose Accept header lists it, JPEG otherwise
+    min, max, gamma, transfer: display mapping; omitted values default to the
+    channel window (see image-info intensity_windows) and server settings
+    overlay: blend atlas region colours ("fill") or outlines ("boundary") over
+    the tile, weighted by overlay_alpha; the tile is then RGB
+    
+    The neighbouring slices and tiles are then rendered ahead in the
+    background (see services/prefetch.py), per viewer: clients sharing an
+    address can tell their viewers apart with an X-Viewer-Id header.
     """
     
     # Verify specimen exists
@@ -42,27 +104,68 @@ async def get_image_tile(
     
     try:
         t0 = time.perf_counter()
-        # Extract tile (offload blocking work to threadpool to avoid blocking event loop)
-        tile_bytes = await run_in_threadpool(
-            tile_service.extract_image_tile,
-            specimen_id=specimen_id,
-            view=view,
-            level=level,
-            channel=channel,
-            z=z,
-            y=y,
-            x=x,
-            tile_size=tile_size
-        )
+        tile_format = negotiate_format(accept, format, "jpeg",
+                                       settings.negotiated_tile_formats, IMAGE_TILE_FORMATS)
+        render = RenderParams(low=min_value, high=max_value, gamma=gamma, transfer=transfer)
+        tile_bytes = None
+        if render.is_default() and overlay is None:
+            tile_bytes = await _archived_tile(TileKind.IMAGE, specimen_id, view, level, z, y, x,
+                                              channel, tile_size, tile_format)
+        cache_status = "ARCHIVE"
+        if tile_bytes is None:
+            cache_key = tile_service.image_tile_key(
+                specimen_id, view, level, channel, z, y, x, tile_size, tile_format, render,
+                overlay, overlay_alpha)
+            tile_bytes = await tile_cache.get(cache_key)
+            cache_status = "HIT" if tile_bytes is not None else "MISS"
+        if tile_bytes is None:
+            # Extract tile in the tile executor to avoid blocking the event loop;
+            # identical requests in flight share one extraction
+            if overlay is None:
+                tile = BatchTileDescriptor(view=view, level=level, z=z, y=y, x=x,
+                                           channel=channel, tile_size=tile_size)
+                extract = partial(tile_batcher.submit, specimen_id, (tile, tile_format, render))
+            else:
+                extract = partial(
+                    tile_executor.run,
+                    run_extraction,
+                    tile_service,
+                    "extract_image_tile",
+                    specimen_id=specimen_id,
+                    view=view,
+                    level=level,
+                    channel=channel,
+                    z=z,
+                    y=y,
+                    x=x,
+                    tile_size=tile_size,
+                    format=tile_format,
+                    render=render,
+                    overlay=overlay,
+                    overlay_alpha=overlay_alpha,
+                    priority=PRIORITY_VIEWPORT
+                )
+            tile_bytes, shared = await _until_disconnected(
+                request, tile_flights.run(cache_key, partial(_extract_and_cache, cache_key, extract)))
+            cache_status = "SHARED" if shared else "MISS"
+        elif cache_status == "HIT":
+            prefetcher.record_hit(cache_key)
+        if cache_status != "ARCHIVE":
+            prefetcher.schedule(tile_service, tile_cache, (_viewer_id(request), specimen_id, view),
+                                specimen_id, view, level, channel, z, y, x, tile_size, tile_format,
+                                render, overlay, overlay_alpha, flights=tile_flights)
         dt_ms = (time.perf_counter() - t0) * 1000.0
         
-        # Return image response
-        return Response(
+        # Return image response; archived tiles are sent straight from the map
+        response_class = ArchiveTileResponse if cache_status == "ARCHIVE" else Response
+        return response_class(
             content=tile_bytes,
-            media_type="image/jpeg",
+            media_type=MEDIA_TYPES[tile_format],
             headers={
                 "Cache-Control": "public, max-age=3600",  # Cache for 1 hour
+                "Vary": "Accept",
                 "X-Tile-Info": f"{specimen_id}/{view}/{level}/{z}/{y}/{x}/ch{channel}",
+                "X-Cache": cache_status,
                 "X-Backend-Time": f"{dt_ms:.3f}",
                 "Server-Timing": f"backend;dur={dt_ms:.3f}"
             }
@@ -79,19 +182,158 @@ async def get_image_tile(
     except ValueError as e:
         # e.g. invalid view type
         raise HTTPException(status_code=400, detail=str(e))
+    except _ClientDisconnected:
+        return Response(status_code=499)
+    except TileQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(e.retry_after)})
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to extract image tile: {e}")
         raise HTTPException(status_code=500, detail="Failed to extract tile")
 
+def _parse_list(value: Optional[str], cast, name: str, count: int) -> Optional[list]:
+    """Parse a comma separated per-channel parameter, empty entries become None"""
+    if value is None:
+        return None
+    items = [item.strip() for item in value.split(",")]
+    if len(items) != count:
+        raise ValueError(f"Expected {count} comma separated values for {name}, got {len(items)}")
+    try:
+        return [cast(item) if item else None for item in items]
+    except ValueError:
+        raise ValueError(f"Invalid value in {name}: {value}")
+
+@router.get("/specimens/{specimen_id}/composite/{view}/{level}/{z}/{y}/{x}")
+async def get_composite_tile(
+    request: Request,
+    specimen_id: str = Path(..., description="Specimen ID"),
+    view: ViewType = Path(..., description="View type (sagittal, coronal, horizontal)"),
+    level: int = Path(..., ge=0, le=99, description="Resolution level (e.g. 0-7)"),
+    z: int = Path(..., ge=0, description="Z coordinate (pixel position)"),
+    y: int = Path(..., ge=0, description="Y coordinate (pixel position)"),
+    x: int = Path(..., ge=0, description="X coordinate (pixel position)"),
+    channels: Optional[str] = Query(None, description="Comma separated channels (default: all)"),
+    colors: Optional[str] = Query(None, description="Comma separated RRGGBB colour per channel"),
+    min_value: Optional[str] = Query(None, alias="min", description="Comma separated black level per channel"),
+    max_value: Optional[str] = Query(None, alias="max", description="Comma separated white level per channel"),
+    gamma: Optional[str] = Query(None, description="Comma separated gamma per channel"),
+    transfer: Optional[str] = Query(None, description=f"Transfer function for all channels ({', '.join(TRANSFER_FUNCTIONS)})"),
+    tile_size: Optional[int] = Query(None, ge=8, le=65536, description="Tile size"),
+    format: Optional[str] = Query(None, description="Output format (jpeg, png, webp, avif)"),
+    accept: Optional[str] = Header(None)
+):
+    """Get an RGB tile blending several channels for specified pixel coordinates
+    
+    Every channel is read for the same hyperslab, mapped through its
+    intensity window (defaults as in get_image_tile), tinted by its colour
+    and added, then encoded once. Per-channel parameters are comma separated
+    lists in channel order; leave an entry empty to keep its default, e.g.
+    channels=0,2&min=100,&max=2000,3000
+    """
+    
+    # Verify specimen exists
+    if not get_specimen_config(specimen_id):
+        raise HTTPException(status_code=404, detail=f"Specimen {specimen_id} not found")
+    
+    try:
+        t0 = time.perf_counter()
+        tile_format = negotiate_format(accept, format, "jpeg",
+                                       settings.negotiated_tile_formats, IMAGE_TILE_FORMATS)
+        if channels is None:
+            channel_list = await run_in_threadpool(tile_service.get_image_channels, specimen_id)
+        else:
+            channel_list = _parse_list(channels, int, "channels", len(channels.split(",")))
+            if None in channel_list:
+                raise ValueError(f"Invalid channels: {channels}")
+        n = len(channel_list)
+        color_list = _parse_list(colors, str, "colors", n)
+        if color_list is not None:
+            defaults = [settings.default_channel_colors.get(str(c), "ffffff") for c in channel_list]
+            color_list = [c or d for c, d in zip(color_list, defaults)]
+        lows = _parse_list(min_value, float, "min", n) or [None] * n
+        highs = _parse_list(max_value, float, "max", n) or [None] * n
+        gammas = _parse_list(gamma, float, "gamma", n) or [None] * n
+        renders = [RenderParams(low=lo, high=hi, gamma=g, transfer=transfer)
+                   for lo, hi, g in zip(lows, highs, gammas)]
+        
+        cache_key = tile_service.composite_tile_key(
+            specimen_id, view, level, channel_list, z, y, x, tile_size, tile_format,
+            color_list, renders)
+        tile_bytes = await tile_cache.get(cache_key)
+        cache_status = "HIT" if tile_bytes is not None else "MISS"
+        if tile_bytes is None:
+            extract = partial(
+                tile_executor.run,
+                run_extraction,
+                tile_service,
+                "extract_composite_tile",
+                specimen_id=specimen_id,
+                view=view,
+                level=level,
+                channels=channel_list,
+                z=z,
+                y=y,
+                x=x,
+                tile_size=tile_size,
+                format=tile_format,
+                colors=color_list,
+                renders=renders,
+                priority=PRIORITY_VIEWPORT
+            )
+            tile_bytes, shared = await _until_disconnected(
+                request, tile_flights.run(cache_key, partial(_extract_and_cache, cache_key, extract)))
+            cache_status = "SHARED" if shared else "MISS"
+        dt_ms = (time.perf_counter() - t0) * 1000.0
+        
+        return Response(
+            content=tile_bytes,
+            media_type=MEDIA_TYPES[tile_format],
+            headers={
+                "Cache-Control": "public, max-age=3600",  # Cache for 1 hour
+                "Vary": "Accept",
+                "X-Tile-Info": f"{specimen_id}/{view}/{level}/{z}/{y}/{x}/ch{','.join(map(str, channel_list))}",
+                "X-Cache": cache_status,
+                "X-Backend-Time": f"{dt_ms:.3f}",
+                "Server-Timing": f"backend;dur={dt_ms:.3f}"
+            }
+        )
+        
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except KeyError as e:
+        # e.g. level or channel not exist
+        raise HTTPException(status_code=422, detail=str(e))
+    except IndexError as e:
+        # e.g. z/y/x coordinate out of bounds
+        raise HTTPException(status_code=422, detail=str(e))
+    except ValueError as e:
+        # e.g. malformed channel list or colour
+        raise HTTPException(status_code=400, detail=str(e))
+    except _ClientDisconnected:
+        return Response(status_code=499)
+    except TileQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(e.retry_after)})
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to extract composite tile: {e}")
+        raise HTTPException(status_code=500, detail="Failed to extract composite tile")
+
 @router.get("/specimens/{specimen_id}/atlas/{view}/{level}/{z}/{y}/{x}")
 async def get_atlas_tile(
+    request: Request,
     specimen_id: str = Path(..., description="Specimen ID"),
     view: ViewType = Path(..., description="View type (sagittal, coronal, horizontal)"),
     level: int = Path(..., ge=0, le=99, description="Resolution level (0-7)"),
     z: int = Path(..., ge=0, description="Z coordinate (pixel position)"),
     y: int = Path(..., ge=0, description="Y coordinate (pixel position)"),
     x: int = Path(..., ge=0, description="X coordinate (pixel position)"),
-    tile_size: Optional[int] = Query(None, ge=8, le=65536, description="Tile size")
+    tile_size: Optional[int] = Query(None, ge=8, le=65536, description="Tile size"),
+    format: Optional[str] = Query(None, description="Output format (png, webp)"),
+    accept: Optional[str] = Header(None)
 ):
     """Get atlas mask tile for specified pixel coordinates
     
@@ -100,6 +342,8 @@ async def get_atlas_tile(
     - y: pixel Y coordinate (row) within the slice  
     - x: pixel X coordinate (column) within the slice
     - tile_size: size of the extracted square tile (defaults to 512)
+    - format: output format; without it, lossless WebP is sent to clients
+      whose Accept header lists it, PNG otherwise
     
     The tile is extracted starting from origin coordinates (z,y,x) with the specified tile_size.
     """
@@ -110,26 +354,36 @@ async def get_atlas_tile(
     
     try:
         t0 = time.perf_counter()
-        # Extract atlas tile (offload blocking work to threadpool)
-        tile_bytes = await run_in_threadpool(
-            tile_service.extract_atlas_tile,
-            specimen_id=specimen_id,
-            view=view,
-            level=level,
-            z=z,
-            y=y,
-            x=x,
-            tile_size=tile_size
-        )
+        tile_format = negotiate_format(accept, format, "png",
+                                       settings.negotiated_tile_formats, ATLAS_TILE_FORMATS)
+        tile_bytes = await _archived_tile(TileKind.ATLAS, specimen_id, view, level, z, y, x,
+                                          0, tile_size, tile_format)
+        cache_status = "ARCHIVE"
+        if tile_bytes is None:
+            cache_key = tile_service.atlas_tile_key(specimen_id, view, level, z, y, x,
+                                                    tile_size, tile_format)
+            tile_bytes = await tile_cache.get(cache_key)
+            cache_status = "HIT" if tile_bytes is not None else "MISS"
+        if tile_bytes is None:
+            # Extract atlas tile in the tile executor, shared by identical requests
+            tile = BatchTileDescriptor(kind=TileKind.ATLAS, view=view, level=level,
+                                       z=z, y=y, x=x, tile_size=tile_size)
+            extract = partial(tile_batcher.submit, specimen_id, (tile, tile_format, None))
+            tile_bytes, shared = await _until_disconnected(
+                request, tile_flights.run(cache_key, partial(_extract_and_cache, cache_key, extract)))
+            cache_status = "SHARED" if shared else "MISS"
         dt_ms = (time.perf_counter() - t0) * 1000.0
         
-        # Return PNG response (lossless for atlas data)
-        return Response(
+        # Return lossless response for atlas data
+        response_class = ArchiveTileResponse if cache_status == "ARCHIVE" else Response
+        return response_class(
             content=tile_bytes,
-            media_type="image/png",
+            media_type=MEDIA_TYPES[tile_format],
             headers={
                 "Cache-Control": "public, max-age=3600",  # Cache for 1 hour
+                "Vary": "Accept",
                 "X-Atlas-Info": f"{specimen_id}/{view}/{level}/{z}/{y}/{x}",
+                "X-Cache": cache_status,
                 "X-Backend-Time": f"{dt_ms:.3f}",
                 "Server-Timing": f"backend;dur={dt_ms:.3f}"
             }
@@ -146,10 +400,262 @@ async def get_atlas_tile(
     except ValueError as e:
         # e.g. invalid view type
         raise HTTPException(status_code=400, detail=str(e))
+    except _ClientDisconnected:
+        return Response(status_code=499)
+    except TileQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(e.retry_after)})
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to extract atlas tile: {e}")
         raise HTTPException(status_code=500, detail="Failed to extract atlas tile")
 
+# Batch responses are a sequence of frames, one per tile in completion order:
+#   uint32 big-endian header length, JSON header,
+#   uint32 big-endian body length, body (encoded tile, empty on error)
+# The header has "index" (position in the request), "status" and either
+# "content_type" and "cache", or "detail" for failed tiles.
+BATCH_MEDIA_TYPE = "application/vnd.visor.tile-batch"
+_FRAME_LENGTH = struct.Struct(">I")
+
+
+def _batch_frame(header: dict, body: bytes = b"") -> bytes:
+    meta = json.dumps(header).encode()
+    return b"".join((_FRAME_LENGTH.pack(len(meta)), meta, _FRAME_LENGTH.pack(len(body)), body))
+
+
+def _error_frame(index: int, e: Exception) -> bytes:
+    """Frame for a failed tile, with the status the single tile endpoints use"""
+    if isinstance(e, FileNotFoundError):
+        status = 404
+    elif isinstance(e, (KeyError, IndexError)):
+        status = 422
+    elif isinstance(e, ValueError):
+        status = 400
+    elif isinstance(e, TileQueueFull):
+        status = 503
+    elif isinstance(e, TimeoutError):
+        status = 504
+    else:
+        logger.error(f"Failed to extract batch tile: {e}")
+        return _batch_frame({"index": index, "status": 500, "detail": "Failed to extract tile"})
+    return _batch_frame({"index": index, "status": status, "detail": str(e)})
+
+
+def _prepare_batch_tile(specimen_id: str, tile: BatchTileDescriptor,
+                        accept: Optional[str]) -> Tuple[str, Optional[RenderParams], str]:
+    """Negotiated format, rendering parameters and cache key of a batch tile"""
+    if tile.kind == TileKind.ATLAS:
+        tile_format = negotiate_format(accept, tile.format, "png",
+                                       settings.negotiated_tile_formats, ATLAS_TILE_FORMATS)
+        key = tile_service.atlas_tile_key(specimen_id, tile.view, tile.level,
+                                          tile.z, tile.y, tile.x, tile.tile_size, tile_format)
+        return tile_format, None, key
+    tile_format = negotiate_format(accept, tile.format, "jpeg",
+                                   settings.negotiated_tile_formats, IMAGE_TILE_FORMATS)
+    render = RenderParams(low=tile.min, high=tile.max, gamma=tile.gamma, transfer=tile.transfer)
+    key = tile_service.image_tile_key(specimen_id, tile.view, tile.level, tile.channel,
+                                      tile.z, tile.y, tile.x, tile.tile_size, tile_format, render)
+    return tile_format, render, key
+
+
+def _group_batch_tiles(specimen_id: str, pending: List[tuple]) -> List[List[tuple]]:
+    """Group pending tiles by the chunks they read
+
+    Tiles of a group are rendered one after another, so the chunks they
+    share are decompressed by the first and served from the chunk cache to
+    the others. Groups are ordered by footprint to keep neighbours close.
+    """
+    groups = defaultdict(list)
+    for item in pending:
+        index, tile = item[0], item[1]
+        channel = 0 if tile.kind == TileKind.ATLAS else tile.channel
+        try:
+            footprint = tile_service.tile_chunk_footprint(
+                specimen_id, tile.kind.value, tile.view, tile.level, channel,
+                tile.z, tile.y, tile.x, tile.tile_size)
+        except Exception:
+            footprint = ("tile", index)  # Rendering reports the error
+        groups[(tile.kind.value, channel, tile.view.value, tile.level, footprint)].append(item)
+    return [groups[k] for k in sorted(groups, key=repr)]
+
+
+def _render_batch_tile(specimen_id: str, tile: BatchTileDescriptor,
+                       tile_format: str, render: Optional[RenderParams]) -> bytes:
+    if tile.kind == TileKind.ATLAS:
+        return run_extraction(tile_service, "extract_atlas_tile", specimen_id, tile.view,
+                              tile.level, tile.z, tile.y, tile.x, tile.tile_size,
+                              format=tile_format)
+    return run_extraction(tile_service, "extract_image_tile", specimen_id, tile.view,
+                          tile.level, tile.channel, tile.z, tile.y, tile.x, tile.tile_size,
+                          format=tile_format, render=render)
+
+
+async def _render_tiles(specimen_id: str, items: List[tuple]) -> list:
+    """Render (tile, format, render) items submitted together by single tile requests
+
+    Items are grouped by the chunks they read like batch tiles, so requests
+    arriving together for tiles sharing chunks decompress them once.
+    """
+    if len(items) == 1:
+        tile, tile_format, render = items[0]
+        try:
+            return [await tile_executor.run(_render_batch_tile, specimen_id, tile, tile_format, render)]
+        except Exception as e:
+            return [e]
+    results: list = [None] * len(items)
+    
+    def render_group(group):
+        for index, tile, tile_format, render, _ in group:
+            try:
+                results[index] = _render_batch_tile(specimen_id, tile, tile_format, render)
+            except Exception as e:
+                results[index] = e
+    
+    async def run_group(group):
+        try:
+            await tile_executor.run(render_group, group)
+        except Exception as e:
+            for index, *_ in group:
+                results[index] = e
+    
+    pending = [(index, tile, tile_format, render, None)
+               for index, (tile, tile_format, render) in enumerate(items)]
+    groups = await tile_executor.run(_group_batch_tiles, specimen_id, pending)
+    await asyncio.gather(*(run_group(group) for group in groups))
+    return results
+
+
+class _ClientDisconnected(Exception):
+    """The client closed the connection before its tile was ready"""
+
+
+async def _wait_disconnected(request: Request):
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _until_disconnected(request: Request, work):
+    """Await work, cancelling it if the client disconnects or request_timeout passes
+
+    Cancelled extractions still shared with other requests keep running
+    (see SingleFlight); otherwise their queued tile jobs are dropped.
+    """
+    task = asyncio.ensure_future(work)
+    watch = asyncio.ensure_future(_wait_disconnected(request))
+    try:
+        await asyncio.wait((task, watch), timeout=settings.request_timeout,
+                           return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watch.cancel()
+        if not task.done():
+            task.cancel()
+    if task.done() and not task.cancelled():
+        return task.result()
+    if watch.done() and not watch.cancelled():
+        raise _ClientDisconnected()
+    raise TimeoutError(f"Tile not ready within {settings.request_timeout} s")
+
+
+async def _extract_and_cache(cache_key: str, extract) -> bytes:
+    tile_bytes = await extract()
+    await tile_cache.set(cache_key, tile_bytes)
+    return tile_bytes
+
+
+# Identical tile requests in flight share one extraction, or the prefetch
+# render of the tile unless that was rejected, expired or cancelled; requests
+# arriving within the micro-batch window are rendered grouped by chunk footprint
+tile_flights = SingleFlight(retry_external=(TileQueueFull, TimeoutError, RuntimeError))
+tile_batcher = MicroBatcher(_render_tiles, window=settings.tile_microbatch_window_ms / 1000.0)
+
+@router.post("/specimens/{specimen_id}/tiles:batch")
+async def get_tiles_batch(
+    batch: TileBatchRequest,
+    specimen_id: str = Path(..., description="Specimen ID"),
+    accept: Optional[str] = Header(None)
+):
+    """Get many image and atlas tiles in one streamed response
+    
+    Each descriptor takes the parameters of the single tile endpoints. Tiles
+    are streamed as length-prefixed frames (see BATCH_MEDIA_TYPE) as soon as
+    each is ready: cached tiles first, then rendered tiles grouped so that
+    chunks shared by several tiles are decompressed once. Failed tiles get a
+    frame with an error status instead of failing the whole batch.
+    """
+    
+    # Verify specimen exists
+    if not get_specimen_config(specimen_id):
+        raise HTTPException(status_code=404, detail=f"Specimen {specimen_id} not found")
+    try:
+        tile_executor.admit()
+    except TileQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(e.retry_after)})
+    
+    async def frames():
+        loop = asyncio.get_running_loop()
+        done: asyncio.Queue = asyncio.Queue()
+        pending = []
+        for index, tile in enumerate(batch.tiles):
+            try:
+                tile_format, render, key = _prepare_batch_tile(specimen_id, tile, accept)
+            except Exception as e:
+                yield _error_frame(index, e)
+                continue
+            tile_bytes = await tile_cache.get(key)
+            if tile_bytes is not None:
+                yield _batch_frame({"index": index, "status": 200, "cache": "HIT",
+                                    "content_type": MEDIA_TYPES[tile_format]}, tile_bytes)
+            else:
+                pending.append((index, tile, tile_format, render, key))
+        if not pending:
+            return
+        
+        def render_group(group):
+            for index, tile, tile_format, render, key in group:
+                try:
+                    result = _render_batch_tile(specimen_id, tile, tile_format, render)
+                except Exception as e:
+                    result = e
+                loop.call_soon_threadsafe(done.put_nowait, (index, tile_format, key, result))
+        
+        limit = asyncio.Semaphore(max(1, settings.tile_batch_parallel_groups))
+        
+        async def run_group(group):
+            async with limit:
+                try:
+                    await tile_executor.run(render_group, group, priority=PRIORITY_BATCH)
+                except Exception as e:
+                    for index, _, tile_format, _, key in group:
+                        done.put_nowait((index, tile_format, key, e))
+        
+        try:
+            groups = await tile_executor.run(_group_batch_tiles, specimen_id, pending,
+                                             priority=PRIORITY_BATCH)
+        except Exception as e:
+            for item in pending:
+                yield _error_frame(item[0], e)
+            return
+        tasks = [asyncio.create_task(run_group(group)) for group in groups]
+        try:
+            for _ in range(len(pending)):
+                index, tile_format, key, result = await done.get()
+                if isinstance(result, Exception):
+                    yield _error_frame(index, result)
+                    continue
+                await tile_cache.set(key, result)
+                yield _batch_frame({"index": index, "status": 200, "cache": "MISS",
+                                    "content_type": MEDIA_TYPES[tile_format]}, result)
+        finally:
+            # Client went away: drop groups that have not started
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(frames(), media_type=BATCH_MEDIA_TYPE,
+                             headers={"X-Tile-Count": str(len(batch.tiles))})
+
 @router.get("/specimens/{specimen_id}/tile-grid/{view}/{level}")
 async def get_tile_grid_info(
     specimen_id: str = Path(..., description="Specimen ID"),
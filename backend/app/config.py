@@ -41,16 +41,36 @@ class Settings(BaseSettings):
     redis_url: str = "redis://redis:6379"
     redis_db: int = 0
     redis_max_connections: int = 10
+    redis_socket_timeout: float = 0.5  # Seconds, keep small so a dead Redis fails fast
+    redis_retry_interval: float = 30.0  # Seconds to wait before retrying an unreachable Redis
     
     # Cache settings
     cache_ttl_tiles: int = 3600  # 1 hour
     cache_ttl_metadata: int = 86400  # 24 hours
     cache_ttl_regions: int = 86400  # 24 hours
+    # Encoded tile L1 cache, 0 disables. Per process like the chunk caches below,
+    # so 8 x 16 MiB with the Dockerfile's 8 workers; Redis (L2) is the tier they share.
+    tile_cache_l1_bytes: int = 16 * 1024 * 1024
     
     # Image processing settings
     default_tile_size: int = 512
     max_resolution_level: int = 7
-    supported_formats: List[str] = ["png", "jpg", "jpeg"]
+    supported_formats: List[str] = ["png", "jpg", "jpeg", "webp", "avif"]
+    negotiated_tile_formats: List[str] = ["webp"]  # Offered via Accept in this order, may add "avif"
+    tile_encoder: str = "pillow"  # "pillow" or "turbojpeg" (needs PyTurboJPEG + libturbojpeg)
+    image_jpeg_quality: int = 85
+    image_jpeg_subsampling: str = "4:2:0"  # Used by colour tiles only
+    image_png_compress_level: int = 1
+    image_webp_quality: int = 80  # Lossy WebP for image tiles
+    image_avif_quality: int = 60
+    intensity_window_mode: str = "global"  # "global" (per-channel window + LUT) or "tile_max" (legacy)
+    intensity_low_quantile: float = 0.001  # Window bounds as quantiles of the channel histogram
+    intensity_high_quantile: float = 0.999
+    intensity_transfer: str = "linear"  # "linear" or "sqrt"
+    intensity_gamma: float = 1.0
+    atlas_png_compress_level: int = 1  # zlib level 0-9, higher is smaller and slower
+    atlas_webp_method: int = 0  # Lossless WebP for atlas tiles: method 0-6 and quality 0-100
+    atlas_webp_quality: int = 25  # both set effort; these keep encoding near PNG level 1 speed
     
     # Coordinate system settings
     coordinate_system: str = "right_handed"
@@ -64,13 +84,51 @@ class Settings(BaseSettings):
         "3": "640nm"
     }
     
+    # Composite tile colours (RRGGBB) per channel
+    default_channel_colors: Dict[str, str] = {
+        "0": "0000ff",  # 405nm blue
+        "1": "00ff00",  # 488nm green
+        "2": "ff0000",  # 561nm red
+        "3": "ff00ff"   # 640nm magenta
+    }
+    
     # 3D model settings
     mesh_scale_factor: float = 10.0  # Mesh units are in 10um
     image_resolution_um: float = 10.0  # Image resolution at level 0
     
     # Performance settings
-    max_concurrent_requests: int = 100
-    request_timeout: int = 30
+    max_concurrent_requests: int = 100  # Tile jobs queued or running, more get 503 with Retry-After
+    request_timeout: int = 30  # Seconds a tile request may wait for its tile, 504 beyond
+    tile_executor_threads: int = min(32, (os.cpu_count() or 1) + 4)  # Threads rendering tiles
+    # Process mode is meant for one uvicorn worker: each worker starts its own renderers,
+    # so --workers N means N x tile_render_processes processes and slots of shared memory
+    tile_render_mode: str = "thread"  # "thread" (in the API process) or "process" (renderer processes)
+    tile_render_processes: int = os.cpu_count() or 1  # Renderer processes in process mode
+    tile_render_slot_bytes: int = 16 * 1024 * 1024  # Shared memory per renderer for results, larger are piped
+    tile_batch_parallel_groups: int = 4  # Chunk-sharing tile groups rendered at once per batch
+    tile_microbatch_window_ms: float = 2.0  # Tile renders arriving this close together are grouped by chunks, 0 disables
+    response_cache_entries: int = 256  # Serialised metadata and region responses kept
+    metadata_cache_control: str = "public, no-cache"  # Clients revalidate with If-None-Match
+    tile_archives: bool = True  # Serve default tiles from data/<specimen>/tiles.pack when it is current
+    prefetch_enabled: bool = True  # Render neighbouring slices and tiles of requested image tiles ahead
+    prefetch_slices: int = 2  # Slices ahead of (and behind) the viewer to prefetch
+    prefetch_queue_size: int = 64  # Queued prefetch tiles, oldest are dropped beyond
+    prefetch_threads: int = 1  # Background render threads, kept few to leave CPU to requests
+    forwarded_allow_ips: List[str] = ["127.0.0.1"]  # Proxies trusted for X-Forwarded-For (prefetch viewers), "*" for any
+    
+    # File handle pool settings
+    handler_pool_max_open: int = 32  # Open volume files kept per process
+    handler_pool_idle_timeout: float = 600.0  # Seconds before an idle file is closed
+    # Chunk and slab caches are per process: with `--workers 8` (Dockerfile) the
+    # machine holds 8 of each, 8 x (64 + 32) MiB = 768 MiB by default. Size them
+    # as budget / workers. In process render mode (one API process) the renderers
+    # split them, so there they are the whole budget.
+    chunk_cache_bytes: int = 64 * 1024 * 1024  # Decompressed chunk cache, 0 disables
+    slab_cache_bytes: int = 32 * 1024 * 1024  # Chunk-deep tile slabs for slice scrubbing, 0 disables
+    chunk_read_mode: str = "classic"  # "classic" (h5py decompresses) or "direct" (read_direct_chunk + thread pool)
+    chunk_decode_threads: int = Field(default_factory=lambda: os.cpu_count() or 4)
+    use_view_stores: bool = True  # Prefer image.sagittal.h5 / image.horizontal.h5 when present
+    volume_formats: List[str] = ["zarr", "ims"]  # Volume file suffixes per specimen, in order of preference (zarr needs the zarr package)
     
     # Logging settings
     log_level: str = "INFO"
@@ -87,13 +145,29 @@ class Settings(BaseSettings):
         """Get the path to a specific specimen directory"""
         return self.data_path / specimen_id
     
+    def get_volume_path(self, specimen_id: str, name: str) -> Path:
+        """Path of a specimen volume in the first available of volume_formats
+        
+        Falls back to the .ims path when no format is present.
+        """
+        specimen_path = self.get_specimen_path(specimen_id)
+        for suffix in self.volume_formats:
+            path = specimen_path / f"{name}.{suffix}"
+            if path.exists():
+                return path
+        return specimen_path / f"{name}.ims"
+    
     def get_image_path(self, specimen_id: str) -> Path:
         """Get the path to the image file for a specimen"""
-        return self.get_specimen_path(specimen_id) / "image.ims"
+        return self.get_volume_path(specimen_id, "image")
     
     def get_atlas_path(self, specimen_id: str) -> Path:
         """Get the path to the atlas file for a specimen"""
-        return self.get_specimen_path(specimen_id) / "atlas.ims"
+        return self.get_volume_path(specimen_id, "atlas")
+    
+    def get_tile_archive_path(self, specimen_id: str) -> Path:
+        """Get the path to the packed pre-rendered tiles of a specimen"""
+        return self.get_specimen_path(specimen_id) / "tiles.pack"
     
     def get_model_path(self, specimen_id: str) -> Path:
         """Get the path to the 3D model file for a specimen"""
@@ -10,7 +10,11 @@ from fastapi.responses import JSONResponse
 import uvicorn
 
 from .config import settings
-from .api import specimens, tiles, regions, metadata
+from .api import specimens, tiles, regions, metadata, stats
+from .services.handler_pool import handler_pool
+from .services.prefetch import prefetcher
+from .services.render_pool import close_render_pool, get_render_pool
+from .services.tile_executor import tile_executor
 
 
 # Configure logging
@@ -27,11 +31,17 @@ async def lifespan(app: FastAPI):
     logger.info("Starting VISoR Platform API")
     logger.info(f"Data path: {settings.data_path}")
     logger.info(f"Debug mode: {settings.debug}")
+    if get_render_pool() is not None:
+        logger.info(f"Rendering tiles in {settings.tile_render_processes} renderer processes")
     
     yield
     
     # Shutdown
     logger.info("Shutting down VISoR Platform API")
+    prefetcher.close()
+    tile_executor.close()
+    close_render_pool()
+    handler_pool.close_all()
 
 # Create FastAPI application
 app = FastAPI(
@@ -87,6 +97,7 @@ app.include_router(specimens.router, prefix="/api", tags=["specimens"])
 app.include_router(tiles.router, prefix="/api", tags=["tiles"])
 app.include_router(regions.router, prefix="/api", tags=["regions"])
 app.include_router(metadata.router, prefix="/api", tags=["metadata"])
+app.include_router(stats.router, prefix="/api", tags=["stats"])
 
 if __name__ == "__main__":
     uvicorn.run(
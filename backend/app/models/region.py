@@ -2,8 +2,9 @@
 Data models for brain regions
 """
 
-from typing import Dict, List, Optional, Any
-from pydantic import BaseModel, Field
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Any, Tuple
+from pydantic import BaseModel, Field, PrivateAttr
 
 class Region(BaseModel):
     """Brain region model"""
@@ -18,53 +19,79 @@ class Region(BaseModel):
     parent_id: Optional[int] = None
     children: List[int] = Field(default_factory=list)
     color: Optional[str] = None  # Hex color for visualization
+    name_zh: Optional[str] = None  # Chinese name, for the zh locale
 
 class RegionHierarchy(BaseModel):
-    """Hierarchical structure of brain regions"""
+    """Hierarchical structure of brain regions
+    
+    Lookup indexes are built once when the model is created; the region
+    data is not meant to be modified afterwards.
+    """
     metadata: Dict[str, Any]
     regions: List[Region]
     hierarchy: Dict[str, Any]
     region_lookup: Dict[str, Region]
     
+    _by_value: Mapping[int, Region] = PrivateAttr()
+    _by_level: Mapping[int, Tuple[Region, ...]] = PrivateAttr()
+    _children: Mapping[int, Tuple[Region, ...]] = PrivateAttr()
+    _statistics: "RegionStatistics" = PrivateAttr()
+    
+    def model_post_init(self, __context: Any) -> None:
+        """Build the lookup indexes"""
+        by_value: Dict[int, Region] = {}
+        children: Dict[int, List[Region]] = {}
+        for region in self.regions:
+            by_value.setdefault(region.value, region)
+            if region.parent_id is not None:
+                children.setdefault(region.parent_id, []).append(region)
+        
+        by_level: Dict[int, Tuple[Region, ...]] = {}
+        for level in range(1, 5):
+            # First region of each distinct, non-empty level name
+            seen = set()
+            regions = []
+            for region in self.regions:
+                level_value = getattr(region, f"level{level}")
+                if level_value and level_value not in seen:
+                    seen.add(level_value)
+                    regions.append(region)
+            by_level[level] = tuple(regions)
+        
+        self._by_value = MappingProxyType(by_value)
+        self._by_level = MappingProxyType(by_level)
+        self._children = MappingProxyType({k: tuple(v) for k, v in children.items()})
+        self._statistics = RegionStatistics(
+            total_regions=len(self.regions),
+            regions_by_level={f"level_{i}": len(by_level[i]) for i in range(1, 5)},
+            hierarchy_depth=4
+        )
+    
     def get_region_by_id(self, region_id: int) -> Optional[Region]:
         """Get region by ID"""
         return self.region_lookup.get(str(region_id))
     
     def get_region_by_value(self, value: int) -> Optional[Region]:
         """Get region by atlas mask value"""
-        for region in self.regions:
-            if region.value == value:
-                return region
-        return None
+        return self._by_value.get(value)
     
     def search_regions(self, query: str) -> List[Region]:
         """Search regions by name or abbreviation"""
         query_lower = query.lower()
-        matching_regions = []
-        
-        for region in self.regions:
-            if (query_lower in region.name.lower() or 
-                query_lower in region.abbreviation.lower()):
-                matching_regions.append(region)
-        
-        return matching_regions
+        return [region for region in self.regions
+                if query_lower in region.name.lower() or query_lower in region.abbreviation.lower()]
     
     def get_regions_by_level(self, level: int) -> List[Region]:
         """Get regions by hierarchy level (1-4)"""
-        if level < 1 or level > 4:
-            return []
-        
-        level_attr = f"level{level}"
-        unique_levels = set()
-        regions = []
-        
-        for region in self.regions:
-            level_value = getattr(region, level_attr)
-            if level_value and level_value not in unique_levels:
-                unique_levels.add(level_value)
-                regions.append(region)
-        
-        return regions
+        return list(self._by_level.get(level, ()))
+    
+    def get_children(self, parent_id: int) -> List[Region]:
+        """Get regions whose parent is parent_id"""
+        return list(self._children.get(parent_id, ()))
+    
+    def get_statistics(self) -> "RegionStatistics":
+        """Region counts, computed at load time"""
+        return self._statistics
 
 class RegionPickResult(BaseModel):
     """Result of region picking at a coordinate"""
@@ -41,6 +41,7 @@ class ImageInfo(BaseModel):
     pixel_size_um: Tuple[float, float, float]  # (z, y, x) in micrometers
     data_type: str
     file_size: int
+    intensity_windows: Optional[Dict[str, Tuple[float, float]]] = None  # Default (min, max) per channel
     
 class AtlasInfo(BaseModel):
     """Atlas mask information model"""
@@ -52,6 +53,7 @@ class AtlasInfo(BaseModel):
     data_type: str
     file_size: int
     total_regions: int
+    palette_labels: Optional[List[int]] = None  # Label by PNG palette index, if not the index itself
 
 class ModelInfo(BaseModel):
     """3D model information model"""
@@ -79,6 +81,36 @@ class TileRequest(BaseModel):
     tile_size: Optional[int] = Field(default=512, ge=64, le=2048)
 
 
+# Largest number of tiles in one batch request
+MAX_BATCH_TILES = 256
+
+class TileKind(str, Enum):
+    """Tile sources"""
+    IMAGE = "image"
+    ATLAS = "atlas"
+
+class BatchTileDescriptor(BaseModel):
+    """One tile of a batch request, with the parameters of the tile endpoints"""
+    kind: TileKind = TileKind.IMAGE
+    view: ViewType
+    level: int = Field(ge=0, le=99)
+    z: int = Field(ge=0)
+    y: int = Field(ge=0)
+    x: int = Field(ge=0)
+    channel: int = Field(default=0, ge=0, le=999)  # Ignored for atlas tiles
+    tile_size: Optional[int] = Field(default=None, ge=8, le=65536)
+    format: Optional[str] = None
+    # Image rendering, see get_image_tile
+    min: Optional[float] = None
+    max: Optional[float] = None
+    gamma: Optional[float] = Field(default=None, gt=0, le=10)
+    transfer: Optional[str] = None
+
+class TileBatchRequest(BaseModel):
+    """Batch tile request model"""
+    tiles: List[BatchTileDescriptor] = Field(min_length=1, max_length=MAX_BATCH_TILES)
+
+
 class CoordinateTransform(BaseModel):
     """Coordinate transformation model"""
     view: ViewType
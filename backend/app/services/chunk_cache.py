@@ -0,0 +1,127 @@
+"""
+Byte-budgeted LRU cache of decompressed HDF5 chunks
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+import logging
+
+import numpy as np
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# (file key, [view,] level, channel, chunk index)
+ChunkKey = Tuple[Hashable, ...]
+
+
+class LRUByteCache:
+    """Thread-safe LRU mapping bounded by the total size of its values"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value and mark it most recently used"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: Hashable, value: Any, nbytes: int):
+        """Insert a value, evicting least recently used entries over budget"""
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._items[key] = (value, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._items.popitem(last=False)
+                self._bytes -= evicted_bytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Whether key is cached, without counting a lookup or reordering"""
+        return key in self._items
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current occupancy"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class ChunkCache(LRUByteCache):
+    """LRU cache of decompressed chunks shared by all open files
+
+    Adjacent tiles and consecutive slices usually fall in the same HDF5
+    chunks, so keeping decoded chunks avoids paying zlib decompression again
+    for data that was just read.
+    """
+
+    def get_chunk(self, key: ChunkKey) -> Optional[np.ndarray]:
+        return self.get(key)
+
+    def put_chunk(self, key: ChunkKey, chunk: np.ndarray):
+        # Cached chunks are shared between callers, guard against mutation
+        chunk.flags.writeable = False
+        self.put(key, chunk, chunk.nbytes)
+
+
+class SlabCache(LRUByteCache):
+    """LRU cache of tile slabs one chunk deep along a view's slice axis
+
+    Scrubbing through slices asks for the same tile of consecutive planes,
+    which lie in the same chunks. A slab holds those planes for one tile,
+    contiguous per plane, so the following slices are served without
+    assembling the tile from chunks again (see VolumeReader.get_tile).
+    """
+
+    def get_slab(self, key: Hashable) -> Optional[np.ndarray]:
+        return self.get(key)
+
+    def put_slab(self, key: Hashable, slab: np.ndarray):
+        slab.flags.writeable = False
+        self.put(key, slab, slab.nbytes)
+
+
+# Global chunk cache instance (None when disabled by configuration)
+chunk_cache: Optional[ChunkCache] = (
+    ChunkCache(settings.chunk_cache_bytes) if settings.chunk_cache_bytes > 0 else None
+)
+
+# Global slab cache instance (None when disabled by configuration)
+slab_cache: Optional[SlabCache] = (
+    SlabCache(settings.slab_cache_bytes) if settings.slab_cache_bytes > 0 else None
+)
@@ -0,0 +1,203 @@
+"""
+Coalescing of concurrent work: single-flight and micro-batching
+
+Synchronised views and several users opening the same specimen send bursts
+of requests for the same tiles, or for tiles reading the same chunks.
+SingleFlight lets identical requests share one computation; MicroBatcher
+collects requests arriving within a few milliseconds so that they can be
+processed together (see api/tiles.py).
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple, Type
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """One computation per key at a time, shared by all concurrent callers
+
+    The computation runs as its own task, so it completes (and e.g. fills a
+    cache) even if the caller that started it goes away, as long as another
+    caller still waits for it. It is cancelled once every caller has gone.
+    Work done outside the event loop, such as prefetching, joins the same
+    map through claim and release. When that work is cancelled or fails with
+    one of retry_external, callers run func() themselves instead.
+    """
+
+    def __init__(self, retry_external: Tuple[Type[BaseException], ...] = ()):
+        self.retry_external = retry_external
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self._external: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+        self.cancelled = 0
+        self.retried = 0
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Result of func() and whether it was shared with an earlier caller"""
+        loop = asyncio.get_running_loop()
+        while True:
+            # Locked against claim() from threads, so a key has one leader
+            with self._lock:
+                task = self._tasks.get(key)
+                shared = task is not None and not task.done() and task.get_loop() is loop
+                external = None if shared else self._external.get(key)
+                if external is not None and external.done() and self._retryable(external):
+                    external = None  # Failed, not yet released
+                if shared or external is not None:
+                    self.followers += 1
+                else:
+                    task = asyncio.ensure_future(func())
+                    self._tasks[key] = task
+                    self.leaders += 1
+            if external is None:
+                break
+            joined = getattr(external, "joined", None)
+            if joined is not None:
+                joined()
+            try:
+                return await asyncio.shield(asyncio.wrap_future(external)), True
+            except asyncio.CancelledError:
+                if not external.cancelled():
+                    raise
+            except self.retry_external:
+                pass
+            self.retried += 1
+        if not shared:
+            task.add_done_callback(partial(self._finished, key))
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task), shared
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    self.cancelled += 1
+                    task.cancel()
+
+    def claim(self, key: Hashable, future: Future) -> bool:
+        """Register work on key done by a thread; run(key) shares future until release
+
+        Returns False, registering nothing, if key is already in flight. If
+        future has a joined() method it is called for every caller of run
+        that waits for it.
+        """
+        with self._lock:
+            task = self._tasks.get(key)
+            if (task is not None and not task.done()) or key in self._external:
+                return False
+            self._external[key] = future
+            return True
+
+    def release(self, key: Hashable, future: Future):
+        """End the work registered by claim"""
+        with self._lock:
+            if self._external.get(key) is future:
+                del self._external[key]
+
+    def _retryable(self, external: Future) -> bool:
+        return external.cancelled() or isinstance(external.exception(), self.retry_external)
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        with self._lock:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # Retrieved here in case every caller has gone
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def stats(self) -> Dict:
+        lookups = self.leaders + self.followers
+        return {
+            "in_flight": len(self._tasks),
+            "external": len(self._external),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "cancelled": self.cancelled,
+            "retried": self.retried,
+            "shared_rate": self.followers / lookups if lookups else 0.0,
+        }
+
+
+class MicroBatcher:
+    """Collects items submitted within `window` seconds and processes them together
+
+    process(batch_key, items) is awaited once per batch and returns one
+    result per item, an exception instance for items that failed. A batch is
+    processed early once it holds max_items. With a window of 0 every item
+    is processed on its own. Processing is cancelled if all callers of the
+    batch go away before it finishes.
+    """
+
+    def __init__(self, process: Callable[[Hashable, List[Any]], Awaitable[List[Any]]],
+                 window: float = 0.002, max_items: int = 64):
+        self.process = process
+        self.window = window
+        self.max_items = max_items
+        self._open: Dict[Hashable, Tuple[asyncio.AbstractEventLoop, List]] = {}
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, batch_key: Hashable, item: Any) -> Any:
+        """Result of processing item, raising the exception it failed with"""
+        loop = asyncio.get_running_loop()
+        entry = self._open.get(batch_key)
+        if entry is None or entry[0] is not loop:
+            entry = (loop, [])
+            self._open[batch_key] = entry
+            if self.window > 0:
+                loop.call_later(self.window, self._flush, batch_key, entry)
+        future = loop.create_future()
+        entry[1].append((item, future))
+        if self.window <= 0 or len(entry[1]) >= self.max_items:
+            self._flush(batch_key, entry)
+        return await future
+
+    def _flush(self, batch_key: Hashable, entry: Tuple[asyncio.AbstractEventLoop, List]):
+        if self._open.get(batch_key) is entry:
+            del self._open[batch_key]
+        pending = list(entry[1])
+        entry[1].clear()
+        pending = [(item, future) for item, future in pending if not future.done()]
+        if pending:
+            self.batches += 1
+            self.items += len(pending)
+            task = asyncio.ensure_future(self._process(batch_key, pending))
+            for _, future in pending:
+                future.add_done_callback(partial(self._abandon, task, pending))
+
+    @staticmethod
+    def _abandon(task: asyncio.Task, pending: List[Tuple[Any, asyncio.Future]], _future):
+        """Cancel processing once every caller of the batch has gone"""
+        if not task.done() and all(future.done() for _, future in pending):
+            task.cancel()
+
+    async def _process(self, batch_key: Hashable, pending: List[Tuple[Any, asyncio.Future]]):
+        try:
+            results = await self.process(batch_key, [item for item, _ in pending])
+        except Exception as e:
+            results = [e] * len(pending)
+        for (_, future), result in zip(pending, results):
+            if future.done():
+                continue  # Caller went away
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch": self.items / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,265 @@
+"""
+Tile image encoders
+"""
+
+import io
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence
+import logging
+
+import numpy as np
+from PIL import Image, features
+
+logger = logging.getLogger(__name__)
+
+try:
+    import turbojpeg
+except ImportError:  # Optional, needs PyTurboJPEG and the libturbojpeg shared library
+    turbojpeg = None
+
+try:
+    import pillow_avif  # noqa: F401  Registers the AVIF plugin with Pillow
+except ImportError:  # Optional, AVIF output is disabled without it
+    pass
+
+# Tile formats and their media types
+MEDIA_TYPES = {
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+    "avif": "image/avif",
+}
+FORMAT_ALIASES = {"jpg": "jpeg"}
+
+
+def format_available(format: str) -> bool:
+    """Whether this Pillow build can write a tile format"""
+    if format == "webp":
+        return features.check("webp")
+    if format == "avif":
+        Image.init()
+        return "AVIF" in Image.SAVE
+    return format in MEDIA_TYPES
+
+
+def _parse_accept(accept: str) -> Dict[str, float]:
+    """Media types of an Accept header mapped to their q values"""
+    accepted = {}
+    for part in accept.split(","):
+        fields = [f.strip() for f in part.split(";")]
+        if not fields[0]:
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[fields[0].lower()] = q
+    return accepted
+
+
+def negotiate_format(accept: Optional[str], requested: Optional[str], default: str,
+                     preferred: Sequence[str], allowed: Sequence[str]) -> str:
+    """Pick the tile format of a response
+
+    An explicit requested format (``format=`` query) wins and must be one of
+    allowed. Otherwise the first format of preferred that the Accept header
+    lists explicitly, with q > 0, and that this server can encode is used.
+    Wildcards such as ``image/*`` do not count, since every browser sends them
+    while not every browser decodes every format. Falls back to default.
+
+    Raises:
+        ValueError: requested format is unknown, not allowed or unavailable
+    """
+    if requested:
+        format = FORMAT_ALIASES.get(requested.lower(), requested.lower())
+        if format not in allowed or not format_available(format):
+            raise ValueError(f"Unsupported format: {requested}, "
+                             f"use one of {', '.join(f for f in allowed if format_available(f))}")
+        return format
+    if accept:
+        accepted = _parse_accept(accept)
+        for format in preferred:
+            if (format in allowed and accepted.get(MEDIA_TYPES[format], 0.0) > 0
+                    and format_available(format)):
+                return format
+    return default
+
+
+@dataclass(frozen=True)
+class EncodeOptions:
+    """Encoder parameters, configured per endpoint"""
+    jpeg_quality: int = 85
+    jpeg_subsampling: str = "4:2:0"  # Only affects colour tiles
+    png_compress_level: int = 1      # zlib level 0-9; 1 is fast and still compresses well
+    webp_quality: int = 80
+    webp_lossless: bool = False      # Lossless WebP for label data, quality then sets effort
+    webp_method: int = 2             # Encoder effort 0-6, higher is smaller and slower
+    avif_quality: int = 60
+    avif_speed: int = 8              # 0-10, higher is faster
+
+
+class TileEncoder:
+    """Encodes 2D uint8 arrays (grayscale, H x W x 3 RGB or, except JPEG, RGBA) to image bytes
+
+    Every format is encoded with Pillow; subclasses override the formats
+    they encode faster.
+
+    Tiles never use Pillow's optimize=True: it adds a second entropy coding
+    pass to JPEG and a multi-strategy search to PNG on every tile, for a few
+    percent of bytes.
+    """
+
+    name = "base"
+
+    def encode(self, array: np.ndarray, format: str,
+               options: EncodeOptions = EncodeOptions()) -> bytes:
+        if array.dtype != np.uint8:
+            raise ValueError(f"Encoder expects uint8 data, got {array.dtype}")
+        if array.ndim not in (2, 3) or (array.ndim == 3 and array.shape[2] not in (3, 4)):
+            raise ValueError("Only 2D grayscale, RGB or RGBA arrays are supported for tile generation")
+        format = format.upper()
+        if format == 'JPEG' and array.ndim == 3 and array.shape[2] == 4:
+            raise ValueError("JPEG has no alpha channel")
+        if format == 'JPEG':
+            return self.encode_jpeg(array, options)
+        if format == 'PNG':
+            return self.encode_png(array, options)
+        if format == 'WEBP':
+            return self.encode_webp(array, options)
+        if format == 'AVIF':
+            return self.encode_avif(array, options)
+        raise ValueError(f"Unsupported format: {format}")
+
+    def encode_jpeg(self, array: np.ndarray, options: EncodeOptions) -> bytes:
+        buffer = io.BytesIO()
+        Image.fromarray(array).save(buffer, format='JPEG', quality=options.jpeg_quality,
+                                    subsampling=options.jpeg_subsampling)
+        return buffer.getvalue()
+
+    def encode_png(self, array: np.ndarray, options: EncodeOptions) -> bytes:
+        buffer = io.BytesIO()
+        Image.fromarray(array).save(buffer, format='PNG',
+                                    compress_level=options.png_compress_level)
+        return buffer.getvalue()
+
+    def encode_webp(self, array: np.ndarray, options: EncodeOptions) -> bytes:
+        buffer = io.BytesIO()
+        Image.fromarray(array).save(buffer, format='WEBP', quality=options.webp_quality,
+                                    lossless=options.webp_lossless, method=options.webp_method)
+        return buffer.getvalue()
+
+    def encode_avif(self, array: np.ndarray, options: EncodeOptions) -> bytes:
+        if not format_available("avif"):
+            raise ValueError("AVIF output needs pillow-avif-plugin")
+        image = Image.fromarray(array)
+        if image.mode == 'L':
+            image = image.convert('RGB')  # AVIF encoders expect colour input
+        buffer = io.BytesIO()
+        image.save(buffer, format='AVIF', quality=options.avif_quality, speed=options.avif_speed)
+        return buffer.getvalue()
+
+
+class PillowEncoder(TileEncoder):
+    """Pillow for every format, as TileEncoder (its wheels bundle libjpeg-turbo)"""
+
+    name = "pillow"
+
+
+class TurboJPEGEncoder(TileEncoder):
+    """libjpeg-turbo through PyTurboJPEG for JPEG, Pillow for other formats
+
+    Skips the PIL.Image round trip and encodes straight from the array.
+    """
+
+    name = "turbojpeg"
+
+    _SUBSAMPLING = {"4:4:4": 0, "4:2:2": 1, "4:2:0": 2}
+
+    def __init__(self):
+        if turbojpeg is None:
+            raise RuntimeError("PyTurboJPEG is not installed")
+        self._jpeg = turbojpeg.TurboJPEG()
+
+    def encode_jpeg(self, array: np.ndarray, options: EncodeOptions) -> bytes:
+        if array.ndim == 2:
+            pixel_format, subsample = turbojpeg.TJPF_GRAY, turbojpeg.TJSAMP_GRAY
+        else:
+            pixel_format = turbojpeg.TJPF_RGB
+            subsample = self._SUBSAMPLING.get(options.jpeg_subsampling, turbojpeg.TJSAMP_420)
+        return self._jpeg.encode(np.ascontiguousarray(array), quality=options.jpeg_quality,
+                                 pixel_format=pixel_format, jpeg_subsample=subsample)
+
+
+ENCODERS = {
+    PillowEncoder.name: PillowEncoder,
+    TurboJPEGEncoder.name: TurboJPEGEncoder,
+}
+
+_encoder_instances: Dict[str, TileEncoder] = {}
+
+
+def get_encoder(name: str) -> TileEncoder:
+    """Get a shared encoder by name, falling back to Pillow if unavailable"""
+    encoder = _encoder_instances.get(name)
+    if encoder is None:
+        if name not in ENCODERS:
+            raise ValueError(f"Unknown tile encoder: {name}")
+        try:
+            encoder = ENCODERS[name]()
+        except (RuntimeError, OSError) as e:
+            logger.warning(f"Tile encoder '{name}' unavailable ({e}), using pillow")
+            encoder = get_encoder(PillowEncoder.name)
+        _encoder_instances[name] = encoder
+    return encoder
+
+
+def available_encoders() -> Dict[str, Optional[str]]:
+    """Encoder names mapped to None if usable, else the reason they are not"""
+    status = {}
+    for name, cls in ENCODERS.items():
+        try:
+            cls()
+            status[name] = None
+        except (RuntimeError, OSError) as e:
+            status[name] = str(e)
+    return status
+
+
+def encode_palette_png(indices: np.ndarray, palette: np.ndarray, compress_level: int = 1) -> bytes:
+    """8-bit palette PNG of a 2D uint8 index array
+
+    Args:
+        indices: Palette index per pixel
+        palette: RGBA colour per index, (N, 4) uint8; entries past the largest
+            index used are left out of the file
+
+    PNG skips row filtering for palette images, which makes these several
+    times cheaper to encode than grayscale at the same compression level.
+    """
+    if indices.dtype != np.uint8 or indices.ndim != 2:
+        raise ValueError(f"Palette PNG expects 2D uint8 indices, got {indices.dtype} {indices.shape}")
+    used = int(indices.max()) + 1 if indices.size else 1
+    if used > len(palette):
+        raise ValueError(f"Index {used - 1} is outside the palette of {len(palette)} colours")
+    image = Image.frombuffer("P", (indices.shape[1], indices.shape[0]),
+                             np.ascontiguousarray(indices), "raw", "P", 0, 1)
+    image.putpalette(np.ascontiguousarray(palette[:used, :3]).tobytes())
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', compress_level=compress_level,
+               transparency=palette[:used, 3].tobytes())
+    return buffer.getvalue()
+
+
+def encode_label_png(labels: np.ndarray, compress_level: int = 1) -> bytes:
+    """Grayscale PNG holding integer labels exactly: 8-bit if they fit, else 16-bit"""
+    if labels.size and (labels.min() < 0 or labels.max() > 0xFFFF):
+        raise ValueError("Labels outside 0-65535 do not fit a 16-bit PNG")
+    dtype = np.uint8 if not labels.size or labels.max() <= 0xFF else np.uint16
+    buffer = io.BytesIO()
+    Image.fromarray(np.ascontiguousarray(labels, dtype=dtype)).save(
+        buffer, format='PNG', compress_level=compress_level)
+    return buffer.getvalue()
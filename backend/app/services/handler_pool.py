@@ -0,0 +1,180 @@
+"""
+Process-wide pool of open volume file handles (Imaris, Zarr)
+"""
+
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+import logging
+
+from .chunk_cache import ChunkCache, SlabCache, chunk_cache, slab_cache
+from .imaris_handler import CHUNK_READ_CLASSIC, CHUNK_READ_DIRECT
+from .volume_reader import VolumeReader, open_volume, volume_mtime_ns
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PoolEntry:
+    """An open handler and its bookkeeping"""
+    handler: VolumeReader
+    mtime_ns: int
+    last_used: float
+    refcount: int = 0
+    retired: bool = False
+
+
+class HandlerPool:
+    """Registry of open volume readers keyed by path and mtime
+
+    Readers are opened with open_volume, so a path may name an Imaris file
+    or a Zarr store. Opening an .ims file re-parses the HDF5 superblock and B-tree, which
+    dominates the cost of a small tile read. The pool keeps one handler per
+    file and hands it out to every caller, so the per-tile cost is only the
+    hyperslab read. Handlers are shared between threads; h5py serializes all
+    HDF5 calls behind its own global lock, the pool lock only guards the
+    registry itself.
+
+    A file whose mtime changes is reopened on next use. Handlers idle for
+    longer than ``idle_timeout`` seconds, or beyond ``max_open``, are closed
+    once no caller holds them.
+    """
+
+    def __init__(self, max_open: int = 32, idle_timeout: float = 600.0,
+                 chunk_cache: Optional[ChunkCache] = None,
+                 chunk_read_mode: str = CHUNK_READ_CLASSIC,
+                 decode_executor: Optional[Executor] = None,
+                 use_view_stores: bool = False,
+                 slab_cache: Optional[SlabCache] = None):
+        self.max_open = max_open
+        self.idle_timeout = idle_timeout
+        self.chunk_cache = chunk_cache
+        self.chunk_read_mode = chunk_read_mode
+        self.decode_executor = decode_executor
+        self.use_view_stores = use_view_stores
+        self.slab_cache = slab_cache
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _PoolEntry] = {}
+        self._opened = 0
+        self._reused = 0
+
+    @contextmanager
+    def handle(self, file_path: Union[str, Path]) -> Iterator[VolumeReader]:
+        """Borrow the shared handler for a file
+
+        Usage mirrors ``with open_volume(path) as handler``, but the file
+        stays open after the block exits.
+        """
+        entry = self._acquire(Path(file_path))
+        try:
+            yield entry.handler
+        finally:
+            self._release(entry)
+
+    def _acquire(self, file_path: Path) -> _PoolEntry:
+        mtime_ns = volume_mtime_ns(file_path)
+
+        key = str(file_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.mtime_ns != mtime_ns:
+                logger.info(f"Volume changed on disk, reopening: {file_path}")
+                self._retire_locked(key, entry)
+                entry = None
+
+            if entry is None:
+                handler = open_volume(file_path, chunk_cache=self.chunk_cache,
+                                      chunk_read_mode=self.chunk_read_mode,
+                                      decode_executor=self.decode_executor,
+                                      use_view_stores=self.use_view_stores,
+                                      slab_cache=self.slab_cache)
+                entry = _PoolEntry(handler=handler, mtime_ns=handler.mtime_ns,
+                                   last_used=time.monotonic())
+                self._entries[key] = entry
+                self._opened += 1
+            else:
+                self._reused += 1
+
+            entry.refcount += 1
+            entry.last_used = time.monotonic()
+            self._evict_locked()
+            return entry
+
+    def _release(self, entry: _PoolEntry):
+        with self._lock:
+            entry.refcount -= 1
+            entry.last_used = time.monotonic()
+            if entry.retired and entry.refcount == 0:
+                entry.handler.close()
+
+    def _retire_locked(self, key: str, entry: _PoolEntry):
+        """Drop an entry from the registry; close it once nobody holds it"""
+        if self._entries.get(key) is entry:
+            del self._entries[key]
+        entry.retired = True
+        if entry.refcount == 0:
+            entry.handler.close()
+
+    def _evict_locked(self):
+        """Close idle handlers, and the least recently used beyond max_open"""
+        now = time.monotonic()
+        idle = sorted(
+            ((k, e) for k, e in self._entries.items() if e.refcount == 0),
+            key=lambda item: item[1].last_used,
+        )
+        excess = len(self._entries) - self.max_open
+        for key, entry in idle:
+            if excess > 0 or now - entry.last_used > self.idle_timeout:
+                self._retire_locked(key, entry)
+                excess -= 1
+
+    def invalidate(self, file_path: Optional[Union[str, Path]] = None):
+        """Forget the handler for a file (or all files when None)
+
+        Handlers currently in use are closed when their last user returns.
+        """
+        with self._lock:
+            if file_path is None:
+                keys: List[str] = list(self._entries)
+            else:
+                keys = [k for k in (str(Path(file_path)),) if k in self._entries]
+            for key in keys:
+                self._retire_locked(key, self._entries[key])
+
+    def close_all(self):
+        """Close every pooled handler, e.g. at application shutdown"""
+        self.invalidate()
+
+    def stats(self) -> Dict:
+        """Pool counters for monitoring"""
+        with self._lock:
+            return {
+                "open_files": len(self._entries),
+                "in_use": sum(1 for e in self._entries.values() if e.refcount > 0),
+                "opened": self._opened,
+                "reused": self._reused,
+            }
+
+
+# Threads decompressing raw chunks for the direct chunk read path
+decode_executor = (
+    ThreadPoolExecutor(max_workers=settings.chunk_decode_threads,
+                       thread_name_prefix="chunk-decode")
+    if settings.chunk_read_mode == CHUNK_READ_DIRECT else None
+)
+
+# Global pool instance shared by all services in this process
+handler_pool = HandlerPool(
+    max_open=settings.handler_pool_max_open,
+    idle_timeout=settings.handler_pool_idle_timeout,
+    chunk_cache=chunk_cache,
+    chunk_read_mode=settings.chunk_read_mode,
+    decode_executor=decode_executor,
+    use_view_stores=settings.use_view_stores,
+    slab_cache=slab_cache,
+)
@@ -2,27 +2,77 @@
 Service for handling Imaris (.ims) files
 """
 
+import time
+import zlib
+from concurrent.futures import Executor
 import h5py
 import numpy as np
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 from pathlib import Path
 import logging
-from ..models.specimen import ViewType, COORDINATE_TRANSFORMS
-from ..config import settings
+from ..models.specimen import ViewType
+from .chunk_cache import ChunkCache, SlabCache
+from .view_store import VIEW_STORE_AXES, open_view_store, view_dataset_path
+from .volume_reader import ChunkLoader, VolumeReader
 
 logger = logging.getLogger(__name__)
 
-class ImarisHandler:
+# Chunk read modes, see ImarisHandler.read_region
+CHUNK_READ_CLASSIC = "classic"
+CHUNK_READ_DIRECT = "direct"
+
+# Seconds before looking again for a view store that was absent or stale
+VIEW_STORE_RECHECK_INTERVAL = 60.0
+
+# HDF5 filters the direct chunk read path can decode itself
+_DIRECT_READ_FILTERS = {h5py.h5z.FILTER_DEFLATE, h5py.h5z.FILTER_SHUFFLE}
+
+class ImarisHandler(VolumeReader):
     """Handler for Imaris (.ims) HDF5 files"""
     
-    def __init__(self, file_path: Union[str, Path]):
-        """Initialize with path to .ims file and open it immediately (RAII)"""
-        self.file_path = Path(file_path)
-        self._metadata = None
+    def __init__(self, file_path: Union[str, Path],
+                 chunk_cache: Optional[ChunkCache] = None,
+                 chunk_read_mode: str = CHUNK_READ_CLASSIC,
+                 decode_executor: Optional[Executor] = None,
+                 use_view_stores: bool = False,
+                 slab_cache: Optional[SlabCache] = None):
+        """Initialize with path to .ims file and open it immediately (RAII)
+
+        Args:
+            file_path: Path to the .ims file
+            chunk_cache: Optional shared cache of decompressed chunks used by
+                get_tile; without it every read goes straight to h5py
+            chunk_read_mode: "classic" lets h5py decompress chunks, "direct"
+                fetches raw chunks with read_direct_chunk and decompresses
+                them outside the HDF5 lock
+            decode_executor: Thread pool for decompression in "direct" mode;
+                chunks are decoded in the calling thread without it
+            use_view_stores: Read sagittal/horizontal tiles from up-to-date
+                view-optimised stores next to the file when they exist
+            slab_cache: Optional cache of chunk-deep slabs serving the next
+                slices of a tile without another read (see get_tile)
+        """
+        if chunk_read_mode not in (CHUNK_READ_CLASSIC, CHUNK_READ_DIRECT):
+            raise ValueError(f"Unknown chunk read mode: {chunk_read_mode}")
+        self.chunk_read_mode = chunk_read_mode
+        self.decode_executor = decode_executor
+        self.use_view_stores = use_view_stores
+        # Filter pipeline per (file, dataset name), None if direct read is unsupported
+        self._direct_filters: Dict[Tuple[str, str], Optional[List[Tuple[int, int]]]] = {}
+        # Opened view stores per view, None once known to be absent or stale
+        self._view_stores: Dict[ViewType, Optional[h5py.File]] = {}
+        self._view_store_checked: Dict[ViewType, float] = {}
+        self._view_datasets: Dict[Tuple[ViewType, int, int], h5py.Dataset] = {}
+        # h5py.Dataset objects per (level, channel); opening a dataset walks
+        # the group B-tree, so keep them for the lifetime of the handle
+        self._datasets: Dict[Tuple[int, int], h5py.Dataset] = {}
+        self._levels: Optional[List[int]] = None
+        self._channels: Optional[List[int]] = None
         
         # RAII: Acquire resource in constructor
-        if not self.file_path.exists():
-            raise FileNotFoundError(f"Imaris file not found: {self.file_path}")
+        if not Path(file_path).exists():
+            raise FileNotFoundError(f"Imaris file not found: {file_path}")
+        super().__init__(file_path, chunk_cache, slab_cache)
         
         try:
             self._file = h5py.File(self.file_path, 'r')
@@ -31,18 +81,65 @@ class ImarisHandler:
             logger.error(f"Failed to open Imaris file {self.file_path}: {e}")
             raise
         
-    def __enter__(self):
-        """Context manager entry - file already open"""
-        return self
-        
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        """Context manager exit - close the file"""
+    def close(self):
+        """Close the underlying HDF5 file"""
+        self._datasets.clear()
+        self._view_datasets.clear()
+        for store in self._view_stores.values():
+            if store is not None:
+                store.close()
+        self._view_stores.clear()
         if self._file:
             self._file.close()
             self._file = None
+            logger.info(f"Closed Imaris file: {self.file_path}")
+
+    @property
+    def is_open(self) -> bool:
+        """Whether the underlying HDF5 file is still open"""
+        return self._file is not None
+
+    def get_dataset(self, level: int, channel: int) -> h5py.Dataset:
+        """Get (cached) dataset for a level and channel
+
+        Raises:
+            KeyError: if the level or channel does not exist
+        """
+        dataset = self._datasets.get((level, channel))
+        if dataset is None:
+            dataset_path = f'DataSet/ResolutionLevel {level}/TimePoint 0/Channel {channel}/Data'
+            dataset = self._file[dataset_path]
+            self._datasets[(level, channel)] = dataset
+        return dataset
+
+    def get_view_dataset(self, view: ViewType, level: int,
+                         channel: int) -> Optional[h5py.Dataset]:
+        """Get the dataset of the view-optimised store, None if unavailable"""
+        if not self.use_view_stores or view not in VIEW_STORE_AXES:
+            return None
+        key = (view, level, channel)
+        dataset = self._view_datasets.get(key)
+        if dataset is None:
+            store = self._view_stores.get(view)
+            if store is None:
+                now = time.monotonic()
+                if now - self._view_store_checked.get(view, -np.inf) < VIEW_STORE_RECHECK_INTERVAL:
+                    return None
+                self._view_store_checked[view] = now
+                store = open_view_store(self.file_path, view, self.mtime_ns)
+                self._view_stores[view] = store
+            if store is None:
+                return None
+            dataset = store.get(view_dataset_path(level, channel))
+            if dataset is None:
+                return None
+            self._view_datasets[key] = dataset
+        return dataset
         
     def get_resolution_levels(self) -> List[int]:
         """Get available resolution levels"""
+        if self._levels is not None:
+            return list(self._levels)
         levels = []
         dataset_group = self._file.get('DataSet')
         if dataset_group:
@@ -51,10 +148,13 @@ class ImarisHandler:
                     level_num = int(key.split()[-1])
                     levels.append(level_num)
         
-        return sorted(levels)
+        self._levels = sorted(levels)
+        return list(self._levels)
     
     def get_channels(self) -> List[int]:
         """Get available channels"""
+        if self._channels is not None:
+            return list(self._channels)
         channels = []
         # Check first resolution level for available channels
         levels = self.get_resolution_levels()
@@ -65,104 +165,67 @@ class ImarisHandler:
                     channel_num = int(key.split()[-1])
                     channels.append(channel_num)
         
-        return sorted(channels)
-    
-    def get_data_shape(self, level: int, channel: int = 0) -> Tuple[int, int, int]:
-        """Get shape of data array for specific level and channel"""
-        try:
-            dataset_path = f'DataSet/ResolutionLevel {level}/TimePoint 0/Channel {channel}/Data'
-            dataset = self._file[dataset_path]
-            return dataset.shape  # (z, y, x)
-        except KeyError:
-            raise KeyError(f"Data not found for level {level}, channel {channel}")
+        self._channels = sorted(channels)
+        return list(self._channels)
     
-    def get_tile(self, view: ViewType, level: int, channel: int,
-                 z: int, y: int, x: int, tile_size: int = 512) -> np.ndarray:
-        """Extract tile from 3D data using direct pixel coordinates
-        
-        Args:
-            view: View type (coronal, sagittal, horizontal)
-            level: Resolution level
-            channel: Channel index
-            z: Z coordinate (pixel position)
-            y: Y coordinate (pixel position)
-            x: X coordinate (pixel position)
-            tile_size: Size of extracted tile
-            
-        Returns:
-            2D numpy array containing the extracted tile
-            
-        Note: Coordinates (z,y,x) specify the origin (top-left corner) of the tile.
+    def _direct_loader(self, dataset: h5py.Dataset) -> Optional[ChunkLoader]:
+        """_load_chunks_direct in direct mode if the dataset's filters can be decoded here"""
+        if (self.chunk_read_mode == CHUNK_READ_DIRECT
+                and self._get_direct_filters(dataset) is not None):
+            return self._load_chunks_direct
+        return None
+
+    def _load_chunks_classic(self, dataset: h5py.Dataset,
+                             indices: Sequence[Tuple[int, ...]]) -> List[np.ndarray]:
+        """Read chunks through h5py, which decompresses under its global lock"""
+        return [dataset[self._chunk_slices(dataset, index)] for index in indices]
+
+    def _load_chunks_direct(self, dataset: h5py.Dataset,
+                            indices: Sequence[Tuple[int, ...]]) -> List[np.ndarray]:
+        """Fetch raw chunks, then decompress them in parallel
+
+        Only the raw read holds the HDF5 lock; zlib releases the GIL while
+        inflating, so the decode threads run on all cores. Chunks never
+        written (sparse datasets) hold the dataset's fill value.
         """
-        dataset_path = f'DataSet/ResolutionLevel {level}/TimePoint 0/Channel {channel}/Data'
-        
-        try:
-            dataset = self._file[dataset_path]
-        except KeyError:
-            raise KeyError(f"Invalid level {level} or channel {channel}: dataset not found")
-        
-        data_shape = dataset.shape  # (z, y, x)
-        
-        # Validate coordinates
-        pivot_zyx = (z, y, x)
-        for i in range(3):
-            if pivot_zyx[i] < 0 or pivot_zyx[i] >= data_shape[i]:
-                raise IndexError(f"Coordinate {pivot_zyx[i]} out of bounds for dimension {i} with size {data_shape[i]}")
-
-        # Extract slice based on view type with same logic as h5py implementation
-        if view == ViewType.CORONAL:
-            rg_horizontal = slice(x, x + tile_size)    # -x direction
-            rg_vertical = slice(y, y + tile_size)      # -y direction
-            tile = dataset[z, rg_vertical, rg_horizontal][::-1, ::-1]
-        elif view == ViewType.SAGITTAL:
-            rg_horizontal = slice(z, z + tile_size)    #  z direction
-            rg_vertical = slice(y, y + tile_size)      # -y direction
-            tile = dataset[rg_horizontal, rg_vertical, x][:, ::-1].T
-        elif view == ViewType.HORIZONTAL:
-            rg_horizontal = slice(x, x + tile_size)    # -x direction
-            rg_vertical = slice(z, z + tile_size)      # -z direction
-            tile = dataset[rg_vertical, y, rg_horizontal][::-1, ::-1]
-        else:
-            raise ValueError(f"Unknown view type: {view}")
-        
-        # We may pad to full tile_size here
-        return tile
-    
-    def get_metadata(self) -> Dict:
-        """Extract metadata from the file"""
-        if self._metadata is None:
-            metadata = {
-                "file_path": str(self.file_path),
-                "file_size": self.file_path.stat().st_size,
-                "resolution_levels": self.get_resolution_levels(),
-                "channels": self.get_channels(),
-                "shapes": {},
-                "data_type": None,
-            }
-            
-            # Get shapes for each resolution level
-            levels = metadata["resolution_levels"]
-            channels = metadata["channels"]
-            
-            if levels and channels:
-                for level in levels:
-                    try:
-                        shape = self.get_data_shape(level, channels[0])
-                        metadata["shapes"][level] = shape
-                        
-                        # Get data type from first level
-                        if metadata["data_type"] is None:
-                            dataset_path = f'DataSet/ResolutionLevel {level}/TimePoint 0/Channel {channels[0]}/Data'
-                            dataset = self._file[dataset_path]
-                            metadata["data_type"] = str(dataset.dtype)
-                            
-                    except Exception as e:
-                        logger.warning(f"Could not get shape for level {level}: {e}")
-            
-            self._metadata = metadata
-            
-        return self._metadata
-    
+        filters = self._get_direct_filters(dataset)
+        jobs = []
+        for index in indices:
+            offset = tuple(i * c for i, c in zip(index, dataset.chunks))
+            try:
+                filter_mask, raw = dataset.id.read_direct_chunk(offset)
+            except RuntimeError:
+                if dataset.id.get_chunk_info_by_coord(offset).byte_offset is not None:
+                    raise
+                filter_mask, raw = 0, None
+            jobs.append((raw, filter_mask, self._chunk_slices(dataset, index)))
+
+        def decode(job):
+            raw, filter_mask, chunk_slices = job
+            if raw is None:
+                return np.full(tuple(s.stop - s.start for s in chunk_slices),
+                               dataset.fillvalue, dtype=dataset.dtype)
+            return _decode_chunk(raw, filter_mask, filters, dataset.dtype,
+                                 dataset.chunks, chunk_slices)
+
+        if self.decode_executor is not None and len(jobs) > 1:
+            return list(self.decode_executor.map(decode, jobs))
+        return [decode(job) for job in jobs]
+
+    def _get_direct_filters(self, dataset: h5py.Dataset) -> Optional[List[Tuple[int, int]]]:
+        """Filter pipeline as (index, code) pairs, or None if not decodable here"""
+        name = (dataset.file.filename, dataset.name)
+        if name not in self._direct_filters:
+            plist = dataset.id.get_create_plist()
+            filters = [(i, plist.get_filter(i)[0]) for i in range(plist.get_nfilters())]
+            if dataset.chunks is None or any(code not in _DIRECT_READ_FILTERS for _, code in filters):
+                logger.info(f"Direct chunk read unsupported for {name[0]}:{name[1]}, "
+                            f"using classic reads")
+                self._direct_filters[name] = None
+            else:
+                self._direct_filters[name] = filters
+        return self._direct_filters[name]
+
     def get_histogram(self, level: int, channel: int) -> Optional[np.ndarray]:
         """Get histogram data for a specific level and channel"""
         try:
@@ -173,45 +236,48 @@ class ImarisHandler:
             logger.warning(f"No histogram found for level {level}, channel {channel}")
             return None
     
-    def get_pixel_value_at_coordinate(self, level: int, channel: int, 
-                                    x: int, y: int, z: int) -> Union[int, float]:
-        """Get pixel value at specific 3D coordinate"""
+    def get_histogram_range(self, level: int, channel: int) -> Optional[Tuple[float, float]]:
+        """Get the intensity range spanned by the histogram bins
+
+        Imaris stores it as HistogramMin/HistogramMax attributes of the
+        channel group, written as arrays of single characters.
+        """
         try:
-            dataset_path = f'DataSet/ResolutionLevel {level}/TimePoint 0/Channel {channel}/Data'
-            dataset = self._file[dataset_path]
-            
-            # Check bounds
-            shape = dataset.shape  # (z, y, x)
-            if not (0 <= z < shape[0] and 0 <= y < shape[1] and 0 <= x < shape[2]):
-                raise IndexError(f"Coordinates ({x}, {y}, {z}) out of bounds for shape {shape}")
-            
-            return dataset[z, y, x]
-            
-        except KeyError:
-            raise KeyError(f"Data not found for level {level}, channel {channel}")
-
-    def calculate_tile_grid_size(self, view: ViewType, level: int, 
-                                tile_size: int = 512) -> Tuple[int, int]:
-        """Calculate number of tiles needed in each dimension"""
-        # Get shape for any channel (they should be the same)
-        channels = self.get_channels()
-        if not channels:
-            raise ValueError("No channels found")
-            
-        shape = self.get_data_shape(level, channels[0])  # (z, y, x)
-        
-        # Get the 2D slice dimensions based on view
-        if view == ViewType.SAGITTAL:
-            height, width = shape[0], shape[1]  # z, y
-        elif view == ViewType.CORONAL:
-            height, width = shape[0], shape[2]  # z, x
-        elif view == ViewType.HORIZONTAL:
-            height, width = shape[1], shape[2]  # y, x
-        else:
-            raise ValueError(f"Unknown view type: {view}")
-        
-        # Calculate number of tiles
-        tiles_x = (width + tile_size - 1) // tile_size
-        tiles_y = (height + tile_size - 1) // tile_size
-        
-        return tiles_x, tiles_y
+            attrs = self._file[f'DataSet/ResolutionLevel {level}/TimePoint 0/Channel {channel}'].attrs
+            return _attr_float(attrs['HistogramMin']), _attr_float(attrs['HistogramMax'])
+        except (KeyError, ValueError):
+            return None
+
+
+def _attr_float(value) -> float:
+    """Parse a numeric Imaris attribute, stored as characters or as a number"""
+    if isinstance(value, np.ndarray):
+        value = b''.join(value.ravel().tolist()) if value.dtype.kind == 'S' else value.ravel()[0]
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    return float(value)
+
+
+def _decode_chunk(raw: bytes, filter_mask: int, filters: List[Tuple[int, int]],
+                  dtype: np.dtype, chunks: Tuple[int, ...],
+                  chunk_slices: Tuple[slice, ...]) -> np.ndarray:
+    """Undo the HDF5 filter pipeline of one raw chunk
+
+    Filters run in reverse order of the write pipeline; a set bit in
+    filter_mask means that filter was skipped for this chunk.
+    """
+    data = raw
+    nbytes = int(np.prod(chunks)) * dtype.itemsize
+    for index, code in reversed(filters):
+        if filter_mask & (1 << index):
+            continue
+        if code == h5py.h5z.FILTER_DEFLATE:
+            # Output size is known, avoid growing the buffer while inflating
+            data = zlib.decompress(data, bufsize=nbytes)
+        elif code == h5py.h5z.FILTER_SHUFFLE:
+            data = (np.frombuffer(data, dtype=np.uint8)
+                    .reshape(dtype.itemsize, -1).T.tobytes())
+    # Edge chunks are stored at full chunk size, clip to the dataset extent
+    chunk = np.frombuffer(data, dtype=dtype).reshape(chunks)
+    chunk = chunk[tuple(slice(0, s.stop - s.start) for s in chunk_slices)]
+    return np.ascontiguousarray(chunk)
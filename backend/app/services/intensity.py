@@ -0,0 +1,218 @@
+"""
+Intensity windows and lookup tables mapping raw voxel values to 8-bit display
+"""
+
+import functools
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Window normalisation modes
+WINDOW_GLOBAL = "global"      # Per specimen and channel window, applied through a LUT
+WINDOW_TILE_MAX = "tile_max"  # Legacy: scale each tile by its own maximum
+
+# Transfer functions map [0, 1] to [0, 1], as fn in f_contrast of dev_script/h5_3d_image_plot.py
+TRANSFER_FUNCTIONS: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "linear": lambda t: t,
+    "sqrt": np.sqrt,
+    "square": np.square,
+    "log": lambda t: np.log1p(t * 255) / np.log1p(255),
+}
+
+# Voxels read by the sampled quantile pass when a file has no histogram
+SAMPLE_VOXELS = 1 << 22
+
+# Elements per block when gathering uint16 data through a LUT
+LUT_GATHER_BLOCK = 1 << 14
+
+# Window ranges by (file cache key, channel, quantiles); keys change with the
+# file mtime, so stale entries of rewritten files age out of the LRU
+MAX_WINDOW_RANGES = 256
+_window_ranges: "OrderedDict[Tuple, Tuple[float, float]]" = OrderedDict()
+_window_ranges_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class IntensityWindow:
+    """Display mapping: clip to [low, high], scale to [0, 1], apply transfer then gamma"""
+    low: float
+    high: float
+    transfer: str = "linear"
+    gamma: float = 1.0
+
+    def __post_init__(self):
+        if self.transfer not in TRANSFER_FUNCTIONS:
+            raise ValueError(f"Unknown transfer function: {self.transfer}, "
+                             f"use one of {', '.join(TRANSFER_FUNCTIONS)}")
+        if not self.gamma > 0:
+            raise ValueError(f"Gamma must be positive, got {self.gamma}")
+        if not self.high > self.low:
+            raise ValueError(f"Empty intensity window [{self.low}, {self.high}]")
+
+    def map(self, values: np.ndarray) -> np.ndarray:
+        """Map values to display uint8"""
+        t = np.clip((values.astype(np.float32) - self.low) / (self.high - self.low), 0, 1)
+        t = TRANSFER_FUNCTIONS[self.transfer](t)
+        if self.gamma != 1.0:
+            t = t ** self.gamma
+        return np.round(t * 255).astype(np.uint8)
+
+
+@dataclass(frozen=True)
+class RenderParams:
+    """Client overrides of the display mapping, None keeps the default"""
+    low: Optional[float] = None
+    high: Optional[float] = None
+    gamma: Optional[float] = None
+    transfer: Optional[str] = None
+
+    def __post_init__(self):
+        if self.transfer is not None and self.transfer not in TRANSFER_FUNCTIONS:
+            raise ValueError(f"Unknown transfer function: {self.transfer}, "
+                             f"use one of {', '.join(TRANSFER_FUNCTIONS)}")
+        if self.gamma is not None and not self.gamma > 0:
+            raise ValueError(f"Gamma must be positive, got {self.gamma}")
+        if self.low is not None and self.high is not None and not self.high > self.low:
+            raise ValueError(f"Empty intensity window [{self.low}, {self.high}]")
+
+    def is_default(self) -> bool:
+        return self == RenderParams()
+
+
+# LUTs are 64 kB for uint16 data, so this bounds them to a few MB across all
+# windows requested by clients
+@functools.lru_cache(maxsize=64)
+def get_lut(window: IntensityWindow, size: int) -> np.ndarray:
+    """uint8 lookup table over the integer values 0..size-1, cached per window"""
+    lut = window.map(np.arange(size, dtype=np.float32))
+    lut.flags.writeable = False
+    return lut
+
+
+def apply_window(array: np.ndarray, window: IntensityWindow) -> np.ndarray:
+    """Convert raw tile data to uint8 display values
+
+    uint8/uint16 data goes through a single LUT gather; other types (e.g.
+    uint32, float) are mapped directly.
+    """
+    if array.dtype == np.uint8:
+        return get_lut(window, 256)[array]
+    if array.dtype == np.uint16:
+        return _lut_gather(get_lut(window, 65536), array)
+    return window.map(array)
+
+
+def _lut_gather(lut: np.ndarray, array: np.ndarray) -> np.ndarray:
+    """lut[array], widening the indices to intp a block of rows at a time
+
+    numpy gathers with uint16 indices are ~2x slower than with intp ones, and
+    widening the whole tile would copy it at four times its size.
+    """
+    if array.ndim == 0 or array.size <= LUT_GATHER_BLOCK:
+        return lut[array.astype(np.intp)]
+    out = np.empty(array.shape, dtype=lut.dtype)
+    rows = max(1, LUT_GATHER_BLOCK * array.shape[0] // array.size)
+    for start in range(0, array.shape[0], rows):
+        out[start:start + rows] = lut[array[start:start + rows].astype(np.intp)]
+    return out
+
+
+def window_from_histogram(histogram: np.ndarray, value_range: Tuple[float, float],
+                          low_quantile: float, high_quantile: float) -> Tuple[float, float]:
+    """Intensities at two quantiles of a histogram with equal bins over value_range
+
+    Quantiles are interpolated linearly inside bins.
+    """
+    counts = np.asarray(histogram, dtype=np.float64).ravel()
+    total = counts.sum()
+    if total <= 0:
+        raise ValueError("Empty histogram")
+    edges = np.linspace(value_range[0], value_range[1], len(counts) + 1)
+    cdf = np.concatenate(([0.0], np.cumsum(counts) / total))
+    # Skip empty bins so the interpolation abscissa strictly increases,
+    # starting from the left edge of the first occupied bin
+    keep = np.concatenate(([False], counts > 0))
+    keep[np.argmax(counts > 0)] = True
+    low, high = np.interp([low_quantile, high_quantile], cdf[keep], edges[keep])
+    return float(low), float(high)
+
+
+def sample_window(handler, channel: int, low_quantile: float, high_quantile: float,
+                  max_voxels: int = SAMPLE_VOXELS) -> Tuple[float, float]:
+    """Intensity quantiles from a strided read of the coarsest resolution level"""
+    level = max(handler.get_resolution_levels())
+    dataset = handler.get_dataset(level, channel)
+    stride = max(1, math.ceil((dataset.size / max_voxels) ** (1 / 3)))
+    sample = dataset[::stride, ::stride, ::stride]
+    low, high = np.quantile(sample, [low_quantile, high_quantile])
+    return float(low), float(high)
+
+
+def compute_window_range(handler, channel: int, low_quantile: float,
+                         high_quantile: float) -> Tuple[float, float]:
+    """Display range of a channel from its Imaris histogram, or a sampled pass
+
+    The full resolution histogram is preferred: Imaris computes it over every
+    voxel, so reading it costs a few kB instead of a pass over the data.
+    """
+    low = high = None
+    histogram = handler.get_histogram(0, channel)
+    value_range = handler.get_histogram_range(0, channel)
+    if histogram is not None and value_range is not None:
+        try:
+            low, high = window_from_histogram(histogram, value_range,
+                                              low_quantile, high_quantile)
+        except ValueError as e:
+            logger.warning(f"Unusable histogram for channel {channel}: {e}")
+    if low is None:
+        low, high = sample_window(handler, channel, low_quantile, high_quantile)
+    if high <= low:
+        high = low + 1
+    logger.info(f"Intensity window of {handler.file_path.name} channel {channel}: [{low}, {high}]")
+    return low, high
+
+
+def get_window_range(handler, channel: int, low_quantile: float,
+                     high_quantile: float) -> Tuple[float, float]:
+    """Display range of a channel, computed once per file version"""
+    key = (handler.cache_key, channel, low_quantile, high_quantile)
+    with _window_ranges_lock:
+        window_range = _window_ranges.get(key)
+        if window_range is not None:
+            _window_ranges.move_to_end(key)
+            return window_range
+    # Computed unlocked, a sampled pass can take a while
+    window_range = compute_window_range(handler, channel, low_quantile, high_quantile)
+    with _window_ranges_lock:
+        _window_ranges[key] = window_range
+        while len(_window_ranges) > MAX_WINDOW_RANGES:
+            _window_ranges.popitem(last=False)
+    return window_range
+
+
+def parse_color(value: str) -> Tuple[int, int, int]:
+    """RGB components of a hex colour such as "ff00ff" or "#ff00ff\""""
+    text = value.strip().lstrip("#")
+    if len(text) != 6:
+        raise ValueError(f"Invalid colour: {value}, use RRGGBB hex")
+    try:
+        return tuple(int(text[i:i + 2], 16) for i in (0, 2, 4))
+    except ValueError:
+        raise ValueError(f"Invalid colour: {value}, use RRGGBB hex")
+
+
+def blend_channels(grays: Sequence[np.ndarray],
+                   colors: Sequence[Tuple[int, int, int]]) -> np.ndarray:
+    """Additively blend uint8 channel images, each tinted by its colour, to RGB uint8"""
+    rgb = np.zeros(grays[0].shape + (3,), dtype=np.uint16)
+    for gray, color in zip(grays, colors):
+        # gray * component <= 255 * 255 fits uint16; sums of up to 64 channels too
+        rgb += gray[..., None].astype(np.uint16) * np.array(color, dtype=np.uint16) // 255
+    return np.minimum(rgb, 255).astype(np.uint8)
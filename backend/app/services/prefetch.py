@@ -0,0 +1,379 @@
+"""
+Background prefetching of the tiles a viewer is likely to ask for next
+
+Viewers scrub through slices and pan, so the next requests follow from the
+current one: the neighbouring slices in the direction of travel and the
+tiles around the current one. Each image tile request schedules those
+into a bounded queue; a few threads hand them to the tile executor at
+prefetch priority and put the results into the process's tile cache (L1),
+which also warms the chunk cache. Work for a viewer that has moved on is
+cancelled before it is started.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import logging
+
+from ..config import settings
+from ..models.specimen import ViewType
+from .intensity import RenderParams
+from .render_pool import run_extraction
+from .tile_executor import PRIORITY_PREFETCH, PRIORITY_VIEWPORT, TileQueueFull, tile_executor
+from .volume_reader import VIEW_AXES
+
+logger = logging.getLogger(__name__)
+
+# Viewers and prefetched tile keys remembered for cancellation and hit counts
+MAX_STREAMS = 1024
+MAX_PREFETCHED_KEYS = 4096
+
+
+@dataclass(frozen=True)
+class PrefetchJob:
+    """One tile to render ahead of the viewer that asked for its neighbour"""
+    stream: Hashable
+    specimen_id: str
+    view: ViewType
+    level: int
+    channel: int
+    z: int
+    y: int
+    x: int
+    tile_size: Optional[int]
+    format: str
+    render: RenderParams
+    overlay: Optional[str]
+    overlay_alpha: float
+
+    def position(self) -> Tuple[int, int, int]:
+        """(slice, vertical, horizontal) coordinates in the view"""
+        return _position(self.view, self.z, self.y, self.x)
+
+
+def _position(view: ViewType, z: int, y: int, x: int) -> Tuple[int, int, int]:
+    slice_axis, (vertical, horizontal) = VIEW_AXES[view]
+    zyx = (z, y, x)
+    return zyx[slice_axis], zyx[vertical], zyx[horizontal]
+
+
+def _origin(view: ViewType, position: Tuple[int, int, int]) -> Tuple[int, int, int]:
+    slice_axis, (vertical, horizontal) = VIEW_AXES[view]
+    zyx = [0, 0, 0]
+    zyx[slice_axis], zyx[vertical], zyx[horizontal] = position
+    return tuple(zyx)
+
+
+@dataclass
+class _Focus:
+    """Where a viewer last looked"""
+    level: int
+    position: Tuple[int, int, int]
+    direction: int  # +1 or -1 along the slice axis
+
+
+class _Flight(Future):
+    """Result of a prefetch render, shared with tile requests for the same tile"""
+
+    def __init__(self, prefetcher: "Prefetcher", key: str):
+        super().__init__()
+        self.prefetcher = prefetcher
+        self.key = key
+        self.job: Optional[Future] = None  # Tile executor job, once submitted
+        self.requested = False  # A tile request waits for it
+        self.rendered = False
+        self.counted = False  # Counted as a prefetch hit
+
+    def joined(self):
+        """Called by SingleFlight.run for each tile request that waits for this render"""
+        self.prefetcher._joined(self)
+
+
+class Prefetcher:
+    """Bounded queue of neighbouring tiles rendered by background threads
+
+    A stream identifies one viewer looking at one view of a specimen (see
+    schedule). Queued jobs of a stream are cancelled once the viewer has
+    moved to another level or more than `slices` slices or one tile away.
+    When the queue is full the oldest jobs are dropped.
+    """
+
+    def __init__(self, max_queue: int = 64, slices: int = 2, threads: int = 1):
+        self.max_queue = max_queue
+        self.slices = slices
+        self.threads = threads
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._queue: "deque[Tuple[PrefetchJob, Any, Any, Any]]" = deque()
+        self._queued: set = set()
+        self._focus: "OrderedDict[Hashable, _Focus]" = OrderedDict()
+        self._prefetched: "OrderedDict[str, None]" = OrderedDict()
+        self._workers: List[threading.Thread] = []
+        self._closed = False
+        self.scheduled = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.dropped = 0
+        self.already_cached = 0
+        self.in_flight = 0
+        self.out_of_bounds = 0
+        self.errors = 0
+        self.hits = 0
+
+    def schedule(self, tile_service, cache, stream: Hashable, specimen_id: str,
+                 view: ViewType, level: int, channel: int, z: int, y: int, x: int,
+                 tile_size: Optional[int], format: str, render: RenderParams,
+                 overlay: Optional[str] = None, overlay_alpha: float = 0.4,
+                 flights=None):
+        """Queue the neighbours of a requested tile
+
+        Args:
+            tile_service: TileService rendering the tiles
+            cache: TileCache whose L1 receives them
+            stream: Identifies the viewer, e.g. viewer id or client address, specimen and view
+            flights: SingleFlight of tile requests; a tile in flight there is
+                not rendered again, and requests for a tile being prefetched
+                share its render
+            Others: as passed to TileService.extract_image_tile for the requested tile
+        """
+        if not settings.prefetch_enabled or self.max_queue <= 0:
+            return
+        step = tile_size or tile_service.default_tile_size
+        position = _position(view, z, y, x)
+        with self._lock:
+            if self._closed:
+                return
+            previous = self._focus.pop(stream, None)
+            direction = 1
+            if previous is not None and previous.level == level:
+                delta = position[0] - previous.position[0]
+                direction = -1 if delta < 0 else 1 if delta > 0 else previous.direction
+            focus = _Focus(level, position, direction)
+            self._focus[stream] = focus
+            while len(self._focus) > MAX_STREAMS:
+                self._focus.popitem(last=False)
+            self._drop_stale_locked(stream, focus, step)
+
+            # Nearest first; when full the oldest jobs, of earlier requests, are dropped
+            for candidate in self._candidates(position, direction, step)[:self.max_queue]:
+                if min(candidate) < 0:
+                    continue
+                cz, cy, cx = _origin(view, candidate)
+                job = PrefetchJob(stream, specimen_id, view, level, channel, cz, cy, cx,
+                                  tile_size, format, render, overlay, overlay_alpha)
+                if job in self._queued:
+                    continue
+                if len(self._queue) >= self.max_queue:
+                    old = self._queue.popleft()[0]
+                    self._queued.discard(old)
+                    self.dropped += 1
+                self._queue.append((job, tile_service, cache, flights))
+                self._queued.add(job)
+                self.scheduled += 1
+            self._start_workers_locked()
+            self._ready.notify_all()
+
+    def _candidates(self, position: Tuple[int, int, int], direction: int,
+                    step: int) -> List[Tuple[int, int, int]]:
+        """Next slice ahead and behind, further slices, then the four tiles around"""
+        s, v, h = position
+        ahead = [(s + direction * d, v, h) for d in range(1, self.slices + 1)]
+        behind = [(s - direction * d, v, h) for d in range(1, self.slices + 1)]
+        around = [(s, v, h + step), (s, v, h - step), (s, v + step, h), (s, v - step, h)]
+        return ahead[:1] + behind[:1] + ahead[1:] + behind[1:] + around
+
+    def _is_current(self, job: PrefetchJob, focus: Optional[_Focus], step: int) -> bool:
+        if focus is None or focus.level != job.level:
+            return False
+        s, v, h = job.position()
+        fs, fv, fh = focus.position
+        return abs(s - fs) <= self.slices and abs(v - fv) <= step and abs(h - fh) <= step
+
+    def _drop_stale_locked(self, stream: Hashable, focus: _Focus, step: int):
+        kept = deque()
+        for entry in self._queue:
+            job = entry[0]
+            if job.stream == stream and not self._is_current(job, focus, step):
+                self._queued.discard(job)
+                self.cancelled += 1
+            else:
+                kept.append(entry)
+        self._queue = kept
+
+    def _start_workers_locked(self):
+        self._workers = [t for t in self._workers if t.is_alive()]
+        while len(self._workers) < self.threads:
+            worker = threading.Thread(target=self._run, name=f"tile-prefetch-{len(self._workers)}",
+                                      daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._queue and not self._closed:
+                    self._ready.wait()
+                if self._closed:
+                    return
+                job, tile_service, cache, flights = self._queue.popleft()
+                self._queued.discard(job)
+                step = job.tile_size or tile_service.default_tile_size
+                if not self._is_current(job, self._focus.get(job.stream), step):
+                    self.cancelled += 1
+                    continue
+            self._prefetch(job, tile_service, cache, flights)
+
+    def _prefetch(self, job: PrefetchJob, tile_service, cache, flights=None):
+        try:
+            key = tile_service.image_tile_key(
+                job.specimen_id, job.view, job.level, job.channel, job.z, job.y, job.x,
+                job.tile_size, job.format, job.render, job.overlay, job.overlay_alpha)
+        except Exception as e:
+            logger.debug(f"Prefetch of {job} failed: {e}")
+            with self._lock:
+                self.errors += 1
+            return
+        if cache.l1 is not None and key in cache.l1:
+            with self._lock:
+                self.already_cached += 1
+            return
+        flight = _Flight(self, key)
+        if flights is not None and not flights.claim(key, flight):
+            with self._lock:
+                self.in_flight += 1
+            return
+        try:
+            self._render(job, key, tile_service, cache, flight)
+        finally:
+            if not flight.done():
+                flight.set_exception(RuntimeError("Prefetch did not render the tile"))
+            if flights is not None:
+                flights.release(key, flight)
+
+    def _render(self, job: PrefetchJob, key: str, tile_service, cache, flight: _Flight):
+        try:
+            # Rendered by the tile executor, after any tiles of visible viewports
+            # unless a tile request already waits for it
+            with self._lock:
+                priority = PRIORITY_VIEWPORT if flight.requested else PRIORITY_PREFETCH
+                flight.job = tile_executor.submit(
+                    run_extraction, tile_service, "extract_image_tile", priority=priority,
+                    specimen_id=job.specimen_id, view=job.view, level=job.level,
+                    channel=job.channel, z=job.z, y=job.y, x=job.x, tile_size=job.tile_size,
+                    format=job.format, render=job.render, overlay=job.overlay,
+                    overlay_alpha=job.overlay_alpha)
+            data = flight.job.result()
+        except TileQueueFull as e:
+            flight.set_exception(e)
+            with self._lock:
+                self.dropped += 1
+            return
+        except IndexError as e:
+            # Beyond the last slice or tile of the volume
+            flight.set_exception(e)
+            with self._lock:
+                self.out_of_bounds += 1
+            return
+        except Exception as e:
+            flight.set_exception(e)
+            logger.debug(f"Prefetch of {job} failed: {e}")
+            with self._lock:
+                self.errors += 1
+            return
+        if cache.l1 is not None:
+            cache.l1.put(key, data, len(data))
+        with self._lock:
+            self.completed += 1
+            flight.rendered = True
+            if flight.requested:
+                flight.counted = True
+                self.hits += 1
+            else:
+                self._prefetched[key] = None
+                while len(self._prefetched) > MAX_PREFETCHED_KEYS:
+                    self._prefetched.popitem(last=False)
+        flight.set_result(data)
+
+    def _joined(self, flight: _Flight):
+        """A tile request waits for flight: render it at viewport priority, count the hit"""
+        with self._lock:
+            flight.requested = True
+            if flight.rendered and not flight.counted:
+                flight.counted = True
+                self.hits += 1
+                self._prefetched.pop(flight.key, None)
+            job = flight.job
+        if job is not None:
+            tile_executor.promote(job, PRIORITY_VIEWPORT)
+
+    def record_hit(self, key: str):
+        """Count a cache hit on key if it was prefetched
+
+        Requests that join a prefetch render in flight are counted by _joined.
+        """
+        with self._lock:
+            if key in self._prefetched:
+                del self._prefetched[key]
+                self.hits += 1
+
+    def wait_idle(self, timeout: float = 10.0) -> bool:
+        """Block until the queue is drained and no job is running (for tests and benchmarks)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                settled = (self.completed + self.cancelled + self.already_cached + self.in_flight
+                           + self.out_of_bounds + self.errors + self.dropped) >= self.scheduled
+                if not self._queue and settled:
+                    return True
+            time.sleep(0.005)
+        return False
+
+    def cancel_all(self):
+        """Drop every queued job"""
+        with self._lock:
+            self.cancelled += len(self._queue)
+            self._queue.clear()
+            self._queued.clear()
+            self._focus.clear()
+
+    def close(self):
+        """Drop queued jobs and stop the threads"""
+        with self._lock:
+            self._closed = True
+            self._queue.clear()
+            self._queued.clear()
+            self._ready.notify_all()
+        for worker in self._workers:
+            worker.join(timeout=5.0)
+        with self._lock:
+            self._workers = []
+            self._closed = False
+
+    def stats(self) -> Dict:
+        """Queue length and job counters; hit_rate is the share of prefetched tiles requested"""
+        with self._lock:
+            return {
+                "enabled": settings.prefetch_enabled,
+                "queued": len(self._queue),
+                "scheduled": self.scheduled,
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "dropped": self.dropped,
+                "already_cached": self.already_cached,
+                "in_flight": self.in_flight,
+                "out_of_bounds": self.out_of_bounds,
+                "errors": self.errors,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.completed if self.completed else 0.0,
+            }
+
+
+# Global prefetcher instance
+prefetcher = Prefetcher(
+    max_queue=settings.prefetch_queue_size,
+    slices=settings.prefetch_slices,
+    threads=settings.prefetch_threads,
+)
@@ -0,0 +1,368 @@
+"""
+Pre-rendering of tile pyramids to static files served by nginx
+
+Tiles are rendered with the production TileService, so a pre-rendered file
+is byte for byte what the backend would send for the same URL, and stored
+under a path derived from that URL:
+
+    {root}/{specimen}/image/{view}/{level}/{z}/{y}/{x}_c{channel}.{format}
+    {root}/{specimen}/atlas/{view}/{level}/{z}/{y}/{x}.{format}
+
+nginx maps tile requests without extra query parameters onto these paths
+with try_files and proxies misses to the backend (see nginx/nginx.conf).
+A manifest records the source versions and rendering settings; when they
+change the specimen's tiles are discarded and rendered again.
+
+pack_specimen renders the same tiles into a single archive instead, which
+the backend memory-maps and serves itself (see tile_archive).
+"""
+
+import json
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import itertools
+import logging
+
+from ..config import settings
+from ..models.specimen import TileKind, ViewType
+from .response_cache import file_version
+from .volume_reader import VIEW_AXES, volume_mtime_ns
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+
+
+def tile_relpath(specimen_id: str, kind: str, view: ViewType, level: int,
+                 z: int, y: int, x: int, channel: int, format: str) -> str:
+    """Path of a pre-rendered tile relative to the tile root"""
+    if kind == TileKind.ATLAS.value:
+        return f"{specimen_id}/atlas/{view.value}/{level}/{z}/{y}/{x}.{format}"
+    return f"{specimen_id}/image/{view.value}/{level}/{z}/{y}/{x}_c{channel}.{format}"
+
+
+def tile_origins(shape: Sequence[int], view: ViewType, slice_index: int,
+                 tile_size: int) -> List[Tuple[int, int, int]]:
+    """(z, y, x) origins of the tiles covering one slice of a view"""
+    slice_axis, (vertical, horizontal) = VIEW_AXES[view]
+    origins = []
+    for v in range(0, shape[vertical], tile_size):
+        for h in range(0, shape[horizontal], tile_size):
+            origin = [0, 0, 0]
+            origin[slice_axis], origin[vertical], origin[horizontal] = slice_index, v, h
+            origins.append(tuple(origin))
+    return origins
+
+
+@dataclass(frozen=True)
+class SliceJob:
+    """All tiles of one slice of a view, level and channel"""
+    kind: str
+    view: ViewType
+    level: int
+    channel: int
+    slice_index: int
+    shape: Tuple[int, int, int]
+    formats: Tuple[str, ...]
+
+
+@dataclass
+class PrerenderStats:
+    """Outcome of a pre-render run"""
+    rendered: int = 0
+    skipped: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+    def add(self, other: "PrerenderStats"):
+        self.rendered += other.rendered
+        self.skipped += other.skipped
+        self.bytes += other.bytes
+
+
+def plan_jobs(tile_service, specimen_id: str, kinds: Iterable[str], views: Iterable[ViewType],
+              levels: Optional[Iterable[int]], slice_stride: int,
+              image_formats: Sequence[str], atlas_formats: Sequence[str],
+              channels: Optional[Sequence[int]] = None) -> List[SliceJob]:
+    """Slices to render, coarsest level first so overviews are served soonest"""
+    jobs = []
+    for kind in kinds:
+        if kind == TileKind.ATLAS.value:
+            kind_channels, formats = [0], tuple(atlas_formats)
+            available = tile_service.get_atlas_info(specimen_id)["resolution_levels"]
+        else:
+            kind_channels = channels if channels is not None else tile_service.get_image_channels(specimen_id)
+            formats = tuple(image_formats)
+            available = tile_service.get_image_info(specimen_id)["resolution_levels"]
+        kind_levels = [l for l in (levels if levels is not None else available) if l in available]
+        for level in sorted(kind_levels, reverse=True):
+            for view in views:
+                grid = tile_service.calculate_tile_grid(specimen_id, view, level, kind=kind)
+                shape = tuple(grid["image_shape"])
+                slice_axis = VIEW_AXES[view][0]
+                for slice_index in range(0, shape[slice_axis], slice_stride):
+                    for channel in kind_channels:
+                        jobs.append(SliceJob(kind, view, level, channel, slice_index,
+                                             shape, formats))
+    return jobs
+
+
+def rendering_manifest(tile_service, specimen_id: str, kinds: Iterable[str]) -> Dict:
+    """Everything the bytes of a pre-rendered tile depend on"""
+    manifest = {
+        "tile_size": tile_service.default_tile_size,
+        "encoder": tile_service.encoder.name,
+        "image_encode_options": asdict(tile_service.image_encode_options),
+        "atlas_encode_options": asdict(tile_service.atlas_encode_options),
+        "rendering": tile_service._rendering_token(),
+    }
+    for kind in kinds:
+        path = (settings.get_atlas_path(specimen_id) if kind == TileKind.ATLAS.value
+                else settings.get_image_path(specimen_id))
+        manifest[f"{kind}_source"] = [path.name, volume_mtime_ns(path)]
+    if TileKind.ATLAS.value in kinds:
+        manifest["regions_version"] = file_version(settings.get_regions_file())
+    return json.loads(json.dumps(manifest))
+
+
+# TileService of a worker process, created on first use
+_tile_service = None
+
+
+def _worker_tile_service():
+    global _tile_service
+    if _tile_service is None:
+        from .tile_service import TileService
+        _tile_service = TileService()
+    return _tile_service
+
+
+def _render_tile(service, job: SliceJob, specimen_id: str, z: int, y: int, x: int,
+                 format: str) -> bytes:
+    if job.kind == TileKind.ATLAS.value:
+        return service.extract_atlas_tile(specimen_id=specimen_id, view=job.view,
+                                          level=job.level, z=z, y=y, x=x, format=format)
+    return service.extract_image_tile(specimen_id=specimen_id, view=job.view,
+                                      level=job.level, channel=job.channel,
+                                      z=z, y=y, x=x, format=format)
+
+
+def render_slice(job: SliceJob, root: str, specimen_id: str) -> PrerenderStats:
+    """Render the tiles of one slice that are not on disk yet
+
+    Files are written to a temporary name and renamed, so nginx never serves
+    a partial tile and an interrupted run leaves no truncated files.
+    """
+    service = _worker_tile_service()
+    stats = PrerenderStats()
+    tile_size = service.default_tile_size
+    for z, y, x in tile_origins(job.shape, job.view, job.slice_index, tile_size):
+        for format in job.formats:
+            relpath = tile_relpath(specimen_id, job.kind, job.view, job.level,
+                                   z, y, x, job.channel, format)
+            path = os.path.join(root, relpath)
+            if os.path.exists(path):
+                stats.skipped += 1
+                continue
+            data = _render_tile(service, job, specimen_id, z, y, x, format)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            stats.rendered += 1
+            stats.bytes += len(data)
+    return stats
+
+
+def render_slice_tiles(job: SliceJob, specimen_id: str) -> List[Tuple[int, int, int, str, bytes]]:
+    """Render all tiles of one slice as (z, y, x, format, data) for a tile archive"""
+    service = _worker_tile_service()
+    return [(z, y, x, format, _render_tile(service, job, specimen_id, z, y, x, format))
+            for z, y, x in tile_origins(job.shape, job.view, job.slice_index,
+                                        service.default_tile_size)
+            for format in job.formats]
+
+
+def _run_jobs(func: Callable, jobs: Sequence, args: Tuple, workers: int,
+              finished: Callable[[object, int], None]):
+    """Call func(job, *args) for every job, in worker processes if workers > 1
+
+    finished receives each result in the calling process, in completion order.
+    """
+    if workers <= 1:
+        for n, job in enumerate(jobs, 1):
+            finished(func(job, *args), n)
+        return
+    from .handler_pool import handler_pool
+
+    # Forked workers must not share the HDF5 handles of this process
+    handler_pool.close_all()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        queue = iter(jobs)
+        n_done = 0
+        while True:
+            for job in itertools.islice(queue, 2 * workers - len(pending)):
+                pending.add(pool.submit(func, job, *args))
+            if not pending:
+                break
+            completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in completed:
+                n_done += 1
+                finished(future.result(), n_done)
+
+
+def _default_image_formats() -> Tuple[str, ...]:
+    """JPEG plus the formats negotiated via Accept, which nginx picks from the same way"""
+    return tuple(dict.fromkeys(["jpeg"] + settings.negotiated_tile_formats))
+
+
+def prerender_specimen(specimen_id: str, root: Union[str, Path],
+                       kinds: Sequence[str] = ("image", "atlas"),
+                       views: Sequence[ViewType] = tuple(ViewType),
+                       levels: Optional[Iterable[int]] = None, slice_stride: int = 1,
+                       image_formats: Optional[Sequence[str]] = None,
+                       atlas_formats: Sequence[str] = ("png", "webp"),
+                       channels: Optional[Sequence[int]] = None, workers: int = 1,
+                       report_interval: float = 10.0,
+                       progress: Optional[Callable[[str], None]] = None) -> PrerenderStats:
+    """Render the tiles of a specimen below root, skipping those already rendered
+
+    Args:
+        specimen_id: Specimen to render
+        root: Directory nginx serves the tiles from
+        kinds: "image" and/or "atlas"
+        views: Views to render
+        levels: Resolution levels (default: all)
+        slice_stride: Render every slice_stride-th slice along each view's slice axis
+        image_formats: Image tile formats (default: JPEG plus the formats
+            negotiated via Accept, which nginx picks from the same way)
+        atlas_formats: Atlas tile formats
+        channels: Image channels (default: all)
+        workers: Processes rendering slices in parallel; 1 renders in this process
+        report_interval: Seconds between throughput reports
+        progress: Receives progress messages (default: logger.info)
+    """
+    global _tile_service
+    from .tile_service import TileService
+
+    if slice_stride < 1:
+        raise ValueError(f"Slice stride must be positive: {slice_stride}")
+    progress = progress or logger.info
+    image_formats = image_formats or _default_image_formats()
+    service = TileService()
+    root = Path(root)
+    specimen_root = root / specimen_id
+
+    manifest = rendering_manifest(service, specimen_id, kinds)
+    manifest_path = specimen_root / MANIFEST_FILE
+    if specimen_root.exists():
+        try:
+            previous = json.loads(manifest_path.read_text())
+        except (OSError, ValueError):
+            previous = None
+        if previous != manifest:
+            # Tiles of other data or settings would be served as if current
+            progress(f"Sources or rendering settings changed, discarding {specimen_root}")
+            shutil.rmtree(specimen_root)
+    specimen_root.mkdir(parents=True, exist_ok=True)
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+
+    jobs = plan_jobs(service, specimen_id, kinds, views, levels, slice_stride,
+                     image_formats, atlas_formats, channels)
+    progress(f"{specimen_id}: {len(jobs)} slices to render")
+
+    stats = PrerenderStats()
+    t0 = last_report = time.perf_counter()
+
+    def finished(job_stats: PrerenderStats, n_done: int):
+        nonlocal last_report
+        stats.add(job_stats)
+        now = time.perf_counter()
+        if now - last_report >= report_interval:
+            last_report = now
+            rate = stats.rendered / max(now - t0, 1e-9)
+            progress(f"{specimen_id}: {n_done}/{len(jobs)} slices, {stats.rendered} tiles "
+                     f"rendered ({rate:.0f} tiles/s), {stats.skipped} already present")
+
+    if workers <= 1:
+        _tile_service = service
+    _run_jobs(render_slice, jobs, (str(root), specimen_id), workers, finished)
+
+    stats.seconds = time.perf_counter() - t0
+    progress(f"{specimen_id}: rendered {stats.rendered} tiles ({stats.bytes / 1e6:.1f} MB) "
+             f"in {stats.seconds:.1f} s, skipped {stats.skipped}")
+    return stats
+
+
+def pack_specimen(specimen_id: str, path: Optional[Union[str, Path]] = None,
+                  kinds: Sequence[str] = ("image", "atlas"),
+                  views: Sequence[ViewType] = tuple(ViewType),
+                  levels: Optional[Iterable[int]] = None, slice_stride: int = 1,
+                  image_formats: Optional[Sequence[str]] = None,
+                  atlas_formats: Sequence[str] = ("png", "webp"),
+                  channels: Optional[Sequence[int]] = None, workers: int = 1,
+                  report_interval: float = 10.0,
+                  progress: Optional[Callable[[str], None]] = None) -> PrerenderStats:
+    """Render the tiles of a specimen into a packed tile archive
+
+    The backend serves tiles from the archive at settings.get_tile_archive_path
+    while its manifest matches the sources and rendering settings (see
+    tile_archive). Arguments are as for prerender_specimen; path defaults to
+    the archive path the backend reads. The archive is always written anew.
+    """
+    global _tile_service
+    from .tile_archive import TileArchiveWriter
+    from .tile_service import TileService
+
+    if slice_stride < 1:
+        raise ValueError(f"Slice stride must be positive: {slice_stride}")
+    progress = progress or logger.info
+    image_formats = image_formats or _default_image_formats()
+    service = TileService()
+    path = Path(path) if path is not None else settings.get_tile_archive_path(specimen_id)
+
+    manifest = rendering_manifest(service, specimen_id, kinds)
+    manifest["kinds"] = list(kinds)
+    jobs = plan_jobs(service, specimen_id, kinds, views, levels, slice_stride,
+                     image_formats, atlas_formats, channels)
+    progress(f"{specimen_id}: {len(jobs)} slices to pack into {path}")
+
+    stats = PrerenderStats()
+    t0 = last_report = time.perf_counter()
+
+    def finished(result: Tuple[int, List], n_done: int):
+        nonlocal last_report
+        job = jobs[result[0]]
+        for z, y, x, format, data in result[1]:
+            writer.add(job.kind, job.view, job.level, z, y, x, job.channel, format, data)
+            stats.rendered += 1
+            stats.bytes += len(data)
+        now = time.perf_counter()
+        if now - last_report >= report_interval:
+            last_report = now
+            rate = stats.rendered / max(now - t0, 1e-9)
+            progress(f"{specimen_id}: {n_done}/{len(jobs)} slices, {stats.rendered} tiles "
+                     f"packed ({rate:.0f} tiles/s)")
+
+    if workers <= 1:
+        _tile_service = service
+    # Workers only render; this process is the single writer of the archive
+    with TileArchiveWriter(path, manifest) as writer:
+        _run_jobs(_pack_job, list(enumerate(jobs)), (specimen_id,), workers, finished)
+    stats.seconds = time.perf_counter() - t0
+    progress(f"{specimen_id}: packed {stats.rendered} tiles ({writer.bytes_written / 1e6:.1f} MB "
+             f"stored, {writer.duplicates} duplicates shared) in {stats.seconds:.1f} s")
+    return stats
+
+
+def _pack_job(indexed_job: Tuple[int, SliceJob], specimen_id: str) -> Tuple[int, List]:
+    """Render a slice for pack_specimen, keeping its position in the job list"""
+    index, job = indexed_job
+    return index, render_slice_tiles(job, specimen_id)
@@ -0,0 +1,203 @@
+"""
+Ranked type-ahead search over region names, abbreviations and Chinese names
+"""
+
+import bisect
+import heapq
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ..models.region import Region
+
+# Searched fields of a region
+FIELD_NAME, FIELD_ABBREVIATION, FIELD_NAME_ZH = range(3)
+N_FIELDS = 3
+
+# Match scores, best first; fuzzy matches are scaled by their similarity
+SCORE_EXACT = 100
+SCORE_PREFIX = 80        # Name or abbreviation starts with the query
+SCORE_WORD_PREFIX = 60   # Every query word starts a word of the name
+SCORE_SUBSTRING = 40
+SCORE_FUZZY = 30
+EXACT_ABBREVIATION_BONUS = 10  # "V1" is more likely the area V1 than a name containing "v1"
+
+FUZZY_THRESHOLD = 0.35  # Minimum trigram similarity of a fuzzy match
+NGRAM = 3
+
+_SEPARATORS = re.compile(r"[\W_]+")
+
+
+def normalize(text: Optional[str]) -> str:
+    """Case-folded text without accents, words separated by single spaces"""
+    if not text:
+        return ""
+    text = "".join(c for c in unicodedata.normalize("NFKD", text)
+                   if not unicodedata.combining(c))
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return " ".join(_SEPARATORS.sub(" ", text).split())
+
+
+def ngrams(text: str) -> set:
+    """Character trigrams of normalised text, padded so word edges count"""
+    padded = f" {text} "
+    return {padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1)}
+
+
+class RegionSearchIndex:
+    """Prebuilt index answering ranked searches without scanning all regions
+
+    Sorted lists of whole field texts and of their words serve exact and
+    prefix lookups by bisection. Trigram indexes over fields give substring
+    candidates, and over distinct words give fuzzy (typo tolerant) matches.
+    Match tiers are tried best first and lower tiers are skipped once the
+    better ones fill the requested number of results. Substrings of one or
+    two characters fall back to a scan of the normalised texts.
+    """
+
+    def __init__(self, regions: Sequence[Region]):
+        self.regions = list(regions)
+        # Normalised field texts by region position
+        self._fields: List[Tuple[str, str, str]] = [
+            (normalize(r.name), normalize(r.abbreviation), normalize(r.name_zh))
+            for r in self.regions
+        ]
+        exact: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        words: Dict[str, set] = defaultdict(set)
+        field_grams: Dict[str, List[int]] = defaultdict(list)
+        for position, fields in enumerate(self._fields):
+            for field, text in enumerate(fields):
+                if not text:
+                    continue
+                exact[text].append((position, field))
+                for word in text.split():
+                    words[word].add(position)
+                for gram in ngrams(text):
+                    field_grams[gram].append(position * N_FIELDS + field)
+        self._exact = dict(exact)
+        self._wholes = sorted(exact)
+        self._whole_positions = [tuple(sorted({p for p, _ in exact[t]})) for t in self._wholes]
+        self._words = sorted(words)
+        self._word_positions = [tuple(sorted(words[w])) for w in self._words]
+        self._field_grams = dict(field_grams)
+        word_grams: Dict[str, List[int]] = defaultdict(list)
+        self._word_ngram_counts = []
+        for word_id, word in enumerate(self._words):
+            grams = ngrams(word)
+            self._word_ngram_counts.append(len(grams))
+            for gram in grams:
+                word_grams[gram].append(word_id)
+        self._word_grams = dict(word_grams)
+
+    def __len__(self) -> int:
+        return len(self.regions)
+
+    def search(self, query: str, limit: int = 50, fuzzy: bool = True) -> List[Region]:
+        """Regions matching query, best first
+
+        Ties are broken by shorter name, then by order in the regions file.
+        """
+        return [self.regions[position] for position, _ in self.ranked(query, limit, fuzzy)]
+
+    def ranked(self, query: str, limit: int = 50, fuzzy: bool = True) -> List[Tuple[int, float]]:
+        """(region position, score) of the best matches of query"""
+        q = normalize(query)
+        if not q or limit <= 0:
+            return []
+        scores: Dict[int, float] = {}
+
+        def add(positions, score: float):
+            for position in positions:
+                if score > scores.get(position, 0):
+                    scores[position] = score
+
+        for position, field in self._exact.get(q, ()):
+            add((position,), SCORE_EXACT + (EXACT_ABBREVIATION_BONUS
+                                            if field == FIELD_ABBREVIATION else 0))
+        add(self._prefixed(self._wholes, self._whole_positions, q), SCORE_PREFIX)
+
+        # Every query word starts a word of the region
+        words = q.split()
+        add(self._all_words(words, fuzzy=False), SCORE_WORD_PREFIX)
+
+        if len(scores) < limit:
+            add(self._substring_matches(q), SCORE_SUBSTRING)
+
+        if fuzzy and len(scores) < limit:
+            for position, similarity in self._all_words(words, fuzzy=True).items():
+                add((position,), SCORE_FUZZY * similarity)
+
+        return heapq.nsmallest(limit, scores.items(), key=lambda item: (
+            -item[1], len(self._fields[item[0]][FIELD_NAME]), item[0]))
+
+    @staticmethod
+    def _prefixed(keys: List[str], positions: List[Tuple[int, ...]], prefix: str) -> set:
+        """Positions listed under the sorted keys starting with prefix"""
+        found = set()
+        for i in range(bisect.bisect_left(keys, prefix), len(keys)):
+            if not keys[i].startswith(prefix):
+                break
+            found.update(positions[i])
+        return found
+
+    def _all_words(self, words: List[str], fuzzy: bool):
+        """Regions where every query word prefixes a word, or (fuzzy) resembles one
+
+        Returns a set of positions, or for fuzzy matching a dict of position
+        to the lowest similarity among the query words.
+        """
+        matched = None
+        for word in words:
+            if fuzzy:
+                current = self._similar_words(word)
+                # Exact prefixes also satisfy a word of a fuzzy query
+                for position in self._prefixed(self._words, self._word_positions, word):
+                    current[position] = 1.0
+            else:
+                current = self._prefixed(self._words, self._word_positions, word)
+            if matched is None:
+                matched = current
+            elif fuzzy:
+                matched = {p: min(s, current[p]) for p, s in matched.items() if p in current}
+            else:
+                matched &= current
+            if not matched:
+                break
+        return matched or ({} if fuzzy else set())
+
+    def _similar_words(self, word: str) -> Dict[int, float]:
+        """Position to best trigram Jaccard similarity of its words to word"""
+        similar: Dict[int, float] = {}
+        if len(word) < NGRAM:
+            return similar
+        query_grams = ngrams(word)
+        overlaps: Dict[int, int] = defaultdict(int)
+        for gram in query_grams:
+            for word_id in self._word_grams.get(gram, ()):
+                overlaps[word_id] += 1
+        for word_id, overlap in overlaps.items():
+            similarity = overlap / (len(query_grams) + self._word_ngram_counts[word_id] - overlap)
+            if similarity >= FUZZY_THRESHOLD:
+                for position in self._word_positions[word_id]:
+                    if similarity > similar.get(position, 0):
+                        similar[position] = similarity
+        return similar
+
+    def _substring_matches(self, q: str) -> set:
+        """Positions of regions with q inside one of their fields"""
+        if len(q) < NGRAM:
+            return {position for position, fields in enumerate(self._fields)
+                    if any(q in text for text in fields)}
+        # Only fields holding all inner trigrams of q can contain it
+        postings = sorted((self._field_grams.get(q[i:i + NGRAM], ())
+                           for i in range(len(q) - NGRAM + 1)), key=len)
+        if not postings[0]:
+            return set()
+        docs = set(postings[0])
+        for posting in postings[1:]:
+            docs.intersection_update(posting)
+            if not docs:
+                return set()
+        return {doc // N_FIELDS for doc in docs
+                if q in self._fields[doc // N_FIELDS][doc % N_FIELDS]}
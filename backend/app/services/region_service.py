@@ -0,0 +1,223 @@
+"""
+Service for brain region data and atlas label colouring
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Optional
+import logging
+
+import numpy as np
+
+from ..models.region import Region, RegionHierarchy
+from ..config import settings
+from .intensity import parse_color
+from .region_search import RegionSearchIndex
+from .response_cache import file_version
+
+logger = logging.getLogger(__name__)
+
+# Overlay modes of image tiles
+OVERLAY_FILL = "fill"          # Alpha blend region colours over the image
+OVERLAY_BOUNDARY = "boundary"  # Draw region outlines only
+OVERLAY_MODES = (OVERLAY_FILL, OVERLAY_BOUNDARY)
+
+# Colours for regions without one, by region id, as in the frontend RegionTab
+FALLBACK_REGION_COLORS = [
+    'ff6b6b', '4ecdc4', '45b7d1', '96ceb4', 'ffeaa7',
+    'fd79a8', 'e17055', '81ecec', '74b9ff', 'a29bfe'
+]
+
+# Palette index given to labels that have none
+PALETTE_MISSING = 0xFFFF
+
+# Cache for region data
+_region_cache = None
+_label_colors = None
+_atlas_palette = None
+_region_version = None
+_search_index = None
+
+
+@dataclass(frozen=True)
+class AtlasPalette:
+    """Mapping of atlas labels to the indices of an 8-bit PNG palette
+
+    When every region value is below 256 the index is the label itself, so
+    tiles hold raw labels; otherwise the regions get consecutive indices in
+    order of value, listed by labels.
+    """
+    index: np.ndarray   # uint16 palette index by label value, PALETTE_MISSING if none
+    labels: np.ndarray  # Label value by palette index
+    colors: np.ndarray  # RGBA by palette index
+
+    @property
+    def identity(self) -> bool:
+        return len(self.index) == 256 and bool((self.labels == np.arange(256)).all())
+
+
+def load_region_hierarchy() -> RegionHierarchy:
+    """Load region hierarchy from JSON file, again whenever the file changes"""
+    global _region_cache, _region_version, _label_colors, _atlas_palette, _search_index
+
+    regions_file = settings.get_regions_file()
+    version = file_version(regions_file)
+
+    if version is None:
+        raise FileNotFoundError(f"Regions file not found: {regions_file}")
+
+    if _region_cache is None or version != _region_version:
+        try:
+            with open(regions_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+
+            # Convert region data to Region objects
+            regions = [Region(**region) for region in data['regions']]
+
+            # Convert region_lookup values to Region objects
+            region_lookup = {
+                str(k): Region(**v) for k, v in data['region_lookup'].items()
+            }
+
+            _region_cache = RegionHierarchy(
+                metadata=data['metadata'],
+                regions=regions,
+                hierarchy=data['hierarchy'],
+                region_lookup=region_lookup
+            )
+
+            _region_version = version
+            # Derived tables follow the loaded regions
+            _label_colors = None
+            _atlas_palette = None
+            _search_index = RegionSearchIndex(regions)
+            logger.info(f"Loaded {len(regions)} brain regions")
+
+        except Exception as e:
+            logger.error(f"Failed to load regions: {e}")
+            raise
+
+    return _region_cache
+
+
+def get_region_search_index() -> RegionSearchIndex:
+    """Search index of the current regions, built when they are loaded"""
+    load_region_hierarchy()
+    return _search_index
+
+
+def region_color(region: Region) -> str:
+    """Display colour of a region as RRGGBB"""
+    return region.color or FALLBACK_REGION_COLORS[region.id % len(FALLBACK_REGION_COLORS)]
+
+
+def get_label_colors() -> np.ndarray:
+    """Dense RGBA table indexed by atlas label value, built once per regions file
+
+    Labels without a region (including background 0) are fully transparent.
+    """
+    global _label_colors
+
+    hierarchy = load_region_hierarchy()
+    if _label_colors is None:
+        size = max((r.value for r in hierarchy.regions), default=0) + 1
+        table = np.zeros((size, 4), dtype=np.uint8)
+        for region in hierarchy.regions:
+            if region.value > 0:
+                table[region.value, :3] = parse_color(region_color(region))
+                table[region.value, 3] = 255
+        table.flags.writeable = False
+        _label_colors = table
+
+    return _label_colors
+
+
+def get_atlas_palette() -> Optional[AtlasPalette]:
+    """Palette of atlas tiles, built once per regions file; None if regions need
+    more than 256 colours"""
+    global _atlas_palette
+
+    colors = get_label_colors()
+    if _atlas_palette is None:
+        values = np.flatnonzero(colors[:, 3])  # Label values of regions, ascending
+        if len(colors) <= 256:
+            labels = np.arange(256)
+        elif len(values) < 256:
+            labels = np.concatenate(([0], values))
+        else:
+            logger.warning(f"{len(values)} regions do not fit an 8-bit palette")
+            _atlas_palette = False  # Cached negative result
+            return None
+        index = np.full(max(len(colors), 256), PALETTE_MISSING, dtype=np.uint16)
+        index[labels] = np.arange(len(labels))
+        palette = np.zeros((len(labels), 4), dtype=np.uint8)
+        known = labels < len(colors)
+        palette[known] = colors[labels[known]]
+        for array in (index, labels, palette):
+            array.flags.writeable = False
+        _atlas_palette = AtlasPalette(index=index, labels=labels, colors=palette)
+
+    return _atlas_palette or None
+
+
+def palette_indices(labels: np.ndarray, palette: AtlasPalette) -> np.ndarray:
+    """uint8 palette indices of a label tile
+
+    Labels without an entry get index 0, the transparent background.
+    """
+    if labels.dtype == np.uint8 and palette.identity:
+        return labels
+    if labels.size == 0:
+        return labels.astype(np.uint8)
+    known = (labels >= 0) & (labels < len(palette.index))
+    indices = palette.index[np.where(known, labels, 0)]
+    indices[~known | (indices > 0xFF)] = 0
+    return indices.astype(np.uint8)
+
+
+def label_boundaries(labels: np.ndarray) -> np.ndarray:
+    """Mask of pixels whose label differs from a 4-connected neighbour"""
+    edges = np.zeros(labels.shape, dtype=bool)
+    horizontal = labels[:, 1:] != labels[:, :-1]
+    vertical = labels[1:, :] != labels[:-1, :]
+    edges[:, 1:] |= horizontal
+    edges[:, :-1] |= horizontal
+    edges[1:, :] |= vertical
+    edges[:-1, :] |= vertical
+    return edges
+
+
+def overlay_labels(gray: np.ndarray, labels: np.ndarray, mode: str = OVERLAY_FILL,
+                   alpha: float = 0.4, colors: Optional[np.ndarray] = None) -> np.ndarray:
+    """Colour atlas labels over a uint8 grayscale tile, returning RGB uint8
+
+    Args:
+        gray: Image tile, 2D uint8
+        labels: Atlas tile aligned with gray; cropped or zero padded to its shape
+        mode: OVERLAY_FILL blends region colours with weight alpha,
+            OVERLAY_BOUNDARY paints region outlines with weight alpha
+        colors: RGBA table by label value (default: get_label_colors())
+    """
+    if mode not in OVERLAY_MODES:
+        raise ValueError(f"Unknown overlay mode: {mode}, use one of {', '.join(OVERLAY_MODES)}")
+    if colors is None:
+        colors = get_label_colors()
+
+    if labels.shape != gray.shape:
+        fitted = np.zeros(gray.shape, dtype=labels.dtype)
+        h, w = min(gray.shape[0], labels.shape[0]), min(gray.shape[1], labels.shape[1])
+        fitted[:h, :w] = labels[:h, :w]
+        labels = fitted
+
+    # Labels beyond the table have no region
+    index = labels.astype(np.intp)
+    index[(index < 0) | (index >= len(colors))] = 0
+    rgba = colors[index]
+
+    weight = (rgba[..., 3] > 0).astype(np.float32) * alpha
+    if mode == OVERLAY_BOUNDARY:
+        weight *= label_boundaries(labels)
+
+    rgb = np.repeat(gray[..., None], 3, axis=2).astype(np.float32)
+    rgb += (rgba[..., :3] - rgb) * weight[..., None]
+    return np.round(rgb).astype(np.uint8)
@@ -0,0 +1,288 @@
+"""
+Process-pool tile rendering: renderer processes with results in shared memory
+
+Decompression and encoding are CPU-bound and partly hold the GIL, so a
+single process renders on little more than one core. Running several
+uvicorn workers instead has each of them open every file and keep its own
+caches. With tile_render_mode = "process" the API process stays the only
+HTTP front, with the one tile cache, and hands extractions to
+tile_render_processes renderer processes. Each renderer keeps its files
+open (its own handler pool and share of the chunk cache budget) and
+writes encoded tiles into a shared memory slot, so only a short message
+goes through its pipe; results larger than the slot are piped instead.
+
+Renderers are started with "spawn", as the front has threads running, and
+get the front's settings. Tile executor threads dispatch to them, one job
+per renderer at a time, so size tile_executor_threads at least as large.
+
+The pool belongs to one API process. Process mode is meant for a single
+uvicorn worker: with --workers N every worker starts its own pool, so N x
+tile_render_processes renderers and N x that many shared memory slots.
+"""
+
+import multiprocessing
+import queue
+import threading
+from multiprocessing import shared_memory
+from typing import Any, Dict, Optional
+import logging
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+RENDER_MODE_THREAD = "thread"
+RENDER_MODE_PROCESS = "process"
+
+# TileService methods renderers run
+RENDER_METHODS = ("extract_image_tile", "extract_atlas_tile", "extract_composite_tile")
+
+
+def _picklable(e: Exception) -> Exception:
+    """e itself if it can be sent to the front, else a RuntimeError with its message"""
+    import pickle
+    try:
+        pickle.loads(pickle.dumps(e))
+        return e
+    except Exception:
+        return RuntimeError(f"{type(e).__name__}: {e}")
+
+
+def _renderer_main(conn, shm_name: str, values: Dict[str, Any]):
+    """Renderer process: run extractions received on conn until it is closed"""
+    for name, value in values.items():
+        setattr(settings, name, value)
+    # Imported after the settings are applied, as they size the caches
+    from .tile_service import TileService
+
+    service = TileService()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            if message is None:
+                break
+            method, args, kwargs = message
+            try:
+                data = getattr(service, method)(*args, **kwargs)
+            except Exception as e:
+                conn.send(("error", _picklable(e)))
+                continue
+            if len(data) <= shm.size:
+                shm.buf[:len(data)] = data
+                conn.send(("shm", len(data)))
+            else:
+                conn.send(("bytes", bytes(data)))
+    finally:
+        shm.close()
+        service.handler_pool.close_all()
+
+
+class _RendererExited(Exception):
+    pass
+
+
+class _RendererTimeout(_RendererExited):
+    pass
+
+
+class _Renderer:
+    """One renderer process with its pipe and result slot"""
+
+    def __init__(self, context, index: int, slot_bytes: int, values: Dict[str, Any]):
+        self.index = index
+        self.shm = shared_memory.SharedMemory(create=True, size=slot_bytes)
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_renderer_main, name=f"tile-renderer-{index}",
+                                       args=(child_conn, self.shm.name, values), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def call(self, method: str, args: tuple, kwargs: dict, timeout: Optional[float] = None) -> bytes:
+        try:
+            self.conn.send((method, args, kwargs))
+            if not self.conn.poll(timeout):
+                # Hung, e.g. in file I/O: stopped here, restarted by the pool
+                self.process.kill()
+                raise _RendererTimeout(f"no result within {timeout} s")
+            kind, value = self.conn.recv()
+        except (EOFError, OSError) as e:
+            raise _RendererExited(str(e))
+        if kind == "shm":
+            return bytes(self.shm.buf[:value])
+        if kind == "bytes":
+            return value
+        raise value
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=5.0)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=5.0)
+        self.conn.close()
+        self.shm.close()
+        self.shm.unlink()
+
+
+class RenderPool:
+    """Renderer processes running TileService extractions for the front process"""
+
+    def __init__(self, processes: int = 4, slot_bytes: int = 16 * 1024 * 1024,
+                 values: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None):
+        """
+        Args:
+            processes: Renderer processes
+            slot_bytes: Shared memory per renderer for one encoded tile
+            timeout: Seconds a renderer may take for a tile before it is
+                restarted (default: settings.request_timeout, the tile deadline)
+            values: Settings for the renderers (default: the front's, with the
+                chunk and slab cache budgets split between the renderers)
+        """
+        self.processes = max(1, processes)
+        self.slot_bytes = slot_bytes
+        self.timeout = settings.request_timeout if timeout is None else timeout
+        if values is None:
+            values = settings.model_dump()
+            values["chunk_cache_bytes"] //= self.processes
+            values["slab_cache_bytes"] //= self.processes
+        self._values = values
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._idle: "queue.Queue[Optional[_Renderer]]" = queue.Queue()
+        self._renderers = [_Renderer(self._context, i, slot_bytes, values)
+                           for i in range(self.processes)]
+        for renderer in self._renderers:
+            self._idle.put(renderer)
+        self._closed = False
+        self.jobs = 0
+        self.shared = 0
+        self.piped = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.restarts = 0
+
+    def call(self, method: str, *args, **kwargs) -> bytes:
+        """tile_service.<method>(*args, **kwargs) run by the next idle renderer"""
+        if method not in RENDER_METHODS:
+            raise ValueError(f"Not a render method: {method}")
+        renderer = self._idle.get()
+        if renderer is None:
+            # Closed; pass the wake-up on to the next waiting call
+            self._idle.put(None)
+            raise RuntimeError("Tile render pool is closed")
+        try:
+            data = renderer.call(method, args, kwargs, self.timeout)
+        except _RendererExited as e:
+            with self._lock:
+                self.errors += 1
+                if isinstance(e, _RendererTimeout):
+                    self.timeouts += 1
+                if not self._closed:
+                    renderer = self._restart(renderer)
+            if isinstance(e, _RendererTimeout):
+                raise TimeoutError(f"Tile renderer {renderer.index} gave {e}")
+            raise RuntimeError(f"Tile renderer {renderer.index} exited")
+        except Exception:
+            with self._lock:
+                self.jobs += 1
+                self.errors += 1
+            raise
+        finally:
+            # Renderers of a closed pool are stopped, dead ones are not requeued either
+            with self._lock:
+                if not self._closed:
+                    self._idle.put(renderer)
+        with self._lock:
+            self.jobs += 1
+            if len(data) <= self.slot_bytes:
+                self.shared += 1
+            else:
+                self.piped += 1
+        return data
+
+    def _restart(self, renderer: _Renderer) -> _Renderer:
+        logger.warning(f"Tile renderer {renderer.index} exited, restarting it")
+        try:
+            renderer.close()
+        except Exception as e:
+            logger.debug(f"Closing tile renderer {renderer.index} failed: {e}")
+        replacement = _Renderer(self._context, renderer.index, self.slot_bytes, self._values)
+        self._renderers[renderer.index] = replacement
+        self.restarts += 1
+        return replacement
+
+    def close(self):
+        """Stop the renderers and free their shared memory"""
+        with self._lock:
+            self._closed = True
+            renderers, self._renderers = self._renderers, []
+            while not self._idle.empty():
+                self._idle.get_nowait()
+            # Wakes calls waiting for a renderer
+            self._idle.put(None)
+        for renderer in renderers:
+            renderer.close()
+
+    def stats(self) -> Dict:
+        """Renderer count and job counters; shared/piped count results by transport"""
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "alive": sum(r.process.is_alive() for r in self._renderers),
+                "idle": 0 if self._closed else self._idle.qsize(),
+                "slot_bytes": self.slot_bytes,
+                "jobs": self.jobs,
+                "shared": self.shared,
+                "piped": self.piped,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "restarts": self.restarts,
+            }
+
+
+# Global render pool, started by get_render_pool in process mode
+_render_pool: Optional[RenderPool] = None
+_render_pool_lock = threading.Lock()
+
+
+def get_render_pool() -> Optional[RenderPool]:
+    """The renderer processes in process mode, started on first use; None in thread mode"""
+    global _render_pool
+    if settings.tile_render_mode == RENDER_MODE_THREAD:
+        return None
+    if settings.tile_render_mode != RENDER_MODE_PROCESS:
+        raise ValueError(f"Unknown tile_render_mode: {settings.tile_render_mode}")
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = RenderPool(settings.tile_render_processes, settings.tile_render_slot_bytes)
+        return _render_pool
+
+
+def close_render_pool():
+    """Stop the renderer processes if they were started"""
+    global _render_pool
+    with _render_pool_lock:
+        pool, _render_pool = _render_pool, None
+    if pool is not None:
+        pool.close()
+
+
+def render_pool_stats() -> Optional[Dict]:
+    """Counters of the running render pool, None if none is running"""
+    pool = _render_pool
+    return pool.stats() if pool is not None else None
+
+
+def run_extraction(tile_service, method: str, *args, **kwargs) -> bytes:
+    """tile_service.<method>(*args, **kwargs), run by a renderer process in process mode"""
+    pool = get_render_pool()
+    if pool is None:
+        return getattr(tile_service, method)(*args, **kwargs)
+    return pool.call(method, *args, **kwargs)
@@ -0,0 +1,191 @@
+"""
+Cache of serialised JSON responses for endpoints whose content only changes
+with the underlying files (region lists, image and atlas metadata)
+"""
+
+import gzip
+import hashlib
+import json
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+import logging
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+from ..config import settings
+
+try:
+    import brotli
+except ImportError:  # Optional, responses are offered as gzip only without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 9       # Compressed once per file version, so favour size
+BROTLI_QUALITY = 9
+
+
+def file_version(path: Path) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of a file, None if it does not exist"""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+@dataclass(frozen=True)
+class CachedBody:
+    """A serialised response body, its strong ETag and precompressed variants"""
+    body: bytes
+    etag: str
+    gzip: Optional[bytes] = None
+    br: Optional[bytes] = None
+
+    @classmethod
+    def from_content(cls, content: Any) -> "CachedBody":
+        # Same encoding as FastAPI's JSONResponse
+        body = json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                          indent=None, separators=(",", ":")).encode("utf-8")
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        if len(body) < MIN_COMPRESS_BYTES:
+            return cls(body=body, etag=etag)
+        return cls(body=body, etag=etag,
+                   gzip=gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0),
+                   br=brotli.compress(body, quality=BROTLI_QUALITY) if brotli else None)
+
+
+def _accepted_encodings(accept_encoding: Optional[str]) -> set:
+    """Content codings listed with q > 0 in an Accept-Encoding header"""
+    accepted = set()
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.strip('"')
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        # Compressed variants carry a coding suffix on the same tag
+        if tag.strip('"').split("-", 1)[0] == opaque:
+            return True
+    return False
+
+
+class ResponseCache:
+    """LRU of serialised JSON responses
+
+    Keys name the view and carry the versions (mtime, size) of every file
+    the content is derived from, so updated data gets a fresh entry and the
+    stale one ages out.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, CachedBody]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get_or_build(self, key: Hashable, build: Callable[[], Any]) -> CachedBody:
+        """Cached body for key, serialising build() on a miss"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return self._store(key, CachedBody.from_content(build()))
+
+    async def get_or_build_async(self, key: Hashable, build: Callable[[], Any],
+                                 cacheable: Optional[Callable[[], bool]] = None) -> CachedBody:
+        """As get_or_build, running build() and serialisation in the thread pool
+
+        For builds that read files, so a miss does not block the event loop.
+        If cacheable() is false after the build, e.g. as part of the content
+        failed, the body is returned without being cached.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        self.misses += 1
+        entry = await run_in_threadpool(lambda: CachedBody.from_content(build()))
+        if cacheable is not None and not cacheable():
+            return entry
+        return self._store(key, entry)
+
+    def _store(self, key: Hashable, entry: CachedBody) -> CachedBody:
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def respond(self, entry: CachedBody, headers: Dict[str, str]) -> Response:
+        """Response for a cached body given the request headers
+
+        Returns 304 when If-None-Match lists the ETag, otherwise the smallest
+        precompressed variant the client accepts.
+        """
+        response_headers = {
+            "ETag": entry.etag,
+            "Cache-Control": settings.metadata_cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if _etag_matches(headers.get("if-none-match"), entry.etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=response_headers)
+
+        accepted = _accepted_encodings(headers.get("accept-encoding"))
+        body = entry.body
+        if entry.br is not None and "br" in accepted:
+            body, coding = entry.br, "br"
+        elif entry.gzip is not None and "gzip" in accepted:
+            body, coding = entry.gzip, "gzip"
+        else:
+            coding = None
+        if coding:
+            response_headers["Content-Encoding"] = coding
+            # Strong ETags differ between codings of the same content
+            response_headers["ETag"] = f'{entry.etag[:-1]}-{coding}"'
+        return Response(content=body, media_type="application/json", headers=response_headers)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+        }
+
+
+# Global response cache instance
+response_cache = ResponseCache(max_entries=settings.response_cache_entries)
@@ -0,0 +1,291 @@
+"""
+Packed archives of pre-rendered tiles, served from a memory map
+
+Layout of an archive file (little endian):
+
+    header   64 bytes: magic, version, entry count, and offset/length of
+             the index and of the JSON manifest
+    blobs    encoded tiles back to back; identical tiles are stored once
+    index    four columns of `count` entries, sorted by (hi, lo):
+             hi, lo (uint64 packed tile key, see pack_key), offset, length
+    manifest rendering manifest (see prerender.rendering_manifest)
+
+The backend maps the file once and answers a tile by two binary searches
+over the index and a memoryview slice of the map, without any per-tile
+file, system call or copy.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple, Union
+import logging
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+
+from ..config import settings
+from ..models.specimen import TileKind, ViewType
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"VISORTA\0"
+VERSION = 1
+_HEADER = struct.Struct("<8sIIQQQQQ4x")  # magic, version, reserved, count, index off/len, manifest off/len
+HEADER_SIZE = 64
+assert _HEADER.size <= HEADER_SIZE
+
+# Enumerations packed into tile keys; append only, the numbers are stored
+ARCHIVE_KINDS = (TileKind.IMAGE.value, TileKind.ATLAS.value)
+ARCHIVE_VIEWS = (ViewType.SAGITTAL, ViewType.CORONAL, ViewType.HORIZONTAL)
+ARCHIVE_FORMATS = ("jpeg", "png", "webp", "avif")
+
+# Seconds before checking again whether an archive or its sources changed
+ARCHIVE_RECHECK_INTERVAL = 2.0
+
+
+def pack_key(kind: str, view: ViewType, level: int, z: int, y: int, x: int,
+             channel: int, format: str) -> Tuple[int, int]:
+    """Tile key as two uint64: kind, view, format, level, channel, z | y, x
+
+    Bits of hi: kind 60-63, view 56-59, format 52-55, level 44-51,
+    channel 32-43, z 0-31; lo holds y in the upper and x in the lower half.
+    """
+    if not (0 <= level < 256 and 0 <= channel < 4096 and 0 <= z < 2**32
+            and 0 <= y < 2**32 and 0 <= x < 2**32):
+        raise ValueError(f"Tile key out of range: {(kind, view, level, z, y, x, channel)}")
+    hi = (ARCHIVE_KINDS.index(kind) << 60 | ARCHIVE_VIEWS.index(view) << 56
+          | ARCHIVE_FORMATS.index(format) << 52 | level << 44 | channel << 32 | z)
+    return hi, y << 32 | x
+
+
+class TileArchiveWriter:
+    """Streams encoded tiles into a new archive
+
+    Tiles may be added in any order; the index is sorted when the archive is
+    finished. The file is written under a temporary name and renamed into
+    place by close(), so a reader never maps a partial archive.
+    """
+
+    def __init__(self, path: Union[str, Path], manifest: Optional[Dict] = None):
+        self.path = Path(path)
+        self.manifest = manifest or {}
+        self._tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(b"\0" * HEADER_SIZE)
+        self._offset = HEADER_SIZE
+        self._keys: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        self._blobs: Dict[bytes, Tuple[int, int]] = {}  # Digest to (offset, length)
+        self.bytes_written = 0
+        self.duplicates = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add(self, kind: str, view: ViewType, level: int, z: int, y: int, x: int,
+            channel: int, format: str, data: bytes):
+        """Append an encoded tile"""
+        key = pack_key(kind, view, level, z, y, x, channel, format)
+        if key in self._keys:
+            raise ValueError(f"Tile added twice: {(kind, view.value, level, z, y, x, channel, format)}")
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        location = self._blobs.get(digest)
+        if location is None:
+            self._file.write(data)
+            location = (self._offset, len(data))
+            self._blobs[digest] = location
+            self._offset += len(data)
+            self.bytes_written += len(data)
+        else:
+            # Background tiles are identical across slices
+            self.duplicates += 1
+        self._keys[key] = location
+
+    def close(self) -> Path:
+        """Write the index and header and move the archive into place"""
+        keys = sorted(self._keys)
+        count = len(keys)
+        columns = np.zeros((4, count), dtype="<u8")
+        if count:
+            columns[0], columns[1] = np.array(keys, dtype=np.uint64).T
+            columns[2], columns[3] = np.array([self._keys[k] for k in keys], dtype=np.uint64).T
+        pad = -self._offset % 8
+        self._file.write(b"\0" * pad)
+        index_offset = self._offset + pad
+        index = columns.tobytes()
+        self._file.write(index)
+        manifest = json.dumps(self.manifest).encode("utf-8")
+        manifest_offset = index_offset + len(index)
+        self._file.write(manifest)
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(MAGIC, VERSION, 0, count, index_offset, len(index),
+                                      manifest_offset, len(manifest)))
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+        return self.path
+
+    def abort(self):
+        """Discard the partial archive"""
+        self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+class TileArchive:
+    """Read-only, memory-mapped tile archive"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self.mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, count, index_offset, index_len, manifest_offset, manifest_len = \
+            _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a tile archive (version {VERSION}): {self.path}")
+        self._view = memoryview(self._map)
+        columns = np.frombuffer(self._map, dtype="<u8", count=4 * count,
+                                offset=index_offset).reshape(4, count)
+        self._hi, self._lo, self._offsets, self._lengths = columns
+        self.manifest = json.loads(bytes(self._view[manifest_offset:manifest_offset + manifest_len]))
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._hi)
+
+    def get(self, kind: str, view: ViewType, level: int, z: int, y: int, x: int,
+            channel: int, format: str) -> Optional[memoryview]:
+        """Encoded tile as a slice of the map, None if not in the archive"""
+        try:
+            hi, lo = pack_key(kind, view, level, z, y, x, channel, format)
+        except ValueError:
+            return None
+        # Python ints would be compared as float64, losing the low bits
+        hi, lo = np.uint64(hi), np.uint64(lo)
+        start = int(np.searchsorted(self._hi, hi, side="left"))
+        stop = int(np.searchsorted(self._hi, hi, side="right"))
+        if start < stop:
+            i = start + int(np.searchsorted(self._lo[start:stop], lo))
+            if i < stop and self._lo[i] == lo:
+                self.hits += 1
+                offset = int(self._offsets[i])
+                return self._view[offset:offset + int(self._lengths[i])]
+        self.misses += 1
+        return None
+
+    def keys(self) -> Iterator[Tuple[int, int]]:
+        return zip(self._hi.tolist(), self._lo.tolist())
+
+
+class ArchiveTileResponse(Response):
+    """Response whose body is a memoryview into a tile archive, sent without copying"""
+
+    def render(self, content) -> memoryview:
+        return content
+
+
+class TileArchiveRegistry:
+    """Open archives by specimen, each valid while it matches current sources
+
+    An archive is used only when its manifest equals the rendering manifest
+    of the specimen now, i.e. its tiles are what the backend would render.
+    Archives and sources are checked again at most every recheck_interval
+    seconds; lookup_async runs those checks in the thread pool. Replaced maps are not closed explicitly: responses may still
+    hold slices of them, and they are released with the last reference.
+    """
+
+    def __init__(self, recheck_interval: float = ARCHIVE_RECHECK_INTERVAL):
+        self.recheck_interval = recheck_interval
+        self._lock = threading.Lock()
+        self._archives: Dict[str, Tuple[Optional[TileArchive], float]] = {}
+
+    def get(self, specimen_id: str, tile_service) -> Optional[TileArchive]:
+        """Current archive of a specimen, None if absent or stale"""
+        entry = self._archives.get(specimen_id)
+        if entry is not None and time.monotonic() - entry[1] < self.recheck_interval:
+            return entry[0]
+        with self._lock:
+            # Checked again, another thread may have just done so
+            entry = self._archives.get(specimen_id)
+            now = time.monotonic()
+            if entry is not None and now - entry[1] < self.recheck_interval:
+                return entry[0]
+            previous = entry[0] if entry else None
+            archive = self._open(specimen_id, tile_service, previous)
+            self._archives[specimen_id] = (archive, now)
+        return archive
+
+    def _open(self, specimen_id: str, tile_service,
+              previous: Optional[TileArchive]) -> Optional[TileArchive]:
+        from .prerender import rendering_manifest
+
+        path = settings.get_tile_archive_path(specimen_id)
+        try:
+            mtime_ns = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        try:
+            archive = previous if previous is not None and previous.mtime_ns == mtime_ns \
+                else TileArchive(path)
+            kinds = archive.manifest.get("kinds", [])
+            current = rendering_manifest(tile_service, specimen_id, kinds)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable tile archive {path}: {e}")
+            return None
+        if {k: v for k, v in archive.manifest.items() if k != "kinds"} != current:
+            if archive is not previous:
+                logger.warning(f"Ignoring stale tile archive {path}, render it again")
+            return None
+        if archive is not previous:
+            logger.info(f"Opened tile archive {path} with {len(archive)} tiles")
+        return archive
+
+    def is_fresh(self, specimen_id: str) -> bool:
+        """Whether get() answers from memory, without a stat or open"""
+        entry = self._archives.get(specimen_id)
+        return entry is not None and time.monotonic() - entry[1] < self.recheck_interval
+
+    def lookup(self, specimen_id: str, tile_service, kind: str, view: ViewType, level: int,
+               z: int, y: int, x: int, channel: int, format: str) -> Optional[memoryview]:
+        """Encoded tile from the specimen's archive, None if not archived"""
+        archive = self.get(specimen_id, tile_service)
+        if archive is None:
+            return None
+        return archive.get(kind, view, level, z, y, x, channel, format)
+
+    async def lookup_async(self, specimen_id: str, tile_service, kind: str, view: ViewType,
+                           level: int, z: int, y: int, x: int, channel: int,
+                           format: str) -> Optional[memoryview]:
+        """As lookup, for the event loop: a due recheck or open runs in the thread pool"""
+        if self.is_fresh(specimen_id):
+            archive = self.get(specimen_id, tile_service)
+        else:
+            archive = await run_in_threadpool(self.get, specimen_id, tile_service)
+        if archive is None:
+            return None
+        return archive.get(kind, view, level, z, y, x, channel, format)
+
+    def clear(self):
+        with self._lock:
+            self._archives.clear()
+
+    def stats(self) -> Dict:
+        return {specimen_id: {"tiles": len(archive), "hits": archive.hits, "misses": archive.misses}
+                for specimen_id, (archive, _) in list(self._archives.items())
+                if archive is not None}
+
+
+# Global registry of tile archives
+tile_archives = TileArchiveRegistry()
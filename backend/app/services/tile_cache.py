@@ -0,0 +1,146 @@
+"""
+Shared cache of encoded tiles (in-process L1 + Redis L2)
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, Optional
+import logging
+
+from .chunk_cache import LRUByteCache
+from ..config import settings
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:  # Redis client is optional, run without L2
+    aioredis = None
+    RedisError = OSError
+
+logger = logging.getLogger(__name__)
+
+
+def make_tile_key(*parts: Any) -> str:
+    """Build a cache key from tile parameters
+
+    Callers include the source file mtime so that rewritten data never
+    serves stale tiles.
+    """
+    return "tile:" + "/".join(str(p) for p in parts)
+
+
+class TileCache:
+    """Two-tier cache of encoded tile bytes
+
+    L1 is a byte-budgeted LRU private to the process. L2 is Redis, shared by
+    all uvicorn workers and backend replicas. When Redis is not configured
+    or unreachable the cache silently degrades to L1 only, retrying the
+    connection every ``retry_interval`` seconds.
+    """
+
+    def __init__(self, l1_bytes: int, redis_url: str = "", ttl: int = 3600,
+                 max_connections: int = 10, redis_db: int = 0,
+                 socket_timeout: float = 0.5, retry_interval: float = 30.0,
+                 client: Optional[Any] = None):
+        self.l1 = LRUByteCache(l1_bytes) if l1_bytes > 0 else None
+        self.redis_url = redis_url
+        self.ttl = ttl
+        self.max_connections = max_connections
+        self.redis_db = redis_db
+        self.socket_timeout = socket_timeout
+        self.retry_interval = retry_interval
+        self._client = client
+        self._client_loop = None
+        self._fixed_client = client is not None
+        self._l2_down_until = 0.0
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.l2_errors = 0
+
+    def _get_client(self):
+        """Redis client for the running event loop, or None if unavailable"""
+        if self._fixed_client:
+            return self._client
+        if not self.redis_url or aioredis is None:
+            return None
+        if time.monotonic() < self._l2_down_until:
+            return None
+        # asyncio connections are bound to the loop that created them
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            pool = aioredis.ConnectionPool.from_url(
+                self.redis_url,
+                db=self.redis_db,
+                max_connections=self.max_connections,
+                socket_connect_timeout=self.socket_timeout,
+                socket_timeout=self.socket_timeout,
+            )
+            self._client = aioredis.Redis(connection_pool=pool)
+            self._client_loop = loop
+        return self._client
+
+    def _l2_failed(self, exc: BaseException):
+        self.l2_errors += 1
+        if not self._fixed_client:
+            self._l2_down_until = time.monotonic() + self.retry_interval
+        logger.warning(f"Tile cache L2 unavailable, retry in {self.retry_interval:.0f}s: {exc}")
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Look up encoded tile bytes, promoting L2 hits into L1"""
+        if self.l1 is not None:
+            data = self.l1.get(key)
+            if data is not None:
+                return data
+
+        client = self._get_client()
+        if client is None:
+            return None
+        try:
+            data = await client.get(key)
+        except (RedisError, OSError, asyncio.TimeoutError) as e:
+            self._l2_failed(e)
+            return None
+
+        if data is None:
+            self.l2_misses += 1
+            return None
+        self.l2_hits += 1
+        if self.l1 is not None:
+            self.l1.put(key, data, len(data))
+        return data
+
+    async def set(self, key: str, data: bytes):
+        """Store encoded tile bytes in both tiers"""
+        if self.l1 is not None:
+            self.l1.put(key, data, len(data))
+        client = self._get_client()
+        if client is None:
+            return
+        try:
+            await client.set(key, data, ex=self.ttl)
+        except (RedisError, OSError, asyncio.TimeoutError) as e:
+            self._l2_failed(e)
+
+    def stats(self) -> Dict:
+        """Counters of both tiers"""
+        return {
+            "l1": self.l1.stats() if self.l1 is not None else None,
+            "l2": {
+                "enabled": self._fixed_client or bool(self.redis_url and aioredis),
+                "hits": self.l2_hits,
+                "misses": self.l2_misses,
+                "errors": self.l2_errors,
+            },
+        }
+
+
+# Global tile cache instance
+tile_cache = TileCache(
+    l1_bytes=settings.tile_cache_l1_bytes,
+    redis_url=settings.redis_url,
+    ttl=settings.cache_ttl_tiles,
+    max_connections=settings.redis_max_connections,
+    redis_db=settings.redis_db,
+    socket_timeout=settings.redis_socket_timeout,
+    retry_interval=settings.redis_retry_interval,
+)
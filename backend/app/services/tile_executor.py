@@ -0,0 +1,213 @@
+"""
+Dedicated, bounded thread pool for tile work with priorities and admission control
+
+Tile extraction used to share AnyIO's default thread limiter with every
+other blocking call. The tile executor gives it its own threads and a
+priority queue: tiles of the visible viewport are served before prefetch,
+and prefetch before batch exports. Work is admitted only while fewer than
+max_queue jobs are queued or running; beyond that submit raises
+TileQueueFull, which the API answers with 503 and a Retry-After estimate.
+Jobs carry a deadline and are dropped if it passes while they wait, and
+jobs whose caller has gone (cancelled futures) are never started.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Lower values are served first
+PRIORITY_VIEWPORT = 0
+PRIORITY_PREFETCH = 1
+PRIORITY_BATCH = 2
+PRIORITY_NAMES = {PRIORITY_VIEWPORT: "viewport", PRIORITY_PREFETCH: "prefetch",
+                  PRIORITY_BATCH: "batch"}
+
+
+class TileQueueFull(Exception):
+    """The tile executor has max_queue jobs already; retry after retry_after seconds"""
+
+    def __init__(self, depth: int, retry_after: int):
+        super().__init__(f"Tile queue full ({depth} jobs), retry in {retry_after} s")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    seq: int
+    deadline: Optional[float] = field(compare=False)
+    future: Future = field(compare=False)
+    func: Callable = field(compare=False)
+    args: tuple = field(compare=False)
+    kwargs: dict = field(compare=False)
+
+
+class TileExecutor:
+    """Thread pool running tile jobs by priority, then in submission order"""
+
+    def __init__(self, workers: int = 8, max_queue: int = 100, timeout: Optional[float] = 30.0):
+        """
+        Args:
+            workers: Threads running jobs
+            max_queue: Jobs queued or running beyond which submit rejects more
+            timeout: Default seconds a job may wait before it is dropped
+        """
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._heap: List[_Job] = []
+        self._seq = itertools.count()
+        self._threads: List[threading.Thread] = []
+        self._running = 0
+        self._closed = False
+        self._service_time = 0.0  # Moving average of job run time, seconds
+        self.submitted: Dict[int, int] = {p: 0 for p in PRIORITY_NAMES}
+        self.completed = 0
+        self.rejected = 0
+        self.expired = 0
+        self.cancelled = 0
+
+    def submit(self, func: Callable, *args, priority: int = PRIORITY_VIEWPORT,
+               timeout: Optional[float] = None, **kwargs) -> Future:
+        """Queue func(*args, **kwargs), raising TileQueueFull when overloaded
+
+        timeout: Seconds the job may wait to start (default: the executor's)
+        """
+        timeout = self.timeout if timeout is None else timeout
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Tile executor is shut down")
+            self._admit_locked()
+            deadline = time.monotonic() + timeout if timeout else None
+            heapq.heappush(self._heap, _Job(priority, next(self._seq), deadline, future,
+                                            func, args, kwargs))
+            self.submitted[priority] = self.submitted.get(priority, 0) + 1
+            self._start_workers_locked()
+            self._ready.notify()
+        return future
+
+    def promote(self, future: Future, priority: int) -> bool:
+        """Raise the priority of the queued job of future; False if it is not queued"""
+        with self._lock:
+            for job in self._heap:
+                if job.future is future:
+                    if priority < job.priority:
+                        job.priority = priority
+                        heapq.heapify(self._heap)
+                    return True
+            return False
+
+    def admit(self):
+        """Raise TileQueueFull if a job submitted now would be rejected"""
+        with self._lock:
+            self._admit_locked()
+
+    async def run(self, func: Callable, *args, priority: int = PRIORITY_VIEWPORT,
+                  timeout: Optional[float] = None, **kwargs) -> Any:
+        """Await func(*args, **kwargs) run in the pool; cancelling the caller cancels a queued job"""
+        future = self.submit(func, *args, priority=priority, timeout=timeout, **kwargs)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    def _admit_locked(self):
+        depth = len(self._heap) + self._running
+        if depth >= self.max_queue:
+            self.rejected += 1
+            raise TileQueueFull(depth, self._retry_after_locked(depth))
+
+    def _retry_after_locked(self, depth: int) -> int:
+        """Seconds until the queue has likely drained below its limit"""
+        return max(1, math.ceil(depth * self._service_time / self.workers))
+
+    def _start_workers_locked(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"tile-worker-{len(self._threads)}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while not self._heap and not self._closed:
+                    self._ready.wait()
+                if self._closed:
+                    return
+                job = heapq.heappop(self._heap)
+                if not job.future.set_running_or_notify_cancel():
+                    self.cancelled += 1
+                    continue
+                if job.deadline is not None and time.monotonic() > job.deadline:
+                    self.expired += 1
+                    job.future.set_exception(TimeoutError("Tile job expired before it started"))
+                    continue
+                self._running += 1
+            t0 = time.perf_counter()
+            try:
+                result = job.func(*job.args, **job.kwargs)
+            except BaseException as e:
+                job.future.set_exception(e)
+            else:
+                job.future.set_result(result)
+            finally:
+                dt = time.perf_counter() - t0
+                with self._lock:
+                    self._running -= 1
+                    self.completed += 1
+                    self._service_time = dt if self.completed == 1 else 0.9 * self._service_time + 0.1 * dt
+
+    def close(self):
+        """Cancel queued jobs and stop the threads once running jobs finish"""
+        with self._lock:
+            self._closed = True
+            for job in self._heap:
+                job.future.cancel()
+            self._heap.clear()
+            self._ready.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout=5.0)
+        with self._lock:
+            self._closed = False
+
+    def stats(self) -> Dict:
+        """Queue depth and job counters"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queued": len(self._heap),
+                "running": self._running,
+                "submitted": {PRIORITY_NAMES.get(p, str(p)): n for p, n in self.submitted.items()},
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "expired": self.expired,
+                "cancelled": self.cancelled,
+                "mean_run_ms": self._service_time * 1000.0,
+            }
+
+
+# Global tile executor instance
+tile_executor = TileExecutor(
+    workers=settings.tile_executor_threads,
+    max_queue=settings.max_concurrent_requests,
+    timeout=settings.request_timeout,
+)
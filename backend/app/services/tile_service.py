@@ -2,14 +2,19 @@
 Service for generating image tiles
 """
 
-import io
 import numpy as np
-from PIL import Image
-from typing import Optional, Tuple, Union
+from typing import List, Optional, Sequence, Tuple, Union
 import logging
 from pathlib import Path
 
-from .imaris_handler import ImarisHandler
+from .encoders import EncodeOptions, encode_label_png, encode_palette_png, get_encoder
+from .handler_pool import handler_pool
+from .region_service import (OVERLAY_MODES, AtlasPalette, get_atlas_palette,
+                             load_region_hierarchy, overlay_labels, palette_indices)
+from .intensity import (IntensityWindow, RenderParams, WINDOW_GLOBAL, apply_window,
+                        blend_channels, get_window_range, parse_color)
+from .tile_cache import make_tile_key
+from .volume_reader import volume_mtime_ns
 from ..models.specimen import ViewType
 from ..config import settings
 
@@ -20,10 +25,84 @@ class TileService:
     
     def __init__(self):
         self.default_tile_size = settings.default_tile_size
+        self.handler_pool = handler_pool
+        self.encoder = get_encoder(settings.tile_encoder)
+        self.image_encode_options = EncodeOptions(
+            jpeg_quality=settings.image_jpeg_quality,
+            jpeg_subsampling=settings.image_jpeg_subsampling,
+            png_compress_level=settings.image_png_compress_level,
+            webp_quality=settings.image_webp_quality,
+            avif_quality=settings.image_avif_quality)
+        self.intensity_window_mode = settings.intensity_window_mode
+        self.atlas_encode_options = EncodeOptions(
+            png_compress_level=settings.atlas_png_compress_level,
+            webp_lossless=True,
+            webp_quality=settings.atlas_webp_quality,
+            webp_method=settings.atlas_webp_method)
         
+    def image_tile_key(self, specimen_id: str, view: ViewType, level: int,
+                       channel: int, z: int, y: int, x: int,
+                       tile_size: Optional[int] = None, format: str = 'jpeg',
+                       render: Optional[RenderParams] = None,
+                       overlay: Optional[str] = None, overlay_alpha: float = 0.4) -> str:
+        """Cache key of an image tile, including the image file mtime
+        
+        Overlay tiles also depend on the atlas and regions file mtimes.
+        """
+        image_path = settings.get_image_path(specimen_id)
+        if not image_path.exists():
+            raise FileNotFoundError(f"Image file not found for specimen {specimen_id}")
+        parts = ["image", specimen_id, view.value, level, z, y, x, channel,
+                 tile_size or self.default_tile_size, format,
+                 self._rendering_token(render), volume_mtime_ns(image_path)]
+        if overlay is not None:
+            if overlay not in OVERLAY_MODES:
+                raise ValueError(f"Unknown overlay mode: {overlay}, use one of {', '.join(OVERLAY_MODES)}")
+            atlas_path = settings.get_atlas_path(specimen_id)
+            if not atlas_path.exists():
+                raise FileNotFoundError(f"Atlas file not found for specimen {specimen_id}")
+            regions_file = settings.get_regions_file()
+            if not regions_file.exists():
+                raise FileNotFoundError(f"Regions file not found: {regions_file}")
+            parts += [overlay, overlay_alpha, volume_mtime_ns(atlas_path),
+                      regions_file.stat().st_mtime_ns]
+        return make_tile_key(*parts)
+
+    def composite_tile_key(self, specimen_id: str, view: ViewType, level: int,
+                           channels: Sequence[int], z: int, y: int, x: int,
+                           tile_size: Optional[int] = None, format: str = 'jpeg',
+                           colors: Optional[Sequence[str]] = None,
+                           renders: Optional[Sequence[RenderParams]] = None) -> str:
+        """Cache key of a composite tile, including the image file mtime"""
+        image_path = settings.get_image_path(specimen_id)
+        if not image_path.exists():
+            raise FileNotFoundError(f"Image file not found for specimen {specimen_id}")
+        colors = self._composite_colors(channels, colors)
+        renders = renders or [None] * len(channels)
+        layers = ";".join(f"{c}:{'%02x%02x%02x' % color}:{self._window_token(render)}"
+                          for c, color, render in zip(channels, colors, renders))
+        return make_tile_key("composite", specimen_id, view.value, level, z, y, x, layers,
+                             tile_size or self.default_tile_size, format,
+                             volume_mtime_ns(image_path))
+
+    def atlas_tile_key(self, specimen_id: str, view: ViewType, level: int,
+                       z: int, y: int, x: int,
+                       tile_size: Optional[int] = None, format: str = 'png') -> str:
+        """Cache key of an atlas tile, including the atlas and regions file mtimes"""
+        atlas_path = settings.get_atlas_path(specimen_id)
+        if not atlas_path.exists():
+            raise FileNotFoundError(f"Atlas file not found for specimen {specimen_id}")
+        regions_file = settings.get_regions_file()
+        regions_mtime = regions_file.stat().st_mtime_ns if regions_file.exists() else 0
+        return make_tile_key("atlas", specimen_id, view.value, level, z, y, x, 0,
+                             tile_size or self.default_tile_size, format,
+                             volume_mtime_ns(atlas_path), regions_mtime)
+
     def extract_image_tile(self, specimen_id: str, view: ViewType, level: int, 
                             channel: int, z: int, y: int, x: int, 
-                            tile_size: Optional[int] = None) -> bytes:
+                            tile_size: Optional[int] = None, format: str = 'jpeg',
+                            render: Optional[RenderParams] = None,
+                            overlay: Optional[str] = None, overlay_alpha: float = 0.4) -> bytes:
         """Extract tile in JPEG from 3D image data, at origin (z,y,x), with specified tile size.
         
         Args:
@@ -35,9 +114,13 @@ class TileService:
             y: Y coordinate (pixel position)
             x: X coordinate (pixel position)
             tile_size: Size of extracted tile
+            format: Output format (jpeg, png, webp or avif)
+            render: Intensity window, gamma and transfer function overrides
+            overlay: Colour atlas regions over the tile, "fill" or "boundary"
+            overlay_alpha: Opacity of the region colours
             
         Returns:
-            JPEG image bytes
+            Image bytes in the requested format
         """
         
         if tile_size is None:
@@ -50,15 +133,25 @@ class TileService:
             raise FileNotFoundError(f"Image file not found for specimen {specimen_id}")
         
         try:
-            with ImarisHandler(image_path) as handler:
+            with self.handler_pool.handle(image_path) as handler:
                 # Get tile data
                 tile_data = handler.get_tile(view, level, channel, z, y, x, tile_size)
                 
                 # Apply final vertical flip to match convention of image file
                 tile_flipped = tile_data[::-1, :]
                 
+                if self._uses_window(render):
+                    tile_flipped = apply_window(
+                        tile_flipped, self.get_intensity_window(handler, channel, render))
+                
+                if overlay is not None:
+                    tile_flipped = self._overlay_atlas(specimen_id, self._to_uint8(tile_flipped),
+                                                       view, level, z, y, x, tile_size,
+                                                       overlay, overlay_alpha)
+                
                 # Convert to image
-                image_bytes = self._array_to_image_bytes(tile_flipped, format='JPEG')
+                image_bytes = self._array_to_image_bytes(tile_flipped, format=format,
+                                                         options=self.image_encode_options)
                 
                 logger.debug(f"Extracted image tile: {specimen_id}/{view}/{level}/{z}/{y}/{x}")
                 return image_bytes
@@ -67,10 +160,96 @@ class TileService:
             logger.error(f"Failed to extract image tile: {e}")
             raise
     
+    def _overlay_atlas(self, specimen_id: str, gray: np.ndarray, view: ViewType, level: int,
+                       z: int, y: int, x: int, tile_size: int,
+                       mode: str, alpha: float) -> np.ndarray:
+        """Blend the atlas tile at the same position over a uint8 image tile
+        
+        The atlas tile is taken as served by extract_atlas_tile, which the
+        viewer overlays on image tiles without further transformation.
+        """
+        atlas_path = settings.get_atlas_path(specimen_id)
+        
+        if not atlas_path.exists():
+            raise FileNotFoundError(f"Atlas file not found for specimen {specimen_id}")
+        
+        with self.handler_pool.handle(atlas_path) as atlas:
+            labels = atlas.get_tile(view, level, 0, z, y, x, tile_size)
+        return overlay_labels(gray, labels, mode, alpha)
+    
+    def extract_composite_tile(self, specimen_id: str, view: ViewType, level: int,
+                               channels: Sequence[int], z: int, y: int, x: int,
+                               tile_size: Optional[int] = None, format: str = 'jpeg',
+                               colors: Optional[Sequence[str]] = None,
+                               renders: Optional[Sequence[RenderParams]] = None) -> bytes:
+        """Extract an RGB tile blending several channels of the same hyperslab
+        
+        Each channel is mapped through its intensity window, tinted by its
+        colour and added; the result is encoded once.
+        
+        Args:
+            channels: Channel indices to blend
+            colors: RRGGBB colour per channel (default: settings.default_channel_colors)
+            renders: Window/gamma/transfer overrides per channel
+            
+        Returns:
+            Image bytes in the requested format
+        """
+        if tile_size is None:
+            tile_size = self.default_tile_size
+        colors = self._composite_colors(channels, colors)
+        renders = renders or [None] * len(channels)
+        
+        image_path = settings.get_image_path(specimen_id)
+        
+        if not image_path.exists():
+            raise FileNotFoundError(f"Image file not found for specimen {specimen_id}")
+        
+        try:
+            with self.handler_pool.handle(image_path) as handler:
+                grays = []
+                for channel, render in zip(channels, renders):
+                    tile_data = handler.get_tile(view, level, channel, z, y, x, tile_size)[::-1, :]
+                    grays.append(apply_window(
+                        tile_data, self.get_intensity_window(handler, channel, render)))
+                
+                image_bytes = self._array_to_image_bytes(blend_channels(grays, colors),
+                                                         format=format,
+                                                         options=self.image_encode_options)
+                
+                logger.debug(f"Extracted composite tile: {specimen_id}/{view}/{level}/{z}/{y}/{x}")
+                return image_bytes
+                
+        except Exception as e:
+            logger.error(f"Failed to extract composite tile: {e}")
+            raise
+    
+    def get_image_channels(self, specimen_id: str) -> List[int]:
+        """Channel indices present in the image file"""
+        image_path = settings.get_image_path(specimen_id)
+        if not image_path.exists():
+            raise FileNotFoundError(f"Image file not found for specimen {specimen_id}")
+        with self.handler_pool.handle(image_path) as handler:
+            return handler.get_channels()
+    
+    def _composite_colors(self, channels: Sequence[int],
+                          colors: Optional[Sequence[str]]) -> List[Tuple[int, int, int]]:
+        """Parsed colour per channel, from the request or the defaults"""
+        if colors is None:
+            colors = [settings.default_channel_colors.get(str(c), "ffffff") for c in channels]
+        if len(colors) != len(channels):
+            raise ValueError(f"Got {len(colors)} colours for {len(channels)} channels")
+        return [parse_color(c) for c in colors]
+    
     def extract_atlas_tile(self, specimen_id: str, view: ViewType, level: int,
                             z: int, y: int, x: int, 
-                            tile_size: Optional[int] = None) -> bytes:
-        """Extract PNG tile from atlas mask (lossless)"""
+                            tile_size: Optional[int] = None, format: str = 'png') -> bytes:
+        """Extract PNG (or lossless WebP) tile from atlas mask
+        
+        PNG tiles are palette images coloured by region (see
+        get_atlas_palette) and WebP tiles hold the same colours; see
+        _labels_to_image_bytes.
+        """
         # TODO: may merge with extract_image_tile
 
         # Atlas typically has only one channel (channel 0)
@@ -86,11 +265,11 @@ class TileService:
             raise FileNotFoundError(f"Atlas file not found for specimen {specimen_id}")
         
         try:
-            with ImarisHandler(atlas_path) as handler:
+            with self.handler_pool.handle(atlas_path) as handler:
                 tile_data = handler.get_tile(view, level, channel, z, y, x, tile_size)
                 
-                # Convert to PNG (lossless) for atlas data
-                image_bytes = self._array_to_image_bytes(tile_data, format='PNG')
+                # Lossless encoding for atlas data
+                image_bytes = self._labels_to_image_bytes(tile_data, format)
                 
                 logger.debug(f"Extracted atlas tile: {specimen_id}/{view}/{level}/{z}/{y}/{x}")
                 return image_bytes
@@ -99,6 +278,96 @@ class TileService:
             logger.error(f"Failed to extract atlas tile: {e}")
             raise
     
+    def _labels_to_image_bytes(self, labels: np.ndarray, format: str) -> bytes:
+        """Encode an atlas label tile, the same picture in every format
+        
+        With an atlas palette, PNG holds palette indices and other formats
+        the palette's RGBA colours (lossless); labels without a palette entry
+        are transparent. Without a palette (no regions file, or more regions
+        than 256 colours) every format holds the labels as grayscale.
+        """
+        palette = self._atlas_palette()
+        if palette is not None:
+            indices = palette_indices(labels, palette)
+            if format.upper() == 'PNG':
+                return encode_palette_png(indices, palette.colors,
+                                          self.atlas_encode_options.png_compress_level)
+            return self.encoder.encode(palette.colors[indices], format, self.atlas_encode_options)
+        
+        if format.upper() == 'PNG':
+            return encode_label_png(labels, self.atlas_encode_options.png_compress_level)
+        if labels.size and (labels.min() < 0 or labels.max() > 0xFF):
+            raise ValueError(f"Atlas labels do not fit 8 bits in {format}, use PNG")
+        return self.encoder.encode(labels.astype(np.uint8), format, self.atlas_encode_options)
+    
+    def _atlas_palette(self) -> Optional[AtlasPalette]:
+        """Atlas palette, or None without a regions file"""
+        try:
+            return get_atlas_palette()
+        except FileNotFoundError:
+            return None
+    
+    def tile_chunk_footprint(self, specimen_id: str, kind: str, view: ViewType, level: int,
+                             channel: int, z: int, y: int, x: int,
+                             tile_size: Optional[int] = None) -> Tuple:
+        """Chunks read by an image or atlas tile, to group tiles that share them"""
+        path = (settings.get_atlas_path(specimen_id) if kind == "atlas"
+                else settings.get_image_path(specimen_id))
+        if not path.exists():
+            raise FileNotFoundError(f"{kind.capitalize()} file not found for specimen {specimen_id}")
+        with self.handler_pool.handle(path) as handler:
+            return handler.tile_chunk_footprint(view, level, channel, z, y, x,
+                                                tile_size or self.default_tile_size)
+    
+    def get_intensity_window(self, handler, channel: int,
+                             render: Optional[RenderParams] = None) -> IntensityWindow:
+        """Display window of a channel, shared by all tiles of the specimen
+        
+        Bounds not given in render come from the channel's data window,
+        gamma and transfer function from the settings.
+        """
+        render = render or RenderParams()
+        low, high = render.low, render.high
+        if low is None or high is None:
+            data_low, data_high = get_window_range(handler, channel,
+                                                   settings.intensity_low_quantile,
+                                                   settings.intensity_high_quantile)
+            low = data_low if low is None else low
+            high = data_high if high is None else high
+        return IntensityWindow(
+            low, high,
+            transfer=render.transfer or settings.intensity_transfer,
+            gamma=render.gamma if render.gamma is not None else settings.intensity_gamma)
+    
+    def _intensity_windows(self, handler, channels) -> Optional[dict]:
+        """Default display window per channel, the starting point for min/max controls"""
+        try:
+            return {str(c): get_window_range(handler, c, settings.intensity_low_quantile,
+                                             settings.intensity_high_quantile)
+                    for c in channels}
+        except Exception as e:
+            logger.warning(f"Could not compute intensity windows: {e}")
+            return None
+    
+    def _uses_window(self, render: Optional[RenderParams]) -> bool:
+        """Explicit rendering parameters always go through a window"""
+        return (self.intensity_window_mode == WINDOW_GLOBAL
+                or (render is not None and not render.is_default()))
+    
+    def _rendering_token(self, render: Optional[RenderParams] = None) -> str:
+        """Part of image tile cache keys describing the intensity mapping"""
+        if not self._uses_window(render):
+            return self.intensity_window_mode
+        return self._window_token(render)
+    
+    def _window_token(self, render: Optional[RenderParams] = None) -> str:
+        """Describes the window get_intensity_window builds for render"""
+        render = render or RenderParams()
+        gamma = render.gamma if render.gamma is not None else settings.intensity_gamma
+        return (f"{WINDOW_GLOBAL},{settings.intensity_low_quantile},"
+                f"{settings.intensity_high_quantile},{render.low},{render.high},"
+                f"{render.transfer or settings.intensity_transfer},{gamma}")
+    
     def get_region_at_coordinate(self, specimen_id: str, view: ViewType, 
                                  x: int, y: int, z: int, level: int = 0) -> int:
         """Get region ID from atlas at specific coordinate"""
@@ -110,7 +379,7 @@ class TileService:
             raise FileNotFoundError(f"Atlas file not found for specimen {specimen_id}")
         
         try:
-            with ImarisHandler(atlas_path) as handler:
+            with self.handler_pool.handle(atlas_path) as handler:
                 # Transform coordinates based on view type
                 atlas_x, atlas_y, atlas_z = self._transform_coordinates_for_atlas(
                     view, x, y, z
@@ -136,7 +405,7 @@ class TileService:
             raise FileNotFoundError(f"Image file not found for specimen {specimen_id}")
         
         try:
-            with ImarisHandler(image_path) as handler:
+            with self.handler_pool.handle(image_path) as handler:
                 metadata = handler.get_metadata()
                 
                 # Process metadata for API response
@@ -151,7 +420,8 @@ class TileService:
                                      settings.image_resolution_um, 
                                      settings.image_resolution_um),
                     "data_type": metadata["data_type"],
-                    "file_size": metadata["file_size"]
+                    "file_size": metadata["file_size"],
+                    "intensity_windows": self._intensity_windows(handler, metadata["channels"])
                 }
                 
                 return info
@@ -169,17 +439,14 @@ class TileService:
             raise FileNotFoundError(f"Atlas file not found for specimen {specimen_id}")
         
         try:
-            with ImarisHandler(atlas_path) as handler:
+            with self.handler_pool.handle(atlas_path) as handler:
                 metadata = handler.get_metadata()
                 
-                # Load region count from regions file
-                regions_file = settings.get_regions_file()
-                total_regions = 0
-                if regions_file.exists():
-                    import json
-                    with open(regions_file, 'r') as f:
-                        regions_data = json.load(f)
-                        total_regions = regions_data.get('metadata', {}).get('total_regions', 0)
+                # Region count from the loaded regions file
+                try:
+                    total_regions = load_region_hierarchy().metadata.get('total_regions', 0)
+                except FileNotFoundError:
+                    total_regions = 0
                 
                 # Process metadata for API response
                 info = {
@@ -194,6 +461,9 @@ class TileService:
                     "file_size": metadata["file_size"],
                     "total_regions": total_regions
                 }
+                palette = self._atlas_palette()
+                if palette is not None and not palette.identity:
+                    info["palette_labels"] = palette.labels.tolist()
                 
                 return info
                 
@@ -201,10 +471,15 @@ class TileService:
             logger.error(f"Failed to get atlas info: {e}")
             raise
     
-    def _array_to_image_bytes(self, array: np.ndarray, format: str = 'JPEG') -> bytes:
+    def _array_to_image_bytes(self, array: np.ndarray, format: str = 'JPEG',
+                              options: Optional[EncodeOptions] = None) -> bytes:
         """Convert numpy array to image bytes"""
+        return self.encoder.encode(self._to_uint8(array), format, options or EncodeOptions())
+    
+    def _to_uint8(self, array: np.ndarray) -> np.ndarray:
+        """Legacy normalisation of tile data to 0-255"""
         
-        # Normalize array to 0-255 range
+        # Normalize array to 0-255 range; uint8 is returned as is
         if array.dtype != np.uint8:
             # Handle different data types
             if array.dtype in [np.uint16, np.uint32]:
@@ -218,25 +493,7 @@ class TileService:
                 # For float types, assume 0-1 range
                 array = (np.clip(array, 0, 1) * 255).astype(np.uint8)
         
-        # Create PIL Image (grayscale)
-        if len(array.shape) == 2:
-            image = Image.fromarray(array, mode='L')
-        else:
-            raise ValueError("Only 2D arrays are supported for tile generation")
-        
-        # Convert to bytes
-        buffer = io.BytesIO()
-        
-        if format == 'JPEG':
-            # High quality JPEG for image data
-            image.save(buffer, format='JPEG', quality=85, optimize=True)
-        elif format == 'PNG':
-            # Lossless PNG
-            image.save(buffer, format='PNG', optimize=True)
-        else:
-            raise ValueError(f"Unsupported format: {format}")
-        
-        return buffer.getvalue()
+        return array
     
     def _transform_coordinates_for_atlas(self, view: ViewType, x: int, y: int, z: int) -> Tuple[int, int, int]:
         """Transform display coordinates to atlas coordinates"""
@@ -256,16 +513,18 @@ class TileService:
         else:
             raise ValueError(f"Unknown view type: {view}")
     
-    def calculate_tile_grid(self, specimen_id: str, view: ViewType, level: int) -> dict:
-        """Calculate tile grid information for a view and level"""
+    def calculate_tile_grid(self, specimen_id: str, view: ViewType, level: int,
+                            kind: str = "image") -> dict:
+        """Calculate tile grid information for a view and level of the image or atlas"""
         
-        image_path = settings.get_image_path(specimen_id)
+        path = (settings.get_atlas_path(specimen_id) if kind == "atlas"
+                else settings.get_image_path(specimen_id))
         
-        if not image_path.exists():
-            raise FileNotFoundError(f"Image file not found for specimen {specimen_id}")
+        if not path.exists():
+            raise FileNotFoundError(f"{kind.capitalize()} file not found for specimen {specimen_id}")
         
         try:
-            with ImarisHandler(image_path) as handler:
+            with self.handler_pool.handle(path) as handler:
                 tiles_x, tiles_y = handler.calculate_tile_grid_size(view, level, self.default_tile_size)
                 shape = handler.get_data_shape(level, 0)  # Get shape for channel 0
                 
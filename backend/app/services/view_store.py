@@ -0,0 +1,125 @@
+"""
+View-optimised derived copies of Imaris volumes
+
+The .ims layout is (z, y, x) with chunks spanning a few z planes, which suits
+coronal tiles (one z plane) but makes a sagittal tile (one x column through
+every z chunk) decompress orders of magnitude more data than it returns.
+A view store holds the same voxels transposed so that the view's slice axis
+comes first, chunked (1, tile_size, tile_size), so every view reads whole
+contiguous tiles.
+
+Stores live next to the source file, e.g. ``image.sagittal.h5`` for
+``image.ims``, with datasets at ``ResolutionLevel {L}/Channel {C}/Data``.
+"""
+
+import itertools
+import os
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Union
+import logging
+
+import h5py
+import numpy as np
+
+from ..models.specimen import ViewType
+
+logger = logging.getLogger(__name__)
+
+# Axis permutation from source (z, y, x) to store layout, slice axis first
+VIEW_STORE_AXES = {
+    ViewType.SAGITTAL: (2, 1, 0),    # (x, y, z)
+    ViewType.HORIZONTAL: (1, 0, 2),  # (y, z, x)
+}
+
+
+def view_store_path(source_path: Union[str, Path], view: ViewType) -> Path:
+    """Path of the derived store of a source file for a view"""
+    source_path = Path(source_path)
+    return source_path.with_name(f"{source_path.stem}.{view.value}.h5")
+
+
+def view_dataset_path(level: int, channel: int) -> str:
+    return f"ResolutionLevel {level}/Channel {channel}/Data"
+
+
+def open_view_store(source_path: Union[str, Path], view: ViewType,
+                    source_mtime_ns: int) -> Optional[h5py.File]:
+    """Open the view store of a source file if it exists and is up to date"""
+    store_path = view_store_path(source_path, view)
+    if view not in VIEW_STORE_AXES or not store_path.exists():
+        return None
+    store = h5py.File(store_path, 'r')
+    if store.attrs.get("source_mtime_ns") != source_mtime_ns:
+        logger.warning(f"Ignoring stale view store {store_path}, rebuild it")
+        store.close()
+        return None
+    logger.info(f"Opened view store: {store_path}")
+    return store
+
+
+def build_view_store(source_path: Union[str, Path], view: ViewType,
+                     tile_size: int = 512, levels: Optional[Iterable[int]] = None,
+                     compression: Optional[str] = "gzip",
+                     max_block_bytes: int = 256 * 1024 * 1024,
+                     progress: Optional[Callable[[str], None]] = None) -> Path:
+    """Write the view store of a source .ims file
+
+    The volume is streamed in blocks aligned to the store chunks, so memory
+    stays below max_block_bytes whatever the volume size. The store is
+    written to a temporary file and renamed into place when complete, so
+    readers never see a partial store.
+
+    Returns:
+        Path of the written store
+    """
+    from .imaris_handler import ImarisHandler
+
+    if view not in VIEW_STORE_AXES:
+        raise ValueError(f"No view store layout for view: {view}")
+    perm = VIEW_STORE_AXES[view]
+    store_path = view_store_path(source_path, view)
+    tmp_path = store_path.with_name(store_path.name + ".tmp")
+    progress = progress or logger.info
+
+    with ImarisHandler(source_path) as handler, h5py.File(tmp_path, 'w') as store:
+        store.attrs["source_mtime_ns"] = handler.mtime_ns
+        store.attrs["view"] = view.value
+        store.attrs["axes"] = np.array(perm)
+        store.attrs["tile_size"] = tile_size
+
+        for level in (levels if levels is not None else handler.get_resolution_levels()):
+            for channel in handler.get_channels():
+                source = handler.get_dataset(level, channel)
+                shape = tuple(source.shape[a] for a in perm)
+                chunks = (1,) + tuple(min(tile_size, n) for n in shape[1:])
+                target = store.create_dataset(
+                    view_dataset_path(level, channel), shape=shape,
+                    dtype=source.dtype, chunks=chunks, compression=compression)
+
+                # Blocks cover whole target chunks in-plane; along the slice
+                # axis take the source chunk depth so each source chunk is
+                # decompressed once, capped by the memory budget
+                plane_bytes = chunks[1] * chunks[2] * source.dtype.itemsize
+                depth = source.chunks[perm[0]] if source.chunks else 1
+                depth = max(1, min(depth, max_block_bytes // plane_bytes))
+                block = (depth,) + chunks[1:]
+
+                t0 = time.perf_counter()
+                grid = [range(0, n, b) for n, b in zip(shape, block)]
+                for origin in itertools.product(*grid):
+                    target_slices = tuple(slice(o, min(o + b, n))
+                                          for o, b, n in zip(origin, block, shape))
+                    source_slices = [None] * 3
+                    for target_axis, source_axis in enumerate(perm):
+                        source_slices[source_axis] = target_slices[target_axis]
+                    data = source[tuple(source_slices)]
+                    target[target_slices] = np.transpose(data, perm)
+
+                dt = time.perf_counter() - t0
+                nbytes = int(np.prod(shape)) * source.dtype.itemsize
+                progress(f"{store_path.name}: level {level} channel {channel} "
+                         f"{shape} in {dt:.1f} s ({nbytes / max(dt, 1e-9) / 1e6:.1f} MB/s)")
+
+    os.replace(tmp_path, store_path)
+    return store_path
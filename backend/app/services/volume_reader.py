@@ -0,0 +1,458 @@
+"""
+Common interface of multi-resolution volume readers (Imaris .ims, Zarr)
+"""
+
+import itertools
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+import logging
+
+import numpy as np
+
+from ..models.specimen import ViewType
+from .chunk_cache import ChunkCache, SlabCache
+
+logger = logging.getLogger(__name__)
+
+# Volume file suffixes and the reader opening them, see open_volume
+IMS_SUFFIXES = (".ims", ".h5")
+ZARR_SUFFIXES = (".zarr",)
+
+# Slice axis and (vertical, horizontal) in-plane axes of each view in (z, y, x),
+# as cut by VolumeReader.get_tile
+VIEW_AXES = {
+    ViewType.CORONAL: (0, (1, 2)),
+    ViewType.SAGITTAL: (2, (1, 0)),
+    ViewType.HORIZONTAL: (1, (0, 2)),
+}
+
+# Reads chunks of a dataset by chunk index: (dataset, indices) -> arrays
+ChunkLoader = Callable[[Any, Sequence[Tuple[int, ...]]], List[np.ndarray]]
+
+
+def version_path(path: Path) -> Path:
+    """File whose mtime marks a new version of a volume
+
+    A Zarr store is a directory whose own mtime does not change when chunks
+    are rewritten; its root attributes are written last by our converter.
+    Stores without attributes fall back to the group marker.
+    """
+    path = Path(path)
+    if path.suffix in ZARR_SUFFIXES:
+        attrs = path / ".zattrs"
+        return attrs if attrs.exists() else path / ".zgroup"
+    return path
+
+
+def volume_mtime_ns(path: Union[str, Path]) -> int:
+    """mtime of a volume, raising FileNotFoundError if it does not exist"""
+    try:
+        return version_path(Path(path)).stat().st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Volume file not found: {path}")
+
+
+class VolumeReader(ABC):
+    """Read access to a (z, y, x) volume stored at several resolution levels
+
+    Implementations provide the datasets of each level and channel; tile
+    extraction, chunk caching and metadata are shared. A dataset is any
+    array-like with shape, dtype, chunks and numpy basic indexing.
+    """
+
+    def __init__(self, file_path: Union[str, Path],
+                 chunk_cache: Optional[ChunkCache] = None,
+                 slab_cache: Optional[SlabCache] = None):
+        self.file_path = Path(file_path)
+        self.chunk_cache = chunk_cache
+        self.slab_cache = slab_cache
+        self.mtime_ns = volume_mtime_ns(self.file_path)
+        self._metadata = None
+
+    def __enter__(self):
+        """Context manager entry - file already open"""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit - close the file"""
+        self.close()
+
+    @abstractmethod
+    def close(self):
+        """Release the underlying file"""
+
+    @property
+    @abstractmethod
+    def is_open(self) -> bool:
+        """Whether the underlying file is still open"""
+
+    @property
+    def cache_key(self) -> Tuple[str, int]:
+        """Identity of the file contents, used to key shared caches"""
+        return (str(self.file_path), self.mtime_ns)
+
+    @abstractmethod
+    def get_dataset(self, level: int, channel: int) -> Any:
+        """(z, y, x) array of a level and channel
+
+        Raises:
+            KeyError: if the level or channel does not exist
+        """
+
+    @abstractmethod
+    def get_resolution_levels(self) -> List[int]:
+        """Get available resolution levels"""
+
+    @abstractmethod
+    def get_channels(self) -> List[int]:
+        """Get available channels"""
+
+    def get_histogram(self, level: int, channel: int) -> Optional[np.ndarray]:
+        """Histogram counts of a level and channel, None if not stored"""
+        return None
+
+    def get_histogram_range(self, level: int, channel: int) -> Optional[Tuple[float, float]]:
+        """Intensity range spanned by the histogram bins, None if not stored"""
+        return None
+
+    def get_view_dataset(self, view: ViewType, level: int, channel: int) -> Optional[Any]:
+        """Dataset laid out for the planes of a view (see view_store), None if unavailable"""
+        return None
+
+    def get_data_shape(self, level: int, channel: int = 0) -> Tuple[int, int, int]:
+        """Get shape of data array for specific level and channel"""
+        try:
+            dataset = self.get_dataset(level, channel)
+            return tuple(dataset.shape)  # (z, y, x)
+        except KeyError:
+            raise KeyError(f"Data not found for level {level}, channel {channel}")
+
+    def get_chunks(self, level: int, channel: int = 0) -> Tuple[int, int, int]:
+        """Chunk shape of a level and channel, the whole array if not chunked"""
+        dataset = self.get_dataset(level, channel)
+        return tuple(dataset.chunks or dataset.shape)
+
+    def get_tile(self, view: ViewType, level: int, channel: int,
+                 z: int, y: int, x: int, tile_size: int = 512) -> np.ndarray:
+        """Extract tile from 3D data using direct pixel coordinates
+
+        Args:
+            view: View type (coronal, sagittal, horizontal)
+            level: Resolution level
+            channel: Channel index
+            z: Z coordinate (pixel position)
+            y: Y coordinate (pixel position)
+            x: X coordinate (pixel position)
+            tile_size: Size of extracted tile
+
+        Returns:
+            2D numpy array containing the extracted tile
+
+        Note: Coordinates (z,y,x) specify the origin (top-left corner) of the tile.
+        """
+        try:
+            dataset = self.get_dataset(level, channel)
+        except KeyError:
+            raise KeyError(f"Invalid level {level} or channel {channel}: dataset not found")
+
+        data_shape = dataset.shape  # (z, y, x)
+
+        # Validate coordinates
+        pivot_zyx = (z, y, x)
+        for i in range(3):
+            if pivot_zyx[i] < 0 or pivot_zyx[i] >= data_shape[i]:
+                raise IndexError(f"Coordinate {pivot_zyx[i]} out of bounds for dimension {i} with size {data_shape[i]}")
+
+        # Extract slice based on view type with same logic as h5py implementation
+        if view == ViewType.CORONAL:
+            rg_horizontal = slice(x, x + tile_size)    # -x direction
+            rg_vertical = slice(y, y + tile_size)      # -y direction
+            plane = self._slab_plane(view, level, channel, dataset, pivot_zyx, tile_size)
+            if plane is None:
+                plane = self.read_region(level, channel, (slice(z, z + 1), rg_vertical, rg_horizontal))[0]
+            tile = plane[::-1, ::-1]
+        elif view == ViewType.SAGITTAL:
+            rg_horizontal = slice(z, z + tile_size)    #  z direction
+            rg_vertical = slice(y, y + tile_size)      # -y direction
+            view_dataset = self.get_view_dataset(view, level, channel)
+            if view_dataset is not None:
+                # Store layout (x, y, z): the tile is one contiguous plane
+                block = self._read_dataset_region(
+                    view_dataset, (view.value, level, channel),
+                    (slice(x, x + 1), rg_vertical, rg_horizontal))
+                tile = block[0][::-1, :]
+            else:
+                plane = self._slab_plane(view, level, channel, dataset, pivot_zyx, tile_size)
+                if plane is None:
+                    block = self.read_region(level, channel, (rg_horizontal, rg_vertical, slice(x, x + 1)))
+                    plane = block[:, :, 0].T
+                tile = plane[::-1, :]
+        elif view == ViewType.HORIZONTAL:
+            rg_horizontal = slice(x, x + tile_size)    # -x direction
+            rg_vertical = slice(z, z + tile_size)      # -z direction
+            view_dataset = self.get_view_dataset(view, level, channel)
+            if view_dataset is not None:
+                # Store layout (y, z, x)
+                block = self._read_dataset_region(
+                    view_dataset, (view.value, level, channel),
+                    (slice(y, y + 1), rg_vertical, rg_horizontal))
+                tile = block[0][::-1, ::-1]
+            else:
+                plane = self._slab_plane(view, level, channel, dataset, pivot_zyx, tile_size)
+                if plane is None:
+                    plane = self.read_region(level, channel, (rg_vertical, slice(y, y + 1), rg_horizontal))[:, 0, :]
+                tile = plane[::-1, ::-1]
+        else:
+            raise ValueError(f"Unknown view type: {view}")
+
+        # We may pad to full tile_size here
+        return tile
+
+    def _slab_plane(self, view: ViewType, level: int, channel: int, dataset: Any,
+                    origin: Tuple[int, int, int], tile_size: int) -> Optional[np.ndarray]:
+        """(vertical, horizontal) plane of a tile cut from a cached slab
+
+        A slab covers the tile in plane and the whole chunk depth containing
+        it along the view's slice axis, stored with slices as its first axis.
+        Stepping through slices then reads the chunks once per chunk depth
+        and serves every other slice as a contiguous view. Returns None when
+        slab caching does not apply (no cache, unchunked or one-deep chunks,
+        or a slab too large for the budget).
+        """
+        cache = self.slab_cache
+        if cache is None or dataset.chunks is None:
+            return None
+        slice_axis, (vertical, horizontal) = VIEW_AXES[view]
+        depth = dataset.chunks[slice_axis]
+        slab_nbytes = depth * tile_size * tile_size * np.dtype(dataset.dtype).itemsize
+        if depth <= 1 or slab_nbytes > cache.max_bytes // 4:
+            return None
+
+        start = origin[slice_axis] // depth * depth
+        key = (self.cache_key, view.value, level, channel, start,
+               origin[vertical], origin[horizontal], tile_size)
+        slab = cache.get_slab(key)
+        if slab is None:
+            region = [None, None, None]
+            region[slice_axis] = slice(start, start + depth)
+            region[vertical] = slice(origin[vertical], origin[vertical] + tile_size)
+            region[horizontal] = slice(origin[horizontal], origin[horizontal] + tile_size)
+            block = self.read_region(level, channel, tuple(region))
+            slab = np.ascontiguousarray(block.transpose(slice_axis, vertical, horizontal))
+            cache.put_slab(key, slab)
+        return slab[origin[slice_axis] - start]
+
+    def tile_chunk_footprint(self, view: ViewType, level: int, channel: int,
+                             z: int, y: int, x: int, tile_size: int = 512) -> Tuple:
+        """Range of chunk indices per axis that get_tile reads in the source dataset
+
+        Tiles with equal footprints decompress exactly the same chunks.
+        """
+        dataset = self.get_dataset(level, channel)
+        if view == ViewType.CORONAL:
+            region = ((z, z + 1), (y, y + tile_size), (x, x + tile_size))
+        elif view == ViewType.SAGITTAL:
+            region = ((z, z + tile_size), (y, y + tile_size), (x, x + 1))
+        elif view == ViewType.HORIZONTAL:
+            region = ((z, z + tile_size), (y, y + 1), (x, x + tile_size))
+        else:
+            raise ValueError(f"Unknown view type: {view}")
+        chunks = dataset.chunks or dataset.shape
+        return tuple((start // c, (min(stop, n) - 1) // c)
+                     for (start, stop), c, n in zip(region, chunks, dataset.shape))
+
+    def read_region(self, level: int, channel: int,
+                    region: Tuple[slice, slice, slice]) -> np.ndarray:
+        """Read a (z, y, x) box, assembling it from cached chunks if possible
+
+        Slice stops beyond the data shape are clipped, as with h5py.
+        """
+        return self._read_dataset_region(self.get_dataset(level, channel),
+                                         (level, channel), region)
+
+    def _direct_loader(self, dataset: Any) -> Optional[ChunkLoader]:
+        """Chunk loader bypassing the dataset's own reads, None to use those
+
+        Direct loaders are used even without a chunk cache. Formats that can
+        read raw chunks (see ImarisHandler) override this.
+        """
+        return None
+
+    def _read_dataset_region(self, dataset: Any, key: Tuple,
+                             region: Tuple[slice, ...]) -> np.ndarray:
+        """Read a box of a dataset through the chunk cache
+
+        Args:
+            dataset: Source dataset in this file or one of its view stores
+            key: Identifies the dataset within this file in cache keys
+            region: Slices, one per dataset axis
+        """
+        chunks = dataset.chunks
+        direct = self._direct_loader(dataset)
+        cache = self.chunk_cache
+        if chunks is None or (cache is None and direct is None):
+            return dataset[region]
+
+        shape = dataset.shape
+        starts = [s.start for s in region]
+        stops = [min(s.stop, n) for s, n in zip(region, shape)]
+        chunk_ranges = [range(a // c, (b - 1) // c + 1)
+                        for a, b, c in zip(starts, stops, chunks)]
+
+        # A region spanning a large share of the budget (e.g. a sagittal
+        # column through every z chunk) would only flush the cache
+        n_chunks = int(np.prod([len(r) for r in chunk_ranges]))
+        chunk_nbytes = int(np.prod(chunks)) * np.dtype(dataset.dtype).itemsize
+        if cache is not None and n_chunks * chunk_nbytes > cache.max_bytes // 4:
+            if direct is None:
+                return dataset[region]
+            cache = None
+
+        indices = list(itertools.product(*chunk_ranges))
+        loaded: Dict[Tuple[int, ...], np.ndarray] = {}
+        missing = []
+        for index in indices:
+            chunk = cache.get_chunk(self._chunk_key(key, index)) if cache else None
+            if chunk is None:
+                missing.append(index)
+            else:
+                loaded[index] = chunk
+
+        if missing:
+            load = direct or self._load_chunks_classic
+            for index, chunk in zip(missing, load(dataset, missing)):
+                if cache is not None:
+                    cache.put_chunk(self._chunk_key(key, index), chunk)
+                loaded[index] = chunk
+
+        out = np.empty([b - a for a, b in zip(starts, stops)], dtype=dataset.dtype)
+        for index in indices:
+            origin = [i * c for i, c in zip(index, chunks)]
+            src = tuple(slice(max(a, o) - o, min(b, o + c) - o)
+                        for a, b, o, c in zip(starts, stops, origin, chunks))
+            dst = tuple(slice(max(a, o) - a, min(b, o + c) - a)
+                        for a, b, o, c in zip(starts, stops, origin, chunks))
+            out[dst] = loaded[index][src]
+        return out
+
+    def _chunk_key(self, key: Tuple, index: Tuple[int, ...]):
+        return (self.cache_key,) + tuple(key) + (index,)
+
+    @staticmethod
+    def _chunk_slices(dataset: Any, index: Tuple[int, ...]) -> Tuple[slice, ...]:
+        """Slices covering one chunk, clipped to the dataset shape"""
+        return tuple(slice(i * c, min((i + 1) * c, n))
+                     for i, c, n in zip(index, dataset.chunks, dataset.shape))
+
+    def _load_chunks_classic(self, dataset: Any,
+                             indices: Sequence[Tuple[int, ...]]) -> List[np.ndarray]:
+        """Read chunks through the dataset's own indexing"""
+        return [np.asarray(dataset[self._chunk_slices(dataset, index)]) for index in indices]
+
+    def get_metadata(self) -> Dict:
+        """Extract metadata from the file"""
+        if self._metadata is None:
+            metadata = {
+                "file_path": str(self.file_path),
+                "file_size": _path_size(self.file_path),
+                "resolution_levels": self.get_resolution_levels(),
+                "channels": self.get_channels(),
+                "shapes": {},
+                "data_type": None,
+            }
+
+            # Get shapes for each resolution level
+            levels = metadata["resolution_levels"]
+            channels = metadata["channels"]
+
+            if levels and channels:
+                for level in levels:
+                    try:
+                        shape = self.get_data_shape(level, channels[0])
+                        metadata["shapes"][level] = shape
+
+                        # Get data type from first level
+                        if metadata["data_type"] is None:
+                            dataset = self.get_dataset(level, channels[0])
+                            metadata["data_type"] = str(dataset.dtype)
+
+                    except Exception as e:
+                        logger.warning(f"Could not get shape for level {level}: {e}")
+
+            self._metadata = metadata
+
+        return self._metadata
+
+    def get_pixel_value_at_coordinate(self, level: int, channel: int,
+                                    x: int, y: int, z: int) -> Union[int, float]:
+        """Get pixel value at specific 3D coordinate"""
+        try:
+            dataset = self.get_dataset(level, channel)
+
+            # Check bounds
+            shape = dataset.shape  # (z, y, x)
+            if not (0 <= z < shape[0] and 0 <= y < shape[1] and 0 <= x < shape[2]):
+                raise IndexError(f"Coordinates ({x}, {y}, {z}) out of bounds for shape {shape}")
+
+            return dataset[z, y, x]
+
+        except KeyError:
+            raise KeyError(f"Data not found for level {level}, channel {channel}")
+
+    def calculate_tile_grid_size(self, view: ViewType, level: int,
+                                tile_size: int = 512) -> Tuple[int, int]:
+        """Calculate number of tiles needed in each dimension"""
+        # Get shape for any channel (they should be the same)
+        channels = self.get_channels()
+        if not channels:
+            raise ValueError("No channels found")
+
+        shape = self.get_data_shape(level, channels[0])  # (z, y, x)
+
+        # Get the 2D slice dimensions based on view
+        if view == ViewType.SAGITTAL:
+            height, width = shape[0], shape[1]  # z, y
+        elif view == ViewType.CORONAL:
+            height, width = shape[0], shape[2]  # z, x
+        elif view == ViewType.HORIZONTAL:
+            height, width = shape[1], shape[2]  # y, x
+        else:
+            raise ValueError(f"Unknown view type: {view}")
+
+        # Calculate number of tiles
+        tiles_x = (width + tile_size - 1) // tile_size
+        tiles_y = (height + tile_size - 1) // tile_size
+
+        return tiles_x, tiles_y
+
+
+def _path_size(path: Path) -> int:
+    """Size of a file, or total size of the files under a directory store"""
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return path.stat().st_size
+
+
+def open_volume(file_path: Union[str, Path],
+                chunk_cache: Optional[ChunkCache] = None,
+                chunk_read_mode: Optional[str] = None,
+                decode_executor: Optional[Executor] = None,
+                use_view_stores: bool = False,
+                slab_cache: Optional[SlabCache] = None) -> VolumeReader:
+    """Open a volume with the reader matching its suffix
+
+    HDF5 specific options (chunk read mode, decode executor) only apply to
+    Imaris files.
+    """
+    file_path = Path(file_path)
+    if file_path.suffix in ZARR_SUFFIXES:
+        from .zarr_reader import ZarrReader
+        return ZarrReader(file_path, chunk_cache=chunk_cache, use_view_stores=use_view_stores,
+                          slab_cache=slab_cache)
+    from .imaris_handler import ImarisHandler, CHUNK_READ_CLASSIC
+    return ImarisHandler(file_path, chunk_cache=chunk_cache, slab_cache=slab_cache,
+                         chunk_read_mode=chunk_read_mode or CHUNK_READ_CLASSIC,
+                         decode_executor=decode_executor,
+                         use_view_stores=use_view_stores)
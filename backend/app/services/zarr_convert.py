@@ -0,0 +1,328 @@
+"""
+Conversion of Imaris volumes to multiscale OME-Zarr stores
+
+The store holds every resolution level of the source as arrays "0", "1", ...
+of shape (c, z, y, x), chunked (1, depth, tile_size, tile_size) so a coronal
+tile is one chunk, compressed with Blosc. Optional view copies at
+``views/{view}/{level}`` hold the voxels in the layout of view_store
+(slice axis first) for sagittal and horizontal tiles.
+
+Conversion streams blocks aligned to the target chunks, so memory is bounded
+by the block size times the number of workers whatever the volume size.
+Blocks are written into ``<store>.partial`` and logged once written, so an
+interrupted run resumes where it stopped; the multiscales metadata is written
+last and the store renamed into place, so readers never see a partial store.
+"""
+
+import itertools
+import json
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import logging
+
+import numpy as np
+
+from ..models.specimen import ViewType
+from .view_store import VIEW_STORE_AXES
+from .zarr_reader import VISOR_ATTR, view_array_path, zarr
+
+logger = logging.getLogger(__name__)
+
+# Blosc compressors and shuffle filters offered by the converter
+CODECS = ("zstd", "lz4", "lz4hc", "blosclz", "zlib")
+SHUFFLES = {"none": 0, "byte": 1, "bit": 2}
+
+# Log of written blocks inside a partial store, first line holds the parameters
+PROGRESS_FILE = ".conversion_progress"
+PARTIAL_SUFFIX = ".partial"
+
+IDENTITY_AXES = (0, 1, 2)
+
+
+def zarr_store_path(source_path: Union[str, Path]) -> Path:
+    """Path of the Zarr store converted from a source file, e.g. image.zarr"""
+    return Path(source_path).with_suffix(".zarr")
+
+
+@dataclass(frozen=True)
+class ConversionOptions:
+    """Layout and codec of a converted store; a resumed run must match them"""
+    tile_size: int = 512
+    chunk_depth: int = 1             # Planes per chunk of the (c, z, y, x) arrays
+    views: Tuple[str, ...] = ()      # View copies to write, e.g. ("sagittal",)
+    levels: Optional[Tuple[int, ...]] = None  # Resolution levels, None for all
+    codec: str = "zstd"
+    clevel: int = 5
+    shuffle: str = "byte"
+    max_block_bytes: int = 64 * 1024 * 1024
+
+    def __post_init__(self):
+        if self.codec not in CODECS:
+            raise ValueError(f"Unknown codec: {self.codec}, use one of {', '.join(CODECS)}")
+        if self.shuffle not in SHUFFLES:
+            raise ValueError(f"Unknown shuffle: {self.shuffle}, use one of {', '.join(SHUFFLES)}")
+        for view in self.views:
+            if ViewType(view) not in VIEW_STORE_AXES:
+                raise ValueError(f"No view copy layout for view: {view}")
+
+    def compressor(self):
+        from numcodecs import Blosc
+        return Blosc(cname=self.codec, clevel=self.clevel, shuffle=SHUFFLES[self.shuffle])
+
+
+@dataclass(frozen=True)
+class _Target:
+    """One output array and the blocks it is written in"""
+    path: str                   # Array path in the store
+    level: int
+    axes: Tuple[int, int, int]  # Source (z, y, x) axis of each target spatial axis
+    shape: Tuple[int, ...]      # (c, ...) in target axes
+    chunks: Tuple[int, ...]
+    block: Tuple[int, int, int]  # Spatial block, a multiple of the chunks
+
+    def blocks(self) -> List[Tuple[int, ...]]:
+        """Spatial origins of the blocks, in a fixed order"""
+        return list(itertools.product(*(range(0, n, b) for n, b in zip(self.shape[1:], self.block))))
+
+
+def _plan_targets(handler, options: ConversionOptions) -> List[_Target]:
+    """Output arrays for the requested levels and views"""
+    levels = options.levels if options.levels is not None else handler.get_resolution_levels()
+    channels = handler.get_channels()
+    layouts = [("", IDENTITY_AXES)] + [(v, VIEW_STORE_AXES[ViewType(v)]) for v in options.views]
+    targets = []
+    for view, axes in layouts:
+        for level in levels:
+            source = handler.get_dataset(level, channels[0])
+            source_chunks = source.chunks or source.shape
+            shape = tuple(source.shape[a] for a in axes)
+            depth = options.chunk_depth if not view else 1
+            chunks = (min(depth, shape[0]),) + tuple(min(options.tile_size, n) for n in shape[1:])
+            # Take the source chunk depth along the slice axis so each source
+            # chunk is decompressed once per block row, within the budget
+            plane_bytes = chunks[1] * chunks[2] * source.dtype.itemsize
+            block_depth = max(chunks[0], source_chunks[axes[0]])
+            block_depth = min(block_depth, max(chunks[0], options.max_block_bytes // plane_bytes))
+            block_depth = -(-block_depth // chunks[0]) * chunks[0]
+            targets.append(_Target(
+                path=view_array_path(ViewType(view), level) if view else str(level),
+                level=level, axes=axes, shape=(len(channels),) + shape,
+                chunks=(1,) + chunks, block=(block_depth,) + chunks[1:]))
+    return targets
+
+
+# Per-process state of conversion workers, see _init_worker
+_worker = {}
+
+
+def _init_worker(source_path: str, store_path: str):
+    from .imaris_handler import ImarisHandler
+    _worker["handler"] = ImarisHandler(source_path)
+    _worker["group"] = zarr.open_group(store_path, mode="r+")
+    _worker["arrays"] = {}
+
+
+def _convert_block(target: _Target, channel: int, origin: Tuple[int, ...]) -> int:
+    """Copy one block from the source into its target array, returning bytes copied"""
+    array = _worker["arrays"].get(target.path)
+    if array is None:
+        # Background blocks are left unwritten and read back as the fill value
+        array = zarr.open_array(_worker["group"].store, path=target.path, mode="r+",
+                                write_empty_chunks=False)
+        _worker["arrays"][target.path] = array
+    target_slices = tuple(slice(o, min(o + b, n))
+                          for o, b, n in zip(origin, target.block, target.shape[1:]))
+    source_slices = [None] * 3
+    for target_axis, source_axis in enumerate(target.axes):
+        source_slices[source_axis] = target_slices[target_axis]
+    data = _worker["handler"].get_dataset(target.level, channel)[tuple(source_slices)]
+    array[(channel,) + target_slices] = np.transpose(data, target.axes)
+    return data.nbytes
+
+
+def _multiscales(targets: Sequence[_Target], name: str) -> List[Dict]:
+    """OME-Zarr 0.4 multiscales metadata of the (c, z, y, x) arrays"""
+    levels = [t for t in targets if t.axes == IDENTITY_AXES]
+    base = levels[0].shape[1:]
+    return [{
+        "version": "0.4",
+        "name": name,
+        "axes": [{"name": "c", "type": "channel"}] +
+                [{"name": a, "type": "space"} for a in "zyx"],
+        "datasets": [{
+            "path": t.path,
+            "coordinateTransformations": [{
+                "type": "scale",
+                "scale": [1.0] + [b / n for b, n in zip(base, t.shape[1:])],
+            }],
+        } for t in levels],
+    }]
+
+
+def _read_progress(partial_path: Path, header: Dict) -> Optional[set]:
+    """Blocks logged by an earlier run with the same header, None to start afresh"""
+    progress_path = partial_path / PROGRESS_FILE
+    if not progress_path.exists():
+        return None
+    with open(progress_path) as f:
+        lines = f.read().splitlines()
+    try:
+        if not lines or json.loads(lines[0]) != header:
+            return None
+    except ValueError:
+        return None
+    done = set()
+    for line in lines[1:]:
+        parts = line.split()
+        if len(parts) == 3 and all(p.isdigit() for p in parts):
+            done.add(tuple(int(p) for p in parts))  # A torn last line is redone
+    return done
+
+
+def convert_to_zarr(source_path: Union[str, Path], store_path: Optional[Union[str, Path]] = None,
+                    options: Optional[ConversionOptions] = None, workers: int = 1,
+                    restart: bool = False, report_interval: float = 10.0,
+                    progress: Optional[Callable[[str], None]] = None) -> Path:
+    """Convert an .ims file into a multiscale Zarr store
+
+    Args:
+        source_path: Source .ims file
+        store_path: Output .zarr directory (default: next to the source)
+        options: Chunk layout, view copies and codec
+        workers: Processes copying blocks in parallel; 1 copies in this process
+        restart: Discard a partial store left by an interrupted run
+        report_interval: Seconds between throughput reports
+        progress: Receives progress messages (default: logger.info)
+
+    Returns:
+        Path of the written store
+    """
+    from .imaris_handler import ImarisHandler
+
+    if zarr is None:
+        raise RuntimeError("zarr is not installed, cannot convert to Zarr")
+    source_path = Path(source_path)
+    store_path = Path(store_path) if store_path else zarr_store_path(source_path)
+    partial_path = store_path.with_name(store_path.name + PARTIAL_SUFFIX)
+    options = options or ConversionOptions()
+    progress = progress or logger.info
+
+    with ImarisHandler(source_path) as handler:
+        targets = _plan_targets(handler, options)
+        dtype = handler.get_dataset(targets[0].level, 0).dtype
+        histograms = {}
+        for target in targets:
+            if target.axes != IDENTITY_AXES:
+                continue
+            for channel in range(target.shape[0]):
+                counts = handler.get_histogram(target.level, channel)
+                if counts is None:
+                    continue
+                entry = {"counts": counts.tolist()}
+                bounds = handler.get_histogram_range(target.level, channel)
+                if bounds is not None:
+                    entry["min"], entry["max"] = bounds
+                histograms[f"{target.level}/{channel}"] = entry
+        source_mtime_ns = handler.mtime_ns
+
+    header = {"source": str(source_path), "source_mtime_ns": source_mtime_ns,
+              "options": json.loads(json.dumps(asdict(options)))}
+    done = None if restart else _read_progress(partial_path, header)
+    if done is None:
+        if partial_path.exists():
+            progress(f"Discarding partial store {partial_path}")
+            shutil.rmtree(partial_path)
+        group = zarr.open_group(str(partial_path), mode="w")
+        for target in targets:
+            group.create_dataset(target.path, shape=target.shape, chunks=target.chunks,
+                                 dtype=dtype, compressor=options.compressor(), fill_value=0)
+        with open(partial_path / PROGRESS_FILE, "w") as f:
+            f.write(json.dumps(header) + "\n")
+        done = set()
+    elif done:
+        progress(f"Resuming {partial_path}: {len(done)} blocks already written")
+
+    units = [(t, c, b, origin)
+             for t, target in enumerate(targets)
+             for c in range(target.shape[0])
+             for b, origin in enumerate(target.blocks())
+             if (t, c, b) not in done]
+
+    t0 = last_report = time.perf_counter()
+    copied = 0
+    n_done = 0
+    with open(partial_path / PROGRESS_FILE, "a") as log:
+        def finished(unit, nbytes):
+            nonlocal copied, n_done, last_report
+            t, c, b, _ = unit
+            log.write(f"{t} {c} {b}\n")
+            log.flush()
+            copied += nbytes
+            n_done += 1
+            now = time.perf_counter()
+            if now - last_report >= report_interval:
+                last_report = now
+                rate = copied / max(now - t0, 1e-9)
+                eta = (len(units) - n_done) * (now - t0) / n_done
+                progress(f"{store_path.name}: {n_done}/{len(units)} blocks, "
+                         f"{copied / 1e6:.0f} MB at {rate / 1e6:.1f} MB/s, ETA {eta:.0f} s")
+
+        if workers <= 1:
+            _init_worker(str(source_path), str(partial_path))
+            try:
+                for unit in units:
+                    t, c, _, origin = unit
+                    finished(unit, _convert_block(targets[t], c, origin))
+            finally:
+                _worker.pop("handler").close()
+                _worker.clear()
+        else:
+            # Keep a bounded number of blocks in flight so memory stays
+            # within about 2 * workers * max_block_bytes
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(str(source_path), str(partial_path))) as pool:
+                pending = {}
+                queue = iter(units)
+                while True:
+                    for unit in itertools.islice(queue, 2 * workers - len(pending)):
+                        t, c, _, origin = unit
+                        pending[pool.submit(_convert_block, targets[t], c, origin)] = unit
+                    if not pending:
+                        break
+                    completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        finished(pending.pop(future), future.result())
+
+    dt = time.perf_counter() - t0
+    progress(f"{store_path.name}: copied {copied / 1e6:.1f} MB in {dt:.1f} s "
+             f"({copied / max(dt, 1e-9) / 1e6:.1f} MB/s)")
+
+    # Metadata last: its .zattrs marks the store version for readers
+    group = zarr.open_group(str(partial_path), mode="r+")
+    group.attrs.update({
+        "multiscales": _multiscales(targets, source_path.stem),
+        VISOR_ATTR: {
+            "source": source_path.name,
+            "source_mtime_ns": source_mtime_ns,
+            "tile_size": options.tile_size,
+            "views": list(options.views),
+            "histograms": histograms,
+        },
+    })
+    (partial_path / PROGRESS_FILE).unlink()
+
+    if store_path.exists():
+        old_path = store_path.with_name(store_path.name + ".old")
+        if old_path.exists():
+            shutil.rmtree(old_path)
+        os.replace(store_path, old_path)
+        os.replace(partial_path, store_path)
+        shutil.rmtree(old_path)
+    else:
+        os.replace(partial_path, store_path)
+    return store_path
@@ -0,0 +1,194 @@
+"""
+Reader for multiscale Zarr / OME-Zarr volume stores
+"""
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+import logging
+
+import numpy as np
+
+from ..models.specimen import ViewType
+from .chunk_cache import ChunkCache, SlabCache
+from .view_store import VIEW_STORE_AXES
+from .volume_reader import VolumeReader
+
+try:
+    import zarr
+except ImportError:  # Optional, only needed for specimens stored as .zarr
+    zarr = None
+
+logger = logging.getLogger(__name__)
+
+# Group attribute holding what OME-Zarr has no place for (histograms)
+VISOR_ATTR = "visor"
+
+
+def view_array_path(view: ViewType, level: int) -> str:
+    """Path of the (c, ...) view copy of a level, laid out as in view_store"""
+    return f"views/{view.value}/{level}"
+
+
+class _ChannelArray:
+    """(z, y, x) view of one time point and channel of a zarr array"""
+
+    def __init__(self, array, prefix: Tuple, axes: Tuple[int, int, int]):
+        self.array = array
+        self._prefix = prefix  # Index of the leading (t, c) axes
+        self.shape = tuple(array.shape[i] for i in axes)
+        self.chunks = tuple(array.chunks[i] for i in axes)
+        self.dtype = array.dtype
+
+    @property
+    def size(self) -> int:
+        return int(np.prod(self.shape))
+
+    def __getitem__(self, region):
+        if region is Ellipsis:
+            region = (slice(None),) * 3
+        elif not isinstance(region, tuple):
+            region = (region,)
+        return self.array[self._prefix + region]
+
+
+class ZarrReader(VolumeReader):
+    """Reader for multiscale volumes stored as Zarr (v2) groups
+
+    Levels follow the OME-Zarr "multiscales" metadata, with t, c, z, y, x
+    axes of which t and c are optional. Groups without it are read as
+    numbered arrays "0", "1", ... of shape (c, z, y, x). Histograms are
+    read from the group attribute "visor", written by scripts/ims_to_zarr.py:
+    {"histograms": {"<level>/<channel>": {"counts": [...], "min": .., "max": ..}}}
+
+    Sagittal and horizontal tiles are read from view copies in the store
+    (see view_array_path) when present.
+    """
+
+    def __init__(self, file_path: Union[str, Path],
+                 chunk_cache: Optional[ChunkCache] = None,
+                 use_view_stores: bool = False,
+                 slab_cache: Optional[SlabCache] = None):
+        """Open the store at file_path
+
+        Args:
+            file_path: Path to the .zarr directory
+            chunk_cache: Optional shared cache of decompressed chunks
+            use_view_stores: Read sagittal/horizontal tiles from the view
+                copies of the store when it has them
+            slab_cache: Optional cache of chunk-deep slabs along the slice axis
+        """
+        if zarr is None:
+            raise RuntimeError("zarr is not installed, cannot read " + str(file_path))
+        if not Path(file_path).exists():
+            raise FileNotFoundError(f"Zarr store not found: {file_path}")
+        super().__init__(file_path, chunk_cache, slab_cache)
+
+        try:
+            self._group = zarr.open_group(str(self.file_path), mode='r')
+            self._arrays, self._axes = self._read_multiscales(self._group)
+            logger.info(f"Opened Zarr store: {self.file_path}")
+        except Exception as e:
+            logger.error(f"Failed to open Zarr store {self.file_path}: {e}")
+            raise
+        self.use_view_stores = use_view_stores
+        self._datasets: Dict[Tuple[int, int], _ChannelArray] = {}
+        self._view_datasets: Dict[Tuple[ViewType, int, int], Optional[_ChannelArray]] = {}
+        attrs = self._group.attrs.asdict()
+        self._histograms: Dict[str, Dict] = attrs.get(VISOR_ATTR, {}).get("histograms", {})
+
+    @staticmethod
+    def _read_multiscales(group) -> Tuple[List[Any], List[str]]:
+        """Arrays of each level, finest first, and their axis names"""
+        multiscales = group.attrs.get("multiscales")
+        if multiscales:
+            scale = multiscales[0]
+            # Axes are names (v0.3) or {"name", "type"} objects (v0.4+)
+            axes = [a if isinstance(a, str) else a["name"]
+                    for a in scale.get("axes", ["t", "c", "z", "y", "x"])]
+            arrays = [group[d["path"]] for d in scale["datasets"]]
+        else:
+            arrays = []
+            while str(len(arrays)) in group:
+                arrays.append(group[str(len(arrays))])
+            axes = ["c", "z", "y", "x"]
+        if not arrays:
+            raise ValueError("No multiscale arrays found in Zarr store")
+        if not set("zyx") <= set(axes) or len(axes) != arrays[0].ndim:
+            raise ValueError(f"Unsupported Zarr axes: {axes}")
+        return arrays, axes
+
+    def close(self):
+        """Drop the array handles; zarr keeps no file open between reads"""
+        self._datasets.clear()
+        self._view_datasets.clear()
+        if self._group is not None:
+            self._group = None
+            logger.info(f"Closed Zarr store: {self.file_path}")
+
+    @property
+    def is_open(self) -> bool:
+        """Whether the store has not been closed"""
+        return self._group is not None
+
+    def get_dataset(self, level: int, channel: int) -> _ChannelArray:
+        """Get (cached) (z, y, x) array for a level and channel
+
+        Raises:
+            KeyError: if the level or channel does not exist
+        """
+        dataset = self._datasets.get((level, channel))
+        if dataset is None:
+            if not 0 <= level < len(self._arrays) or channel not in self.get_channels():
+                raise KeyError(f"Level {level}, channel {channel} not in {self.file_path}")
+            array = self._arrays[level]
+            prefix = []
+            for name in self._axes:
+                if name == "t":
+                    prefix.append(0)
+                elif name == "c":
+                    prefix.append(channel)
+            axes = tuple(self._axes.index(name) for name in "zyx")
+            if axes != tuple(range(len(prefix), len(prefix) + 3)):
+                raise ValueError(f"Spatial axes must come last as z, y, x: {self._axes}")
+            dataset = _ChannelArray(array, tuple(prefix), axes)
+            self._datasets[(level, channel)] = dataset
+        return dataset
+
+    def get_view_dataset(self, view: ViewType, level: int,
+                         channel: int) -> Optional[_ChannelArray]:
+        """Get the view copy of a level and channel, None if the store has none"""
+        if not self.use_view_stores or view not in VIEW_STORE_AXES:
+            return None
+        key = (view, level, channel)
+        if key not in self._view_datasets:
+            path = view_array_path(view, level)
+            dataset = None
+            if path in self._group and channel in self.get_channels():
+                dataset = _ChannelArray(self._group[path], (channel,), (1, 2, 3))
+            self._view_datasets[key] = dataset
+        return self._view_datasets[key]
+
+    def get_resolution_levels(self) -> List[int]:
+        """Get available resolution levels"""
+        return list(range(len(self._arrays)))
+
+    def get_channels(self) -> List[int]:
+        """Get available channels"""
+        if "c" not in self._axes:
+            return [0]
+        return list(range(self._arrays[0].shape[self._axes.index("c")]))
+
+    def get_histogram(self, level: int, channel: int) -> Optional[np.ndarray]:
+        """Histogram counts stored by the converter, None if absent"""
+        entry = self._histograms.get(f"{level}/{channel}")
+        if entry is None:
+            logger.warning(f"No histogram found for level {level}, channel {channel}")
+            return None
+        return np.asarray(entry["counts"])
+
+    def get_histogram_range(self, level: int, channel: int) -> Optional[Tuple[float, float]]:
+        """Intensity range spanned by the stored histogram bins"""
+        entry = self._histograms.get(f"{level}/{channel}")
+        if entry is None or "min" not in entry or "max" not in entry:
+            return None
+        return float(entry["min"]), float(entry["max"])
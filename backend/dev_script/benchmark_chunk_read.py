@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark the classic (h5py) and direct (read_direct_chunk + thread pool)
+chunk read paths of ImarisHandler, without HTTP or image encoding.
+
+Tiles are read from random origins at one resolution level; the chunk cache
+is disabled so every tile pays the full read and decompression cost.
+Concurrency > 1 reads several tiles at once from a thread pool, which shows
+whether decompression still serializes on the GIL / HDF5 lock.
+
+Example:
+  python dev_script/benchmark_chunk_read.py \\
+    --img-path /app/data/macaque_brain_RM009/image.ims \\
+    --view coronal --level 0 --n-tiles 200 --concurrency 8
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add the backend app to Python path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.models.specimen import ViewType
+from app.services.imaris_handler import ImarisHandler, CHUNK_READ_CLASSIC, CHUNK_READ_DIRECT
+
+
+def random_origins(shape, view, tile_size, n_tiles, seed):
+    """Tile origins (z, y, x) whose tiles lie inside the volume"""
+    rng = random.Random(seed)
+    nz, ny, nx = shape
+    span = {
+        ViewType.CORONAL: (nz, max(1, ny - tile_size), max(1, nx - tile_size)),
+        ViewType.SAGITTAL: (max(1, nz - tile_size), max(1, ny - tile_size), nx),
+        ViewType.HORIZONTAL: (max(1, nz - tile_size), ny, max(1, nx - tile_size)),
+    }[view]
+    return [tuple(rng.randrange(s) for s in span) for _ in range(n_tiles)]
+
+
+def run(handler, view, level, channel, origins, tile_size, concurrency):
+    """Read all tiles, return (seconds, bytes)"""
+    def read(zyx):
+        return handler.get_tile(view, level, channel, *zyx, tile_size=tile_size).nbytes
+
+    t0 = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as ex:
+            nbytes = sum(ex.map(read, origins))
+    else:
+        nbytes = sum(read(zyx) for zyx in origins)
+    return time.perf_counter() - t0, nbytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare classic and direct chunk reads.")
+    parser.add_argument("--img-path", type=str, required=True, help="Path to .ims file")
+    parser.add_argument("--view", type=str, default="coronal",
+                        choices=["coronal", "sagittal", "horizontal"])
+    parser.add_argument("--level", type=int, default=0)
+    parser.add_argument("--channel", type=int, default=0)
+    parser.add_argument("--tile-size", type=int, default=512)
+    parser.add_argument("--n-tiles", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Tiles read in parallel (default 1)")
+    parser.add_argument("--decode-threads", type=int, default=os.cpu_count() or 4,
+                        help="Decompression threads for the direct path")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    view = ViewType(args.view)
+    with ImarisHandler(args.img_path) as handler:
+        shape = handler.get_data_shape(args.level, args.channel)
+    origins = random_origins(shape, view, args.tile_size, args.n_tiles, args.seed)
+    print(f"Shape at level {args.level}: {shape}, {len(origins)} {args.view} tiles "
+          f"of {args.tile_size}, concurrency {args.concurrency}")
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=args.decode_threads) as decode_executor:
+        for mode in (CHUNK_READ_CLASSIC, CHUNK_READ_DIRECT):
+            # Fresh handle per mode: no chunk cache, cold dataset objects
+            with ImarisHandler(args.img_path, chunk_read_mode=mode,
+                               decode_executor=decode_executor) as handler:
+                dt, nbytes = run(handler, view, args.level, args.channel,
+                                 origins, args.tile_size, args.concurrency)
+            results[mode] = dt
+            print(f"- {mode:8s}: {dt:.3f} s, {len(origins) / dt:.1f} tiles/s, "
+                  f"{nbytes / dt / 1e6:.1f} MB/s (decoded), "
+                  f"{dt / len(origins) * 1000:.1f} ms/tile")
+
+    speedup = results[CHUNK_READ_CLASSIC] / results[CHUNK_READ_DIRECT]
+    print(f"Direct path speedup: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
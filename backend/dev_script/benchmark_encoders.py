@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark tile encoders: milliseconds per tile and bytes per tile for each
+backend, format (JPEG, PNG, WebP, AVIF if available) and setting, against
+the legacy optimize=True encoding.
+
+Tiles come from an .ims file when --img-path is given (uint16 data is scaled
+to uint8 by the tile maximum, as the server does), otherwise a synthetic
+smooth-plus-noise tile is used.
+
+Example:
+  python dev_script/benchmark_encoders.py --n-tiles 50
+  python dev_script/benchmark_encoders.py \\
+    --img-path /app/data/macaque_brain_RM009/image.ims --level 2
+"""
+
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Add the backend app to Python path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.models.specimen import ViewType
+from app.services.encoders import ENCODERS, EncodeOptions, available_encoders, format_available
+
+
+def synthetic_tiles(n_tiles, tile_size, seed):
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:tile_size, 0:tile_size] / tile_size
+    tiles = []
+    for i in range(n_tiles):
+        base = 100 + 80 * np.sin(6 * xx + i) * np.cos(4 * yy - i)
+        tiles.append(np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8))
+    return tiles
+
+
+def ims_tiles(img_path, level, n_tiles, tile_size, seed):
+    from app.services.imaris_handler import ImarisHandler
+    rng = np.random.default_rng(seed)
+    tiles = []
+    with ImarisHandler(img_path) as handler:
+        nz, ny, nx = handler.get_data_shape(level, 0)
+        for _ in range(n_tiles):
+            z = int(rng.integers(nz))
+            y = int(rng.integers(max(1, ny - tile_size)))
+            x = int(rng.integers(max(1, nx - tile_size)))
+            tile = handler.get_tile(ViewType.CORONAL, level, 0, z, y, x, tile_size)
+            peak = tile.max()
+            tiles.append((tile.astype(np.float32) / peak * 255).astype(np.uint8)
+                         if peak > 0 else tile.astype(np.uint8))
+    return tiles
+
+
+def legacy_encode(array, format):
+    buffer = io.BytesIO()
+    if format == 'JPEG':
+        Image.fromarray(array).save(buffer, format='JPEG', quality=85, optimize=True)
+    else:
+        Image.fromarray(array).save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def measure(encode, tiles, repeat):
+    """Return (ms per tile, mean bytes per tile)"""
+    nbytes = sum(len(encode(t)) for t in tiles)  # Warm up
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for t in tiles:
+            encode(t)
+    dt = time.perf_counter() - t0
+    return dt / (repeat * len(tiles)) * 1e3, nbytes / len(tiles)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare tile encoders.")
+    parser.add_argument("--img-path", type=str, default=None,
+                        help="Imaris file to take tiles from (default: synthetic tiles)")
+    parser.add_argument("--level", type=int, default=0)
+    parser.add_argument("--tile-size", type=int, default=512)
+    parser.add_argument("--n-tiles", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.img_path:
+        tiles = ims_tiles(args.img_path, args.level, args.n_tiles, args.tile_size, args.seed)
+    else:
+        tiles = synthetic_tiles(args.n_tiles, args.tile_size, args.seed)
+    print(f"{len(tiles)} tiles of {tiles[0].shape}, {args.repeat} repeats")
+
+    cases = [("legacy optimize=True", 'JPEG', None), ("legacy optimize=True", 'PNG', None)]
+    status = available_encoders()
+    for name, reason in status.items():
+        if reason is not None:
+            print(f"Skipping {name}: {reason}")
+            continue
+        for quality in (75, 85, 95):
+            cases.append((name, 'JPEG', EncodeOptions(jpeg_quality=quality)))
+        for level in (1, 6):
+            cases.append((name, 'PNG', EncodeOptions(png_compress_level=level)))
+        cases.append((name, 'WEBP', EncodeOptions(webp_quality=80)))
+        cases.append((name, 'WEBP', EncodeOptions(webp_lossless=True, webp_quality=25,
+                                                  webp_method=0)))
+        if format_available("avif"):
+            cases.append((name, 'AVIF', EncodeOptions()))
+
+    print(f"{'encoder':<22} {'format':<6} {'setting':<12} {'ms/tile':>8} {'KB/tile':>8}")
+    for name, format, options in cases:
+        if options is None:
+            encode = lambda t, f=format: legacy_encode(t, f)
+            setting = "q85" if format == 'JPEG' else "optimize"
+        else:
+            encoder = ENCODERS[name]()
+            encode = lambda t, e=encoder, f=format, o=options: e.encode(t, f, o)
+            setting = {
+                'JPEG': f"q{options.jpeg_quality}",
+                'PNG': f"level {options.png_compress_level}",
+                'WEBP': "lossless" if options.webp_lossless else f"q{options.webp_quality}",
+                'AVIF': f"q{options.avif_quality}",
+            }[format]
+        ms, nbytes = measure(encode, tiles, args.repeat)
+        print(f"{name:<22} {format:<6} {setting:<12} {ms:8.2f} {nbytes / 1024:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark slice scrubbing: one tile read for consecutive slices, stepping
+the view's slice axis by 1, as when a viewer scrolls through z.
+
+Compares no cache, the chunk cache, the slab cache and both, each with a
+fresh handle and empty caches, and reports slices per second for the first
+pass (cold, dominated by decompression) and for further passes over the
+same slices (warm, as when scrubbing back and forth). Without --img-path a
+synthetic .ims file is written to a temporary directory.
+
+Example:
+  python dev_script/benchmark_slab_cache.py \\
+    --img-path /app/data/macaque_brain_RM009/image.ims \\
+    --view coronal --level 2 --n-slices 200
+  python dev_script/benchmark_slab_cache.py --shape 128,1024,1024 --chunks 16,256,256
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the backend app to Python path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.models.specimen import ViewType
+from app.services.chunk_cache import ChunkCache, SlabCache
+from app.services.imaris_handler import ImarisHandler
+from app.services.volume_reader import VIEW_AXES
+
+
+def scrub(handler, view, level, channel, start, n_slices, tile_size):
+    """Read the tile at start for n_slices consecutive slices, return seconds"""
+    slice_axis = VIEW_AXES[view][0]
+    shape = handler.get_data_shape(level, channel)
+    origin = list(start)
+    t0 = time.perf_counter()
+    for i in range(n_slices):
+        origin[slice_axis] = (start[slice_axis] + i) % shape[slice_axis]
+        handler.get_tile(view, level, channel, *origin, tile_size=tile_size)
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Slices/s when stepping through slices.")
+    parser.add_argument("--img-path", type=str, default=None,
+                        help="Path to .ims file (default: synthetic data)")
+    parser.add_argument("--shape", type=str, default="128,768,768",
+                        help="Synthetic volume shape z,y,x")
+    parser.add_argument("--chunks", type=str, default="16,128,128",
+                        help="Synthetic chunk shape z,y,x")
+    parser.add_argument("--view", type=str, default="coronal",
+                        choices=["coronal", "sagittal", "horizontal"])
+    parser.add_argument("--level", type=int, default=0)
+    parser.add_argument("--channel", type=int, default=0)
+    parser.add_argument("--tile-size", type=int, default=512)
+    parser.add_argument("--n-slices", type=int, default=96)
+    parser.add_argument("--passes", type=int, default=3,
+                        help="Passes over the slices, the first one cold (default 3)")
+    parser.add_argument("--cache-mb", type=int, default=256,
+                        help="Budget of each cache in MB (default 256)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        img_path = args.img_path
+        if img_path is None:
+            from tests.conftest import write_synthetic_ims
+            img_path = os.path.join(tmp, "image.ims")
+            write_synthetic_ims(img_path, shape=tuple(int(v) for v in args.shape.split(",")),
+                                levels=1, channels=1,
+                                chunks=tuple(int(v) for v in args.chunks.split(",")))
+
+        view = ViewType(args.view)
+        budget = args.cache_mb * 1024 * 1024
+        with ImarisHandler(img_path) as handler:
+            shape = handler.get_data_shape(args.level, args.channel)
+            chunks = handler.get_chunks(args.level, args.channel)
+        print(f"Shape at level {args.level}: {shape}, chunks {chunks}, "
+              f"{args.n_slices} {args.view} slices of one {args.tile_size} tile")
+
+        results = {}
+        for name, chunk_cache, slab_cache in (
+                ("none", None, None),
+                ("chunk", ChunkCache(budget), None),
+                ("slab", None, SlabCache(budget)),
+                ("chunk+slab", ChunkCache(budget), SlabCache(budget))):
+            with ImarisHandler(img_path, chunk_cache=chunk_cache, slab_cache=slab_cache) as handler:
+                times = [scrub(handler, view, args.level, args.channel, (0, 0, 0),
+                               args.n_slices, args.tile_size) for _ in range(args.passes)]
+            cold = times[0]
+            warm = sum(times[1:]) / max(len(times) - 1, 1)
+            results[name] = (cold, warm)
+            print(f"- {name:10s}: cold {args.n_slices / cold:8.1f} slices/s, "
+                  f"warm {args.n_slices / warm:9.1f} slices/s "
+                  f"({warm / args.n_slices * 1000:.3f} ms/slice)")
+
+        cold_speedup = results["chunk"][0] / results["chunk+slab"][0]
+        warm_speedup = results["chunk"][1] / results["chunk+slab"][1]
+        print(f"Slab cache speedup over chunk cache alone: {cold_speedup:.2f}x cold, "
+              f"{warm_speedup:.2f}x warm")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,12 @@ import pytest
 # Add backend to Python path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
+@pytest.fixture(autouse=True)
+def no_prefetch(monkeypatch):
+    """Keep background prefetching out of tests unless they enable it"""
+    from app.config import settings
+    monkeypatch.setattr(settings, "prefetch_enabled", False)
+
 @pytest.fixture(scope="session")
 def backend_path():
     """Get the backend directory path"""
@@ -18,3 +24,138 @@ def data_path():
     """Get the data directory path"""
     backend_dir = os.path.join(os.path.dirname(__file__), '..')
     return os.path.join(backend_dir, '..', 'data')
+
+
+def write_synthetic_ims(path, shape=(40, 48, 56), levels=2, channels=2,
+                        chunks=(8, 16, 16), dtype="uint16", compression="gzip",
+                        **dataset_options):
+    """Write a small file with the Imaris (.ims) dataset layout
+
+    Voxel values are a deterministic function of (channel, z, y, x) so tests
+    can check tile contents against plain numpy indexing. Extra keyword
+    arguments (e.g. shuffle=True) are passed to h5py create_dataset.
+    """
+    import h5py
+    import numpy as np
+
+    with h5py.File(path, "w") as f:
+        for level in range(levels):
+            level_shape = tuple(max(1, s >> level) for s in shape)
+            level_chunks = tuple(min(c, s) for c, s in zip(chunks, level_shape))
+            for channel in range(channels):
+                zz, yy, xx = np.indices(level_shape)
+                data = (channel * 1000 + zz * 7 + yy * 3 + xx) % np.iinfo(dtype).max
+                group = f.require_group(
+                    f"DataSet/ResolutionLevel {level}/TimePoint 0/Channel {channel}")
+                group.create_dataset("Data", data=data.astype(dtype),
+                                     chunks=level_chunks, compression=compression,
+                                     **dataset_options)
+                hist, _ = np.histogram(data, bins=256, range=(0, 256 * 16))
+                group.create_dataset("Histogram", data=hist.astype("uint64"))
+                # Imaris writes numeric attributes as arrays of characters
+                group.attrs["HistogramMin"] = np.array(list("0.000"), dtype="S1")
+                group.attrs["HistogramMax"] = np.array(list(f"{256 * 16}.000"), dtype="S1")
+    return path
+
+
+def write_synthetic_zarr(path, shape=(40, 48, 56), levels=2, channels=2,
+                         chunks=(8, 16, 16), dtype="uint16", axes="czyx", multiscales=True):
+    """Write an OME-Zarr store holding the same voxels as write_synthetic_ims
+
+    With multiscales=False the levels are bare arrays "0", "1", ... of shape
+    (c, z, y, x) and the group has no metadata.
+    """
+    import numpy as np
+    import zarr
+
+    group = zarr.open_group(str(path), mode="w")
+    histograms = {}
+    for level in range(levels):
+        level_shape = tuple(max(1, s >> level) for s in shape)
+        data = np.empty((channels,) + level_shape, dtype=dtype)
+        for channel in range(channels):
+            zz, yy, xx = np.indices(level_shape)
+            data[channel] = (channel * 1000 + zz * 7 + yy * 3 + xx) % np.iinfo(dtype).max
+            hist, _ = np.histogram(data[channel], bins=256, range=(0, 256 * 16))
+            histograms[f"{level}/{channel}"] = {"counts": hist.tolist(),
+                                                "min": 0.0, "max": 256.0 * 16}
+        if axes == "tczyx":
+            data = data[None]
+        elif axes == "zyx":
+            data = data[0]
+        array_chunks = (1,) * (len(axes) - 3) + tuple(min(c, s) for c, s in zip(chunks, level_shape))
+        group.array(str(level), data, chunks=array_chunks)
+    if multiscales:
+        group.attrs["multiscales"] = [{
+            "version": "0.4",
+            "axes": [{"name": a, "type": "channel" if a == "c" else "time" if a == "t" else "space"}
+                     for a in axes],
+            "datasets": [{"path": str(level),
+                          "coordinateTransformations": [{"type": "scale",
+                                                         "scale": [1.0] * (len(axes) - 3) + [2.0 ** level] * 3}]}
+                         for level in range(levels)],
+        }]
+        group.attrs["visor"] = {"histograms": histograms}
+    return path
+
+
+@pytest.fixture
+def make_ims(tmp_path):
+    """Factory fixture creating synthetic .ims files under tmp_path"""
+    def _make(name="image.ims", **kwargs):
+        return write_synthetic_ims(tmp_path / name, **kwargs)
+    return _make
+
+
+@pytest.fixture
+def synthetic_specimen(tmp_path, monkeypatch):
+    """Point settings.data_path at a temporary specimen with image and atlas"""
+    from app.config import settings
+
+    specimen_id = "macaque_brain_RM009"
+    specimen_dir = tmp_path / specimen_id
+    specimen_dir.mkdir()
+    write_synthetic_ims(specimen_dir / "image.ims")
+    write_synthetic_ims(specimen_dir / "atlas.ims", channels=1, dtype="uint8")
+    monkeypatch.setattr(settings, "data_path", tmp_path)
+    return specimen_id
+
+
+def synthetic_regions(count=12, value_step=1):
+    """Regions JSON content in the layout written by scripts/convert_regions.py
+
+    Region i (1-based) has atlas value i * value_step; every third region has
+    its own colour. Regions 5-8 are children of region 4, 9-12 of region 8.
+    """
+    regions = []
+    for i in range(1, count + 1):
+        regions.append({
+            "id": i, "name": f"Region {i}", "abbreviation": f"R{i}",
+            "level1": "Brain", "level2": f"Lobe {(i - 1) // 4}", "level3": f"Area {i}",
+            "level4": f"Region {i}", "value": i * value_step, "parent_id": (i - 1) // 4 * 4 or None, "children": [],
+            "color": "123456" if i % 3 == 0 else None,
+        })
+    return {
+        "metadata": {"total_regions": count},
+        "regions": regions,
+        "hierarchy": {},
+        "region_lookup": {str(r["id"]): r for r in regions},
+    }
+
+
+@pytest.fixture
+def regions_file(tmp_path, monkeypatch):
+    """Point settings.atlas_civm_path at a synthetic regions JSON, with fresh caches"""
+    import json
+    from app.config import settings
+    from app.services import region_service
+
+    atlas_dir = tmp_path / "atlas_civm"
+    atlas_dir.mkdir()
+    path = atlas_dir / "macaque_brain_regions.json"
+    path.write_text(json.dumps(synthetic_regions()), encoding="utf-8")
+    monkeypatch.setattr(settings, "atlas_civm_path", atlas_dir)
+    monkeypatch.setattr(region_service, "_region_cache", None)
+    monkeypatch.setattr(region_service, "_label_colors", None)
+    monkeypatch.setattr(region_service, "_atlas_palette", None)
+    return path
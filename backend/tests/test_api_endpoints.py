@@ -296,8 +296,13 @@ class TestImageEndpoints:
             "expected_shape_approx": (512, 512)  # Full tile size for high-res
         }
     ])
-    def test_image_api_with_critical_statistics(self, client, test_case):
+    def test_image_api_with_critical_statistics(self, client, test_case, monkeypatch):
         """Test image API with expected pixel statistics and dimensions from dev script"""
+        from app.api import tiles
+        from app.services.intensity import WINDOW_TILE_MAX
+
+        # Expected statistics come from per-tile max normalisation
+        monkeypatch.setattr(tiles.tile_service, "intensity_window_mode", WINDOW_TILE_MAX)
         specimen_id = "macaque_brain_RM009"
         
         # Build API endpoint URL
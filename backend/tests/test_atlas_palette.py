@@ -0,0 +1,122 @@
+"""
+Tests for exact, palette-indexed atlas tiles
+"""
+
+import io
+import json
+import os
+import sys
+import numpy as np
+from PIL import Image
+from fastapi.testclient import TestClient
+
+# Add backend to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models.specimen import ViewType
+from app.services.encoders import encode_label_png, encode_palette_png
+from app.services.imaris_handler import ImarisHandler
+from app.services.region_service import (PALETTE_MISSING, get_atlas_palette,
+                                         get_label_colors, palette_indices)
+from app.services.tile_cache import TileCache
+from app.services.tile_service import TileService
+
+from tests.conftest import synthetic_regions
+
+
+def decode(data: bytes) -> Image.Image:
+    return Image.open(io.BytesIO(data))
+
+
+class TestAtlasPalette:
+    """Label to palette index tables"""
+
+    def test_identity_palette(self, regions_file):
+        palette = get_atlas_palette()
+        assert palette.identity
+        np.testing.assert_array_equal(palette.colors[:13], get_label_colors())
+        assert not palette.colors[13:].any()
+        labels = np.array([[0, 3, 200]], dtype=np.uint8)
+        assert palette_indices(labels, palette) is labels
+        np.testing.assert_array_equal(palette_indices(labels.astype(np.uint16), palette), labels)
+        # Labels without an entry are transparent background
+        np.testing.assert_array_equal(palette_indices(np.array([[256, 3]], dtype=np.uint16), palette),
+                                      [[0, 3]])
+
+    def test_compact_palette(self, regions_file):
+        regions_file.write_text(json.dumps(synthetic_regions(value_step=100)), encoding="utf-8")
+        palette = get_atlas_palette()
+        assert not palette.identity
+        assert palette.labels.tolist() == [0] + [i * 100 for i in range(1, 13)]
+        assert palette.index[1200] == 12 and palette.index[150] == PALETTE_MISSING
+        labels = np.array([[0, 100, 1200]], dtype=np.uint16)
+        np.testing.assert_array_equal(palette_indices(labels, palette), [[0, 1, 12]])
+        np.testing.assert_array_equal(
+            palette_indices(np.array([[150, 5000, 100]], dtype=np.uint16), palette), [[0, 0, 1]])
+
+
+class TestLabelEncoding:
+    """Palette and 16-bit PNGs round trip labels exactly"""
+
+    def test_palette_png(self):
+        palette = np.array([[0, 0, 0, 0], [255, 0, 0, 255], [0, 255, 0, 255],
+                            [0, 0, 255, 255]], dtype=np.uint8)
+        indices = np.array([[0, 1], [2, 1]], dtype=np.uint8)
+        image = decode(encode_palette_png(indices, palette))
+        assert image.mode == "P"
+        np.testing.assert_array_equal(np.asarray(image), indices)
+        # Unused trailing entries are dropped
+        assert len(image.getpalette()) == 3 * 3
+        assert tuple(np.asarray(image.convert("RGBA"))[1, 0]) == (0, 255, 0, 255)
+        assert np.asarray(image.convert("RGBA"))[0, 0, 3] == 0
+
+    def test_label_png(self):
+        labels = np.array([[0, 300], [65535, 7]], dtype=np.uint32)
+        np.testing.assert_array_equal(np.asarray(decode(encode_label_png(labels))), labels)
+        small = np.array([[0, 255]], dtype=np.uint16)
+        assert decode(encode_label_png(small)).mode == "L"
+
+    def test_unmapped_labels_stay_in_palette(self, regions_file):
+        service = TileService()
+        labels = np.array([[0, 3, 40000]], dtype=np.uint16)
+        png = decode(service._labels_to_image_bytes(labels, "png"))
+        assert png.mode == "P"
+        np.testing.assert_array_equal(np.asarray(png), [[0, 3, 0]])
+        assert np.asarray(png.convert("RGBA"))[0, 2, 3] == 0
+
+    def test_wide_labels_without_palette(self, monkeypatch):
+        service = TileService()
+        monkeypatch.setattr(service, "_atlas_palette", lambda: None)
+        labels = np.array([[0, 3, 40000]], dtype=np.uint16)
+        png = decode(service._labels_to_image_bytes(labels, "png"))
+        np.testing.assert_array_equal(np.asarray(png), labels)
+        webp = decode(service._labels_to_image_bytes(labels[:, :2], "webp"))
+        np.testing.assert_array_equal(np.asarray(webp.convert("L")), labels[:, :2])
+
+
+class TestAtlasTiles:
+    """Atlas endpoint output"""
+
+    def test_tiles_hold_exact_labels(self, synthetic_specimen, regions_file, monkeypatch):
+        from app.main import app
+        from app.api import tiles
+        from app.config import settings
+
+        monkeypatch.setattr(tiles, "tile_cache", TileCache(l1_bytes=1024 * 1024, redis_url=""))
+        client = TestClient(app)
+        with ImarisHandler(settings.get_atlas_path(synthetic_specimen)) as atlas:
+            labels = atlas.get_tile(ViewType.CORONAL, 0, 0, 0, 0, 0, 32)
+        url = f"/api/specimens/{synthetic_specimen}/atlas/coronal/0/0/0/0?tile_size=32"
+
+        image = decode(client.get(url).content)
+        assert image.mode == "P"
+        np.testing.assert_array_equal(np.asarray(image), labels)
+        np.testing.assert_array_equal(np.asarray(image.convert("RGBA")),
+                                      get_atlas_palette().colors[labels])
+        # WebP shows the same colours as the PNG
+        webp = decode(client.get(url + "&format=webp").content)
+        np.testing.assert_array_equal(np.asarray(webp.convert("RGBA")),
+                                      np.asarray(image.convert("RGBA")))
+
+        info = client.get(f"/api/specimens/{synthetic_specimen}/atlas-info").json()
+        assert info["palette_labels"] is None
@@ -0,0 +1,202 @@
+"""
+Tests for the decompressed chunk cache beneath ImarisHandler.get_tile
+"""
+
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import h5py
+import numpy as np
+import pytest
+
+# Add backend to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models.specimen import ViewType
+from app.services.chunk_cache import ChunkCache, LRUByteCache, SlabCache
+from app.services.imaris_handler import ImarisHandler
+
+
+class TestLRUByteCache:
+    """Tests for the byte-budgeted LRU"""
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUByteCache(max_bytes=10)
+        cache.put("a", 1, 4)
+        cache.put("b", 2, 4)
+        assert cache.get("a") == 1      # "b" is now least recently used
+        cache.put("c", 3, 4)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        stats = cache.stats()
+        assert stats["bytes"] == 8
+        assert stats["evictions"] == 1
+        assert stats["hits"] == 3
+        assert stats["misses"] == 1
+
+    def test_oversized_value_is_not_cached(self):
+        cache = LRUByteCache(max_bytes=10)
+        cache.put("big", 0, 11)
+        assert len(cache) == 0
+
+
+class TestChunkCachedTiles:
+    """Tiles assembled from cached chunks must match plain h5py reads"""
+
+    @pytest.mark.parametrize("view,zyx", [
+        (ViewType.CORONAL, (5, 0, 0)),
+        (ViewType.CORONAL, (39, 40, 50)),      # clipped at the far corner
+        (ViewType.SAGITTAL, (3, 7, 11)),
+        (ViewType.HORIZONTAL, (9, 47, 20)),
+    ])
+    def test_tiles_match_uncached_reads(self, make_ims, view, zyx):
+        path = make_ims()
+        cache = ChunkCache(max_bytes=64 * 1024 * 1024)
+        with ImarisHandler(path) as plain, ImarisHandler(path, chunk_cache=cache) as cached:
+            for channel in (0, 1):
+                expected = plain.get_tile(view, 0, channel, *zyx, tile_size=20)
+                actual = cached.get_tile(view, 0, channel, *zyx, tile_size=20)
+                np.testing.assert_array_equal(actual, expected)
+
+    def test_neighbouring_slices_hit_cache(self, make_ims):
+        cache = ChunkCache(max_bytes=64 * 1024 * 1024)
+        with ImarisHandler(make_ims(), chunk_cache=cache) as handler:
+            handler.get_tile(ViewType.CORONAL, 0, 0, 0, 0, 0, tile_size=16)
+            misses = cache.misses
+            # z=1..7 lie in the same 8-deep chunk
+            for z in range(1, 8):
+                handler.get_tile(ViewType.CORONAL, 0, 0, z, 0, 0, tile_size=16)
+            assert cache.misses == misses
+            assert cache.hits == 7
+
+    def test_cached_chunks_are_read_only(self, make_ims):
+        cache = ChunkCache(max_bytes=64 * 1024 * 1024)
+        with ImarisHandler(make_ims(), chunk_cache=cache) as handler:
+            tile = handler.get_tile(ViewType.CORONAL, 0, 0, 0, 0, 0, tile_size=16)
+            tile_again = handler.get_tile(ViewType.CORONAL, 0, 0, 0, 0, 0, tile_size=16)
+            np.testing.assert_array_equal(tile, tile_again)
+            chunk = cache.get_chunk((handler.cache_key, 0, 0, (0, 0, 0)))
+            assert not chunk.flags.writeable
+
+    def test_large_regions_bypass_cache(self, make_ims):
+        # Budget too small for a sagittal column of chunks
+        cache = ChunkCache(max_bytes=8 * 16 * 16 * 2 * 4)
+        with ImarisHandler(make_ims(), chunk_cache=cache) as handler:
+            handler.get_tile(ViewType.SAGITTAL, 0, 0, 0, 0, 0, tile_size=40)
+            assert len(cache) == 0
+
+
+class TestSlabCachedTiles:
+    """Tiles cut from chunk-deep slabs must match plain h5py reads"""
+
+    @pytest.mark.parametrize("view,zyx,axis", [
+        (ViewType.CORONAL, (0, 0, 0), 0),
+        (ViewType.CORONAL, (30, 40, 50), 0),   # clipped at the far corner
+        (ViewType.SAGITTAL, (3, 7, 10), 2),
+        (ViewType.HORIZONTAL, (9, 40, 20), 1),
+    ])
+    @pytest.mark.parametrize("use_chunk_cache", [False, True])
+    def test_tiles_match_uncached_reads(self, make_ims, view, zyx, axis, use_chunk_cache):
+        path = make_ims()
+        slabs = SlabCache(max_bytes=64 * 1024 * 1024)
+        chunks = ChunkCache(max_bytes=64 * 1024 * 1024) if use_chunk_cache else None
+        with ImarisHandler(path) as plain, \
+                ImarisHandler(path, chunk_cache=chunks, slab_cache=slabs) as cached:
+            # Step across a slab boundary along the slice axis
+            for step in range(20):
+                origin = list(zyx)
+                origin[axis] += step
+                if origin[axis] >= plain.get_data_shape(0)[axis]:
+                    break
+                expected = plain.get_tile(view, 0, 1, *origin, tile_size=20)
+                actual = cached.get_tile(view, 0, 1, *origin, tile_size=20)
+                np.testing.assert_array_equal(actual, expected)
+            assert slabs.hits > 0
+
+    def test_slices_served_from_one_slab(self, make_ims):
+        slabs = SlabCache(max_bytes=64 * 1024 * 1024)
+        with ImarisHandler(make_ims(), slab_cache=slabs) as handler:
+            # z=0..7 lie in the same 8-deep chunk
+            for z in range(8):
+                handler.get_tile(ViewType.CORONAL, 0, 0, z, 0, 0, tile_size=16)
+            assert (slabs.misses, slabs.hits) == (1, 7)
+            slab, = (value for value, _ in slabs._items.values())
+            assert slab.shape == (8, 16, 16) and not slab.flags.writeable
+            handler.get_tile(ViewType.CORONAL, 0, 0, 8, 0, 0, tile_size=16)
+            assert slabs.misses == 2
+
+    def test_large_slabs_not_cached(self, make_ims):
+        # A 16-deep sagittal slab of 40 x 40 tiles exceeds a quarter of the budget
+        slabs = SlabCache(max_bytes=4 * 16 * 40 * 40 * 2 - 1)
+        with ImarisHandler(make_ims(), slab_cache=slabs) as handler:
+            handler.get_tile(ViewType.SAGITTAL, 0, 0, 0, 0, 0, tile_size=40)
+            assert len(slabs) == 0 and slabs.misses == 0
+
+
+class TestDirectChunkRead:
+    """The read_direct_chunk path must decode exactly what h5py returns"""
+
+    @pytest.mark.parametrize("options", [
+        {"compression": "gzip"},
+        {"compression": "gzip", "shuffle": True},
+        {"compression": None},
+    ])
+    @pytest.mark.parametrize("use_cache", [False, True])
+    def test_matches_classic_reads(self, make_ims, options, use_cache):
+        path = make_ims(**options)
+        cache = ChunkCache(max_bytes=64 * 1024 * 1024) if use_cache else None
+        with ThreadPoolExecutor(max_workers=4) as executor, \
+                ImarisHandler(path) as plain, \
+                ImarisHandler(path, chunk_cache=cache, chunk_read_mode="direct",
+                              decode_executor=executor) as direct:
+            for view, zyx in [(ViewType.CORONAL, (3, 10, 30)),
+                              (ViewType.SAGITTAL, (0, 0, 55)),
+                              (ViewType.HORIZONTAL, (30, 47, 0))]:
+                for level in (0, 1):
+                    expected = plain.get_tile(view, level, 1, *[c >> level for c in zyx],
+                                              tile_size=24)
+                    actual = direct.get_tile(view, level, 1, *[c >> level for c in zyx],
+                                             tile_size=24)
+                    np.testing.assert_array_equal(actual, expected)
+
+    def test_sparse_dataset(self, make_ims):
+        path = make_ims()
+        # Only the first chunk of channel 1 is written, the others are unallocated
+        with h5py.File(path, "a") as f:
+            group = f["DataSet/ResolutionLevel 0/TimePoint 0/Channel 1"]
+            data = group["Data"][...]
+            del group["Data"]
+            sparse = group.create_dataset("Data", shape=data.shape, dtype=data.dtype,
+                                          chunks=(8, 16, 16), compression="gzip", fillvalue=9)
+            sparse[:8, :16, :16] = data[:8, :16, :16]
+        with ImarisHandler(path) as plain, ImarisHandler(path, chunk_read_mode="direct") as direct:
+            expected = plain.get_tile(ViewType.CORONAL, 0, 1, 3, 0, 0, tile_size=24)
+            actual = direct.get_tile(ViewType.CORONAL, 0, 1, 3, 0, 0, tile_size=24)
+            np.testing.assert_array_equal(actual, expected)
+            # Tiles are flipped: the written corner is last
+            assert actual[-1, -1] == data[3, 0, 0] and actual[0, 0] == 9
+
+    def test_unsupported_filter_falls_back_to_classic(self, make_ims):
+        path = make_ims(fletcher32=True)
+        with ImarisHandler(path) as plain, ImarisHandler(path, chunk_read_mode="direct") as direct:
+            expected = plain.get_tile(ViewType.CORONAL, 0, 0, 1, 0, 0, tile_size=24)
+            actual = direct.get_tile(ViewType.CORONAL, 0, 0, 1, 0, 0, tile_size=24)
+            np.testing.assert_array_equal(actual, expected)
+            assert direct._get_direct_filters(direct.get_dataset(0, 0)) is None
+
+    def test_unknown_mode_rejected(self, make_ims):
+        with pytest.raises(ValueError):
+            ImarisHandler(make_ims(), chunk_read_mode="turbo")
+
+
+def test_stats_endpoint():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    response = TestClient(app).get("/api/stats")
+    assert response.status_code == 200
+    data = response.json()
+    assert "handler_pool" in data
+    assert "chunk_cache" in data
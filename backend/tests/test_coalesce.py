@@ -0,0 +1,227 @@
+"""
+Tests for single-flight and micro-batched tile rendering
+"""
+
+import asyncio
+import os
+import sys
+import threading
+from concurrent.futures import Future
+import httpx
+import pytest
+
+# Add backend to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.coalesce import MicroBatcher, SingleFlight
+from app.services.tile_cache import TileCache
+
+
+class TestSingleFlight:
+    """Concurrent calls with one key share one computation"""
+
+    def test_shared_result_and_error(self):
+        flights = SingleFlight()
+        calls = []
+
+        async def compute(value):
+            calls.append(value)
+            await asyncio.sleep(0.01)
+            if value == "bad":
+                raise ValueError(value)
+            return value
+
+        async def main():
+            results = await asyncio.gather(*(flights.run("a", lambda: compute("x")) for _ in range(5)))
+            assert [r[0] for r in results] == ["x"] * 5
+            assert sorted(r[1] for r in results) == [False] + [True] * 4
+            errors = await asyncio.gather(*(flights.run("b", lambda: compute("bad")) for _ in range(3)),
+                                          return_exceptions=True)
+            assert all(isinstance(e, ValueError) for e in errors)
+            # Finished keys compute again
+            assert await flights.run("a", lambda: compute("y")) == ("y", False)
+
+        asyncio.run(main())
+        assert calls == ["x", "bad", "y"]
+        assert len(flights) == 0
+        assert flights.stats()["followers"] == 6
+
+    def test_leader_cancelled(self):
+        flights = SingleFlight()
+
+        async def compute():
+            await asyncio.sleep(0.02)
+            return 1
+
+        async def main():
+            leader = asyncio.ensure_future(flights.run("k", compute))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flights.run("k", compute))
+            await asyncio.sleep(0)
+            leader.cancel()
+            assert await follower == (1, True)
+
+        asyncio.run(main())
+
+    def test_claimed_by_thread(self):
+        flights = SingleFlight()
+        future = Future()
+        assert flights.claim("k", future)
+        assert not flights.claim("k", Future())
+
+        async def compute():
+            raise AssertionError("Rendered again")
+
+        async def main():
+            waiter = asyncio.ensure_future(flights.run("k", compute))
+            await asyncio.sleep(0)
+            threading.Timer(0.01, future.set_result, ("tile",)).start()
+            assert await waiter == ("tile", True)
+
+        asyncio.run(main())
+        flights.release("k", future)
+        assert flights.stats()["external"] == 0
+
+    def test_claimed_work_failing(self):
+        flights = SingleFlight(retry_external=(RuntimeError,))
+        joins = []
+
+        async def compute():
+            return "own"
+
+        async def wait_for(future):
+            future.joined = lambda: joins.append(1)
+            assert flights.claim("k", future)
+            waiter = asyncio.ensure_future(flights.run("k", compute))
+            await asyncio.sleep(0.01)
+            return waiter
+
+        async def main():
+            # Rejected or cancelled work is done again by the caller
+            future = Future()
+            waiter = await wait_for(future)
+            future.set_exception(RuntimeError("rejected"))
+            assert await waiter == ("own", False)
+            flights.release("k", future)
+            future = Future()
+            waiter = await wait_for(future)
+            future.cancel()
+            assert await waiter == ("own", False)
+            flights.release("k", future)
+            # Other errors are the tile's own
+            future = Future()
+            waiter = await wait_for(future)
+            future.set_exception(ValueError("bad tile"))
+            with pytest.raises(ValueError):
+                await waiter
+
+        asyncio.run(main())
+        assert len(joins) == 3
+        assert flights.stats()["retried"] == 2
+
+    def test_cancelled_when_every_caller_gone(self):
+        flights = SingleFlight()
+        finished = []
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            finished.append(1)
+
+        async def main():
+            callers = [asyncio.ensure_future(flights.run("k", compute)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            for caller in callers:
+                caller.cancel()
+            await asyncio.sleep(0.1)
+
+        asyncio.run(main())
+        assert finished == []
+        assert flights.stats()["cancelled"] == 1
+        assert len(flights) == 0
+
+
+class TestMicroBatcher:
+    """Items submitted within the window are processed in one call"""
+
+    def test_batches_within_window(self):
+        batches = []
+
+        async def process(key, items):
+            batches.append((key, list(items)))
+            return [ValueError(i) if i < 0 else i * 10 for i in items]
+
+        batcher = MicroBatcher(process, window=0.01, max_items=3)
+
+        async def main():
+            results = await asyncio.gather(*(batcher.submit("s", i) for i in (1, 2, -1, 4)),
+                                           batcher.submit("t", 5), return_exceptions=True)
+            assert results[:2] == [10, 20] and isinstance(results[2], ValueError)
+            assert results[3:] == [40, 50]
+
+        asyncio.run(main())
+        # The third item filled the first batch, the fourth waited for the window
+        assert sorted(batches) == [("s", [1, 2, -1]), ("s", [4]), ("t", [5])]
+        assert batcher.stats()["items"] == 5
+
+    def test_no_window(self):
+        async def process(key, items):
+            return items
+
+        batcher = MicroBatcher(process, window=0)
+        assert asyncio.run(batcher.submit("s", 7)) == 7
+        assert batcher.stats()["batches"] == 1
+
+
+class TestCoalescedTileRequests:
+    """Concurrent identical tile requests render once"""
+
+    @pytest.fixture
+    def counted(self, synthetic_specimen, monkeypatch):
+        from app.api import tiles
+
+        monkeypatch.setattr(tiles, "tile_cache", TileCache(l1_bytes=0, redis_url=""))
+        monkeypatch.setattr(tiles, "tile_flights", SingleFlight())
+        monkeypatch.setattr(tiles, "tile_batcher", MicroBatcher(tiles._render_tiles, window=0.05))
+        calls = []
+        lock = threading.Lock()
+        render = tiles._render_batch_tile
+
+        def counting(*args, **kwargs):
+            with lock:
+                calls.append(args[1])
+            return render(*args, **kwargs)
+
+        monkeypatch.setattr(tiles, "_render_batch_tile", counting)
+        return synthetic_specimen, calls
+
+    def test_identical_requests_render_once(self, counted):
+        from app.main import app
+
+        specimen_id, calls = counted
+        url = f"/api/specimens/{specimen_id}/image/coronal/0/5/0/0?channel=1&tile_size=32"
+        other = f"/api/specimens/{specimen_id}/atlas/coronal/0/5/0/0?tile_size=32"
+
+        async def main():
+            async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+                return await asyncio.gather(*[client.get(url) for _ in range(6)], client.get(other))
+
+        responses = asyncio.run(main())
+        assert all(r.status_code == 200 for r in responses)
+        assert len({r.content for r in responses[:6]}) == 1
+        assert sorted(r.headers["X-Cache"] for r in responses[:6]) == ["MISS"] + ["SHARED"] * 5
+        assert len(calls) == 2
+        # Both renders were submitted within one window
+        from app.api import tiles
+        assert tiles.tile_batcher.stats()["batches"] == 1
+
+    def test_errors_reach_every_request(self, counted):
+        from app.main import app
+
+        specimen_id, _ = counted
+        url = f"/api/specimens/{specimen_id}/image/coronal/0/500/0/0"
+
+        async def main():
+            async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+                return await asyncio.gather(*[client.get(url) for _ in range(3)])
+
+        assert [r.status_code for r in asyncio.run(main())] == [422] * 3
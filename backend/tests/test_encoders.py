@@ -0,0 +1,142 @@
+"""
+Tests for tile encoders
+"""
+
+import io
+import os
+import sys
+import numpy as np
+import pytest
+from PIL import Image
+
+# Add backend to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fastapi.testclient import TestClient
+
+from app.services.encoders import (EncodeOptions, PillowEncoder, format_available,
+                                   get_encoder, negotiate_format)
+from app.services.tile_cache import TileCache
+from app.services.tile_service import TileService
+
+
+@pytest.fixture
+def tile():
+    yy, xx = np.mgrid[0:64, 0:64]
+    return ((xx * 3 + yy) % 256).astype(np.uint8)
+
+
+class TestPillowEncoder:
+    """Pillow encoder output and options"""
+
+    def test_png_roundtrip(self, tile):
+        data = PillowEncoder().encode(tile, 'PNG', EncodeOptions(png_compress_level=1))
+        decoded = Image.open(io.BytesIO(data))
+        assert decoded.mode == 'L'
+        np.testing.assert_array_equal(np.asarray(decoded), tile)
+
+    def test_jpeg_quality(self, tile):
+        encoder = PillowEncoder()
+        low = encoder.encode(tile, 'jpeg', EncodeOptions(jpeg_quality=30))
+        high = encoder.encode(tile, 'jpeg', EncodeOptions(jpeg_quality=95))
+        assert low[:2] == b'\xff\xd8'
+        assert len(low) < len(high)
+
+    def test_rgb(self, tile):
+        rgb = np.stack([tile, tile[::-1], tile.T], axis=-1)
+        data = PillowEncoder().encode(rgb, 'PNG')
+        np.testing.assert_array_equal(np.asarray(Image.open(io.BytesIO(data))), rgb)
+
+    def test_webp(self, tile):
+        encoder = PillowEncoder()
+        lossless = encoder.encode(tile, 'WEBP', EncodeOptions(webp_lossless=True))
+        assert lossless[8:12] == b'WEBP'
+        decoded = np.asarray(Image.open(io.BytesIO(lossless)).convert('L'))
+        np.testing.assert_array_equal(decoded, tile)
+        lossy = encoder.encode(tile, 'webp', EncodeOptions(webp_quality=50))
+        assert Image.open(io.BytesIO(lossy)).size == (64, 64)
+
+    def test_invalid_input(self, tile):
+        encoder = PillowEncoder()
+        with pytest.raises(ValueError):
+            encoder.encode(tile.astype(np.uint16), 'PNG')
+        with pytest.raises(ValueError):
+            encoder.encode(tile[None], 'PNG')
+        with pytest.raises(ValueError):
+            encoder.encode(tile, 'TIFF')
+
+    def test_get_encoder(self):
+        assert isinstance(get_encoder("pillow"), PillowEncoder)
+        with pytest.raises(ValueError):
+            get_encoder("nonexistent")
+
+
+class TestTileServiceEncoding:
+    """TileService conversion to uint8 before encoding"""
+
+    def test_uint16_scaled_by_tile_max(self):
+        array = np.array([[0, 500], [1000, 250]], dtype=np.uint16)
+        data = TileService()._array_to_image_bytes(array, format='PNG')
+        decoded = np.asarray(Image.open(io.BytesIO(data)))
+        np.testing.assert_array_equal(decoded, [[0, 127], [255, 63]])
+
+    def test_uint8_passthrough(self, tile):
+        data = TileService()._array_to_image_bytes(tile, format='PNG')
+        np.testing.assert_array_equal(np.asarray(Image.open(io.BytesIO(data))), tile)
+
+
+BROWSER_ACCEPT = "image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8"
+
+
+class TestFormatNegotiation:
+    """Choice of tile format from the format query and Accept header"""
+
+    def test_accept_header(self):
+        allowed = ("jpeg", "png", "webp", "avif")
+        assert negotiate_format(BROWSER_ACCEPT, None, "jpeg", ["webp"], allowed) == "webp"
+        assert negotiate_format("image/*,*/*;q=0.8", None, "jpeg", ["webp"], allowed) == "jpeg"
+        assert negotiate_format("image/webp;q=0", None, "jpeg", ["webp"], allowed) == "jpeg"
+        assert negotiate_format(None, None, "png", ["webp"], allowed) == "png"
+        # Not negotiated unless enabled
+        assert negotiate_format("image/webp", None, "jpeg", [], allowed) == "jpeg"
+
+    def test_avif_only_when_available(self):
+        allowed = ("jpeg", "webp", "avif")
+        expected = "avif" if format_available("avif") else "webp"
+        assert negotiate_format(BROWSER_ACCEPT, None, "jpeg", ["avif", "webp"], allowed) == expected
+
+    def test_query_overrides_accept(self):
+        allowed = ("png", "webp")
+        assert negotiate_format(BROWSER_ACCEPT, "png", "png", ["webp"], allowed) == "png"
+        assert negotiate_format(None, "WEBP", "png", ["webp"], allowed) == "webp"
+        with pytest.raises(ValueError):
+            negotiate_format(None, "jpeg", "png", ["webp"], allowed)
+        with pytest.raises(ValueError):
+            negotiate_format(None, "gif", "png", ["webp"], allowed)
+
+    def test_endpoints(self, synthetic_specimen, monkeypatch):
+        from app.main import app
+        from app.api import tiles
+
+        monkeypatch.setattr(tiles, "tile_cache", TileCache(l1_bytes=1024 * 1024, redis_url=""))
+        client = TestClient(app)
+        image_url = f"/api/specimens/{synthetic_specimen}/image/coronal/0/4/0/0?tile_size=32"
+        atlas_url = f"/api/specimens/{synthetic_specimen}/atlas/coronal/0/4/0/0?tile_size=32"
+
+        jpeg = client.get(image_url, headers={"Accept": "*/*"})
+        assert jpeg.headers["content-type"] == "image/jpeg"
+        assert jpeg.headers["Vary"] == "Accept"
+        webp = client.get(image_url, headers={"Accept": BROWSER_ACCEPT})
+        assert webp.headers["content-type"] == "image/webp"
+        assert webp.headers["X-Cache"] == "MISS"  # Format is part of the cache key
+        png = client.get(image_url + "&format=png", headers={"Accept": BROWSER_ACCEPT})
+        assert png.headers["content-type"] == "image/png"
+
+        atlas_png = client.get(atlas_url, headers={"Accept": "*/*"})
+        atlas_webp = client.get(atlas_url, headers={"Accept": BROWSER_ACCEPT})
+        assert atlas_webp.headers["content-type"] == "image/webp"
+        np.testing.assert_array_equal(
+            np.asarray(Image.open(io.BytesIO(atlas_webp.content)).convert('L')),
+            np.asarray(Image.open(io.BytesIO(atlas_png.content))))
+
+        assert client.get(atlas_url + "&format=jpeg").status_code == 400
@@ -0,0 +1,105 @@
+"""
+Tests for the pooled Imaris file handles
+"""
+
+import os
+import sys
+import time
+import pytest
+
+# Add backend to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models.specimen import ViewType
+from app.services.handler_pool import HandlerPool
+
+
+class TestHandlerPool:
+    """Tests for HandlerPool reuse, invalidation and eviction"""
+
+    def test_handler_is_reused(self, make_ims):
+        path = make_ims()
+        pool = HandlerPool()
+
+        with pool.handle(path) as first:
+            tile = first.get_tile(ViewType.CORONAL, 0, 0, 3, 0, 0, tile_size=16)
+            assert tile.shape == (16, 16)
+        with pool.handle(path) as second:
+            assert second is first
+            assert second.is_open
+
+        stats = pool.stats()
+        assert stats["opened"] == 1
+        assert stats["reused"] == 1
+        assert stats["in_use"] == 0
+
+    def test_dataset_objects_are_cached(self, make_ims):
+        pool = HandlerPool()
+        with pool.handle(make_ims()) as handler:
+            assert handler.get_dataset(0, 1) is handler.get_dataset(0, 1)
+            with pytest.raises(KeyError):
+                handler.get_dataset(9, 0)
+
+    def test_modified_file_is_reopened(self, make_ims):
+        path = make_ims()
+        pool = HandlerPool()
+        with pool.handle(path) as first:
+            pass
+
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        with pool.handle(path) as second:
+            assert second is not first
+        assert not first.is_open
+
+    def test_invalidate_defers_close_while_in_use(self, make_ims):
+        path = make_ims()
+        pool = HandlerPool()
+        with pool.handle(path) as handler:
+            pool.invalidate(path)
+            assert handler.is_open
+        assert not handler.is_open
+        assert pool.stats()["open_files"] == 0
+
+    def test_idle_and_excess_handlers_are_evicted(self, make_ims):
+        a, b = make_ims("a.ims"), make_ims("b.ims")
+        pool = HandlerPool(max_open=1)
+        with pool.handle(a) as handler_a:
+            pass
+        with pool.handle(b):
+            pass
+        assert not handler_a.is_open
+        assert pool.stats()["open_files"] == 1
+
+        pool = HandlerPool(idle_timeout=0.0)
+        with pool.handle(a) as handler_a:
+            pass
+        time.sleep(0.01)
+        with pool.handle(b):
+            pass
+        assert not handler_a.is_open
+
+    def test_missing_file(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            with HandlerPool().handle(tmp_path / "missing.ims"):
+                pass
+
+
+class TestTileServiceUsesPool:
+    """TileService should not reopen the file for every tile"""
+
+    def test_tiles_share_one_open_file(self, synthetic_specimen):
+        from app.services.tile_service import TileService
+
+        service = TileService()
+        service.handler_pool = HandlerPool()
+        for z in range(3):
+            data = service.extract_image_tile(synthetic_specimen, ViewType.CORONAL,
+                                              0, 0, z, 0, 0, tile_size=16)
+            assert data[:2] == b'\xff\xd8'
+        service.calculate_tile_grid(synthetic_specimen, ViewType.SAGITTAL, 0)
+
+        stats = service.handler_pool.stats()
+        assert stats["opened"] == 1
+        assert stats["reused"] == 3
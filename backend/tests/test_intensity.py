@@ -0,0 +1,228 @@
+"""
+Tests for intensity windows and lookup tables
+"""
+
+import io
+import os
+import sys
+import numpy as np
+import pytest
+from PIL import Image
+from fastapi.testclient import TestClient
+
+# Add backend to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models.specimen import ViewType
+from app.services.imaris_handler import ImarisHandler
+from app.services import intensity
+from app.services.intensity import (IntensityWindow, RenderParams, apply_window,
+                                    blend_channels, compute_window_range, get_lut,
+                                    get_window_range, parse_color, sample_window,
+                                    window_from_histogram)
+from app.services.tile_cache import TileCache
+
+
+class TestIntensityWindow:
+    """Window mapping and LUTs"""
+
+    def test_lut_matches_direct_mapping(self):
+        values = np.random.default_rng(0).integers(0, 65536, (64, 64)).astype(np.uint16)
+        for window in (IntensityWindow(100, 3000),
+                       IntensityWindow(100, 3000, transfer="sqrt"),
+                       IntensityWindow(0, 60000, gamma=0.5)):
+            np.testing.assert_array_equal(apply_window(values, window), window.map(values))
+        # Larger tiles are gathered in blocks of rows, flipped views included
+        values = np.random.default_rng(1).integers(0, 65536, (300, 200)).astype(np.uint16)[::-1, ::-1]
+        window = IntensityWindow(100, 3000)
+        np.testing.assert_array_equal(apply_window(values, window), window.map(values))
+
+    def test_mapping(self):
+        window = IntensityWindow(100, 355)
+        values = np.array([0, 100, 227.5, 355, 60000])
+        np.testing.assert_array_equal(window.map(values), [0, 0, 128, 255, 255])
+        assert IntensityWindow(0, 1, transfer="sqrt").map(np.array([0.25]))[0] == 128
+
+    def test_lut_cached(self):
+        window = IntensityWindow(0, 1000)
+        assert get_lut(window, 65536) is get_lut(IntensityWindow(0, 1000), 65536)
+        assert not get_lut(window, 65536).flags.writeable
+
+    def test_non_lut_dtype(self):
+        window = IntensityWindow(0, 1 << 20)
+        values = np.array([[0, 1 << 19, 1 << 21]], dtype=np.uint32)
+        np.testing.assert_array_equal(apply_window(values, window), [[0, 128, 255]])
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            IntensityWindow(0, 100, transfer="cubic")
+        with pytest.raises(ValueError):
+            IntensityWindow(0, 100, gamma=0)
+        with pytest.raises(ValueError):
+            IntensityWindow(100, 100)
+
+
+class TestWindowRange:
+    """Window bounds from histograms and sampled quantiles"""
+
+    def test_from_uniform_histogram(self):
+        hist = np.zeros(100)
+        hist[10:60] = 5  # Uniform over [1000, 6000)
+        low, high = window_from_histogram(hist, (0, 10000), 0.1, 0.9)
+        assert low == pytest.approx(1500)
+        assert high == pytest.approx(5500)
+
+    def test_empty_histogram(self):
+        with pytest.raises(ValueError):
+            window_from_histogram(np.zeros(16), (0, 16), 0.01, 0.99)
+
+    def test_histogram_and_sample_agree(self, make_ims):
+        path = make_ims()
+        with ImarisHandler(path) as handler:
+            assert handler.get_histogram_range(0, 1) == (0.0, 4096.0)
+            from_hist = compute_window_range(handler, 1, 0.01, 0.99)
+            from_sample = sample_window(handler, 1, 0.01, 0.99, max_voxels=2000)
+            full = handler.get_dataset(0, 1)[...]
+            coarsest = handler.get_dataset(1, 1)[...]
+        np.testing.assert_allclose(from_hist, np.quantile(full, [0.01, 0.99]), rtol=0.02)
+        # The sampled pass reads a strided subset of the coarsest level
+        np.testing.assert_allclose(from_sample, np.quantile(coarsest, [0.01, 0.99]), rtol=0.05)
+
+    def test_ranges_cached_in_lru(self, make_ims, monkeypatch):
+        monkeypatch.setattr(intensity, "MAX_WINDOW_RANGES", 2)
+        monkeypatch.setattr(intensity, "_window_ranges", type(intensity._window_ranges)())
+        with ImarisHandler(make_ims()) as handler:
+            first = get_window_range(handler, 0, 0.01, 0.99)
+            assert get_window_range(handler, 0, 0.01, 0.99) == first
+            for channel, low in [(1, 0.01), (1, 0.02), (0, 0.02)]:
+                get_window_range(handler, channel, low, 0.99)
+        assert len(intensity._window_ranges) == 2
+
+
+class TestGlobalWindowTiles:
+    """Image tiles share one window per channel"""
+
+    def test_tiles_use_channel_window(self, synthetic_specimen, monkeypatch):
+        from app.main import app
+        from app.api import tiles
+        from app.config import settings
+
+        monkeypatch.setattr(tiles, "tile_cache", TileCache(l1_bytes=1024 * 1024, redis_url=""))
+        client = TestClient(app)
+        image_path = settings.get_image_path(synthetic_specimen)
+        with ImarisHandler(image_path) as handler:
+            window = tiles.tile_service.get_intensity_window(handler, 1)
+            for y, x in ((0, 0), (0, 32), (16, 16)):
+                url = (f"/api/specimens/{synthetic_specimen}/image/coronal/0/4/{y}/{x}"
+                       f"?channel=1&tile_size=32&format=png")
+                response = client.get(url)
+                assert response.status_code == 200
+                raw = handler.get_tile(ViewType.CORONAL, 0, 1, 4, y, x, 32)[::-1, :]
+                np.testing.assert_array_equal(
+                    np.asarray(Image.open(io.BytesIO(response.content))),
+                    apply_window(raw, window))
+
+
+class TestRenderParams:
+    """Client-controlled min/max/gamma/transfer on image tiles"""
+
+    def test_validation(self):
+        assert RenderParams().is_default()
+        assert not RenderParams(gamma=0.8).is_default()
+        with pytest.raises(ValueError):
+            RenderParams(low=500, high=100)
+        with pytest.raises(ValueError):
+            RenderParams(transfer="cubic")
+
+    def test_tile_parameters(self, synthetic_specimen, monkeypatch):
+        from app.main import app
+        from app.api import tiles
+        from app.config import settings
+
+        cache = TileCache(l1_bytes=1024 * 1024, redis_url="")
+        monkeypatch.setattr(tiles, "tile_cache", cache)
+        client = TestClient(app)
+        url = (f"/api/specimens/{synthetic_specimen}/image/coronal/0/4/0/0"
+               f"?channel=1&tile_size=32&format=png")
+        image_path = settings.get_image_path(synthetic_specimen)
+        with ImarisHandler(image_path) as handler:
+            raw = handler.get_tile(ViewType.CORONAL, 0, 1, 4, 0, 0, 32)[::-1, :]
+            default_window = tiles.tile_service.get_intensity_window(handler, 1)
+
+        cases = [
+            ("&min=1000&max=1100", IntensityWindow(1000, 1100)),
+            ("&min=1000&max=1100&gamma=0.5&transfer=sqrt",
+             IntensityWindow(1000, 1100, transfer="sqrt", gamma=0.5)),
+            ("&min=1010", IntensityWindow(1010, default_window.high)),
+            ("&transfer=log", IntensityWindow(default_window.low, default_window.high,
+                                              transfer="log")),
+        ]
+        for query, window in cases:
+            response = client.get(url + query)
+            assert response.status_code == 200, query
+            assert response.headers["X-Cache"] == "MISS", query  # Distinct cache entries
+            np.testing.assert_array_equal(
+                np.asarray(Image.open(io.BytesIO(response.content))),
+                apply_window(raw, window))
+        assert client.get(url + "&min=1000&max=1100").headers["X-Cache"] == "HIT"
+
+        assert client.get(url + "&min=1100&max=1000").status_code == 400
+        assert client.get(url + "&transfer=cubic").status_code == 400
+        assert client.get(url + "&gamma=0").status_code == 422
+
+    def test_image_info_windows(self, synthetic_specimen):
+        from app.main import app
+
+        response = TestClient(app).get(f"/api/specimens/{synthetic_specimen}/image-info")
+        assert response.status_code == 200
+        windows = response.json()["intensity_windows"]
+        assert set(windows) == {"0", "1"}
+        low, high = windows["1"]
+        assert 1000 <= low < high
+
+
+class TestCompositeTiles:
+    """Multi-channel tiles blended to RGB"""
+
+    def test_blend(self):
+        a = np.array([[0, 255]], dtype=np.uint8)
+        b = np.array([[255, 255]], dtype=np.uint8)
+        rgb = blend_channels([a, b], [parse_color("ff0000"), parse_color("#0080ff")])
+        np.testing.assert_array_equal(rgb, [[[0, 128, 255], [255, 128, 255]]])
+        saturated = blend_channels([b, b], [(200, 0, 0), (200, 0, 0)])
+        assert saturated[0, 0, 0] == 255
+        with pytest.raises(ValueError):
+            parse_color("red")
+
+    def test_composite_endpoint(self, synthetic_specimen, monkeypatch):
+        from app.main import app
+        from app.api import tiles
+        from app.config import settings
+
+        monkeypatch.setattr(tiles, "tile_cache", TileCache(l1_bytes=1024 * 1024, redis_url=""))
+        client = TestClient(app)
+        base = f"/api/specimens/{synthetic_specimen}/composite/coronal/0/4/0/0?tile_size=32"
+        image_path = settings.get_image_path(synthetic_specimen)
+        with ImarisHandler(image_path) as handler:
+            grays = [apply_window(handler.get_tile(ViewType.CORONAL, 0, c, 4, 0, 0, 32)[::-1, :],
+                                  window)
+                     for c, window in ((0, IntensityWindow(0, 300)),
+                                       (1, tiles.tile_service.get_intensity_window(handler, 1)))]
+        expected = blend_channels(grays, [(255, 0, 0), (0, 255, 0)])
+
+        response = client.get(base + "&channels=0,1&colors=ff0000,00ff00&min=0,&max=300,&format=png")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/png"
+        decoded = Image.open(io.BytesIO(response.content))
+        assert decoded.mode == "RGB"
+        np.testing.assert_array_equal(np.asarray(decoded), expected)
+
+        # Defaults: all channels, configured colours, JPEG
+        response = client.get(base)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/jpeg"
+        assert response.headers["X-Tile-Info"].endswith("/ch0,1")
+
+        assert client.get(base + "&channels=0,1&colors=ff0000").status_code == 400
+        assert client.get(base + "&channels=0,x").status_code == 400
+        assert client.get(base + "&channels=0,5").status_code == 422
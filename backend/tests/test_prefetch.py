@@ -0,0 +1,184 @@
+"""
+Tests for background prefetching of neighbouring tiles
+"""
+
+import os
+import sys
+from concurrent.futures import Future
+import pytest
+from fastapi.testclient import TestClient
+
+# Add backend to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models.specimen import ViewType
+from app.services.intensity import RenderParams
+from app.services.coalesce import SingleFlight
+from app.services.prefetch import PrefetchJob, Prefetcher, _Flight
+from app.services.tile_cache import TileCache
+
+
+class _FakeService:
+    default_tile_size = 32
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    from app.config import settings
+    monkeypatch.setattr(settings, "prefetch_enabled", True)
+
+
+def _schedule(prefetcher, view, z, y, x, stream="viewer", level=1):
+    prefetcher.schedule(_FakeService(), None, stream, "s", view, level, 0, z, y, x,
+                        None, "jpeg", RenderParams())
+
+
+def _queued(prefetcher):
+    return [(job.level, job.z, job.y, job.x) for job, *_ in prefetcher._queue]
+
+
+class TestScheduling:
+    """Queue contents, without worker threads"""
+
+    def test_neighbours_in_direction_of_travel(self, enabled):
+        prefetcher = Prefetcher(max_queue=64, slices=2, threads=0)
+        _schedule(prefetcher, ViewType.CORONAL, 10, 32, 64)
+        assert _queued(prefetcher) == [
+            (1, 11, 32, 64), (1, 9, 32, 64), (1, 12, 32, 64), (1, 8, 32, 64),
+            (1, 10, 32, 96), (1, 10, 32, 32), (1, 10, 64, 64), (1, 10, 0, 64)]
+
+        # Scrubbing backwards puts lower slices first; slice 9 is already queued
+        _schedule(prefetcher, ViewType.CORONAL, 9, 32, 64)
+        queued = _queued(prefetcher)
+        assert queued[-4:] == [(1, 9, 32, 96), (1, 9, 32, 32), (1, 9, 64, 64), (1, 9, 0, 64)]
+        assert (1, 7, 32, 64) in queued
+
+        # Sagittal slices step along x, tiles along y and z; negative origins are skipped
+        prefetcher = Prefetcher(max_queue=64, slices=1, threads=0)
+        _schedule(prefetcher, ViewType.SAGITTAL, 0, 0, 5)
+        assert _queued(prefetcher) == [(1, 0, 0, 6), (1, 0, 0, 4), (1, 32, 0, 5), (1, 0, 32, 5)]
+
+    def test_cancel_when_moving_away(self, enabled):
+        prefetcher = Prefetcher(max_queue=64, slices=2, threads=0)
+        _schedule(prefetcher, ViewType.CORONAL, 10, 0, 0)
+        _schedule(prefetcher, ViewType.CORONAL, 10, 0, 0, stream="other")
+        n = len(prefetcher._queue)
+        _schedule(prefetcher, ViewType.CORONAL, 30, 0, 0)
+        # Only the moved viewer's jobs are dropped
+        assert prefetcher.cancelled == n // 2
+        assert all(job.z >= 28 for job, *_ in prefetcher._queue if job.stream == "viewer")
+        _schedule(prefetcher, ViewType.CORONAL, 30, 0, 0, level=2)
+        assert all(job.level == 2 for job, *_ in prefetcher._queue if job.stream == "viewer")
+
+    def test_bounded_queue(self, enabled):
+        prefetcher = Prefetcher(max_queue=3, slices=2, threads=0)
+        _schedule(prefetcher, ViewType.CORONAL, 10, 32, 32)
+        # Only the nearest neighbours fit
+        assert _queued(prefetcher) == [(1, 11, 32, 32), (1, 9, 32, 32), (1, 12, 32, 32)]
+        # Jobs of earlier requests make room for newer ones
+        _schedule(prefetcher, ViewType.CORONAL, 10, 32, 32, stream="other")
+        assert [job.stream for job, *_ in prefetcher._queue] == ["other"] * 3
+        assert prefetcher.dropped == 3
+
+    def test_disabled(self):
+        prefetcher = Prefetcher(threads=0)
+        _schedule(prefetcher, ViewType.CORONAL, 10, 0, 0)
+        assert prefetcher.scheduled == 0
+
+
+class TestViewerStreams:
+    """Viewers behind one proxy get their own streams; renders are shared"""
+
+    def test_viewer_ids(self, monkeypatch):
+        from starlette.requests import Request
+        from app.api.tiles import _viewer_id
+        from app.config import settings
+
+        def request(headers, peer="10.0.0.2"):
+            return Request({"type": "http", "client": (peer, 1234),
+                            "headers": [(k.encode(), v.encode()) for k, v in headers.items()]})
+
+        assert _viewer_id(request({})) == "10.0.0.2"
+        # X-Forwarded-For counts only from trusted proxies
+        assert _viewer_id(request({"x-forwarded-for": "1.2.3.4"})) == "10.0.0.2"
+        monkeypatch.setattr(settings, "forwarded_allow_ips", ["10.0.0.2"])
+        assert _viewer_id(request({"x-forwarded-for": "1.2.3.4, 10.0.0.2"})) == "1.2.3.4"
+        assert _viewer_id(request({"x-viewer-id": "tab-7", "x-forwarded-for": "1.2.3.4"})) == "viewer:tab-7"
+
+    def test_skips_tiles_in_flight(self):
+        class Service(_FakeService):
+            def image_tile_key(self, *args):
+                return "key"
+
+        flights = SingleFlight()
+        assert flights.claim("key", Future())
+        prefetcher = Prefetcher(threads=0)
+        job = PrefetchJob("viewer", "s", ViewType.CORONAL, 1, 0, 0, 0, 0, None, "jpeg",
+                          RenderParams(), None, 0.4)
+        prefetcher._prefetch(job, Service(), TileCache(l1_bytes=1024, redis_url=""), flights)
+        assert prefetcher.in_flight == 1
+
+    def test_joined_renders_are_hits(self):
+        class Service(_FakeService):
+            def extract_image_tile(self, **kwargs):
+                return b"tile"
+
+        prefetcher = Prefetcher(threads=0)
+        cache = TileCache(l1_bytes=1024, redis_url="")
+        job = PrefetchJob("viewer", "s", ViewType.CORONAL, 1, 0, 0, 0, 0, None, "jpeg",
+                          RenderParams(), None, 0.4)
+        # Joined before the render, then after it
+        before, after = _Flight(prefetcher, "a"), _Flight(prefetcher, "b")
+        before.joined()
+        prefetcher._render(job, "a", Service(), cache, before)
+        prefetcher._render(job, "b", Service(), cache, after)
+        after.joined()
+        after.joined()
+        prefetcher.record_hit("b")
+        assert before.result() == after.result() == b"tile"
+        assert (prefetcher.completed, prefetcher.hits) == (2, 2)
+
+
+class TestPrefetchServing:
+    """Prefetched tiles are served from the tile cache"""
+
+    @pytest.fixture
+    def client(self, synthetic_specimen, enabled, monkeypatch):
+        from app.config import settings
+        from app.api import tiles, stats
+        from app.main import app
+
+        monkeypatch.setattr(settings, "default_tile_size", 32)
+        monkeypatch.setattr(tiles.tile_service, "default_tile_size", 32)
+        monkeypatch.setattr(tiles, "tile_cache", TileCache(l1_bytes=1024 * 1024, redis_url=""))
+        prefetcher = Prefetcher(max_queue=64, slices=2, threads=1)
+        monkeypatch.setattr(tiles, "prefetcher", prefetcher)
+        monkeypatch.setattr(stats, "prefetcher", prefetcher)
+        yield TestClient(app), synthetic_specimen, prefetcher
+        prefetcher.close()
+
+    def test_next_slice_is_a_hit(self, client):
+        client, specimen_id, prefetcher = client
+        base = f"/api/specimens/{specimen_id}/image/coronal/1"
+        assert client.get(f"{base}/8/0/0").headers["X-Cache"] == "MISS"
+        assert prefetcher.wait_idle()
+        assert prefetcher.completed > 0
+        response = client.get(f"{base}/9/0/0")
+        assert response.headers["X-Cache"] == "HIT"
+
+        # Same bytes as rendering without prefetching
+        from app.api import tiles
+        tiles.tile_cache.l1.clear()
+        assert client.get(f"{base}/9/0/0").content == response.content
+
+        stats = client.get("/api/stats").json()["prefetch"]
+        assert stats["hits"] == 1
+        assert stats["hit_rate"] == 1 / stats["completed"]
+
+    def test_out_of_bounds_neighbours(self, client):
+        client, specimen_id, prefetcher = client
+        # Last slice and tile of level 1 (20, 24, 28)
+        client.get(f"/api/specimens/{specimen_id}/image/coronal/1/19/0/0")
+        assert prefetcher.wait_idle()
+        assert prefetcher.out_of_bounds >= 2
+        assert prefetcher.errors == 0
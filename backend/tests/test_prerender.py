@@ -0,0 +1,92 @@
+"""
+Tests for pre-rendered static tiles
+"""
+
+import os
+import sys
+import pytest
+from fastapi.testclient import TestClient
+
+# Add backend to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models.specimen import ViewType
+from app.services.prerender import prerender_specimen, tile_origins, tile_relpath
+from app.services.tile_cache import TileCache
+
+SHAPE = (40, 48, 56)  # Synthetic specimen, (z, y, x)
+
+
+class TestTileOrigins:
+    """Tile grids of each view's slices"""
+
+    def test_origins(self):
+        coronal = tile_origins(SHAPE, ViewType.CORONAL, 3, 32)
+        assert coronal == [(3, 0, 0), (3, 0, 32), (3, 32, 0), (3, 32, 32)]
+        sagittal = tile_origins(SHAPE, ViewType.SAGITTAL, 5, 32)
+        assert {o[2] for o in sagittal} == {5} and len(sagittal) == 4
+        horizontal = tile_origins(SHAPE, ViewType.HORIZONTAL, 7, 32)
+        assert horizontal == [(0, 7, 0), (0, 7, 32), (32, 7, 0), (32, 7, 32)]
+
+
+class TestPrerender:
+    """Pre-rendered files match the backend's responses for the same URLs"""
+
+    @pytest.fixture
+    def prerendered(self, synthetic_specimen, regions_file, tmp_path, monkeypatch):
+        from app.config import settings
+        from app.api import tiles
+
+        monkeypatch.setattr(settings, "default_tile_size", 32)
+        monkeypatch.setattr(tiles.tile_service, "default_tile_size", 32)
+        monkeypatch.setattr(tiles, "tile_cache", TileCache(l1_bytes=1024 * 1024, redis_url=""))
+        root = tmp_path / "tiles"
+        return synthetic_specimen, root
+
+    def test_render_and_skip(self, prerendered):
+        from app.main import app
+
+        specimen_id, root = prerendered
+        messages = []
+        stats = prerender_specimen(specimen_id, root, levels=[1], slice_stride=4,
+                                   image_formats=("jpeg", "webp"), progress=messages.append)
+        # Level 1 is (20, 24, 28): 5 coronal, 7 sagittal and 6 horizontal slices
+        # of one tile each, for 2 image channels x 2 formats and 2 atlas formats
+        assert stats.rendered == 18 * (2 * 2 + 2)
+        assert stats.skipped == 0
+        assert (root / specimen_id / "manifest.json").exists()
+
+        client = TestClient(app)
+        for view, z, y, x in ((ViewType.CORONAL, 8, 0, 0), (ViewType.SAGITTAL, 0, 0, 12),
+                              (ViewType.HORIZONTAL, 0, 20, 0)):
+            url = f"/api/specimens/{specimen_id}/image/{view.value}/1/{z}/{y}/{x}?channel=1"
+            for format, accept in (("jpeg", "image/jpeg"), ("webp", "image/webp,*/*")):
+                path = root / tile_relpath(specimen_id, "image", view, 1, z, y, x, 1, format)
+                assert path.read_bytes() == client.get(url, headers={"Accept": accept}).content
+            path = root / tile_relpath(specimen_id, "atlas", view, 1, z, y, x, 0, "png")
+            atlas_url = f"/api/specimens/{specimen_id}/atlas/{view.value}/1/{z}/{y}/{x}"
+            assert path.read_bytes() == client.get(atlas_url).content
+
+        again = prerender_specimen(specimen_id, root, levels=[1], slice_stride=4,
+                                   image_formats=("jpeg", "webp"), workers=2)
+        assert again.rendered == 0
+        assert again.skipped == stats.rendered
+
+    def test_changed_source_discards_tiles(self, prerendered):
+        from app.config import settings
+
+        specimen_id, root = prerendered
+        prerender_specimen(specimen_id, root, kinds=("image",), levels=[1],
+                           views=[ViewType.CORONAL], slice_stride=10, image_formats=("png",))
+        stale = root / specimen_id / "image" / "coronal" / "1" / "10" / "0" / "0_c0.png"
+        assert stale.exists()
+        image_path = settings.get_image_path(specimen_id)
+        os.utime(image_path, ns=(image_path.stat().st_atime_ns, image_path.stat().st_mtime_ns + 10**9))
+
+        messages = []
+        stats = prerender_specimen(specimen_id, root, kinds=("image",), levels=[1],
+                                   views=[ViewType.CORONAL], slice_stride=5,
+                                   image_formats=("png",), progress=messages.append)
+        assert any("discarding" in m for m in messages)
+        assert stats.skipped == 0 and stats.rendered == 4 * 2
+        assert (root / specimen_id / "image" / "coronal" / "1" / "5" / "0" / "0_c0.png").exists()
@@ -0,0 +1,85 @@
+"""
+Tests for region lookup indexes and cached region responses
+"""
+
+import os
+import sys
+from fastapi.testclient import TestClient
+
+# Add backend to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models.region import RegionHierarchy
+from app.services.response_cache import response_cache
+
+from tests.conftest import synthetic_regions
+
+
+def make_hierarchy(**kwargs) -> RegionHierarchy:
+    return RegionHierarchy(**synthetic_regions(**kwargs))
+
+
+class TestRegionIndexes:
+    """Indexes agree with scans over the region list"""
+
+    def test_value_lookup(self):
+        hierarchy = make_hierarchy(value_step=10)
+        for region in hierarchy.regions:
+            assert hierarchy.get_region_by_value(region.value) is region
+        assert hierarchy.get_region_by_value(15) is None
+
+    def test_levels_and_statistics(self):
+        hierarchy = make_hierarchy()
+        assert [r.id for r in hierarchy.get_regions_by_level(2)] == [1, 5, 9]
+        assert len(hierarchy.get_regions_by_level(4)) == 12
+        assert hierarchy.get_regions_by_level(5) == []
+        statistics = hierarchy.get_statistics()
+        assert statistics.total_regions == 12
+        assert statistics.regions_by_level == {"level_1": 1, "level_2": 3,
+                                               "level_3": 12, "level_4": 12}
+
+    def test_children(self):
+        hierarchy = make_hierarchy()
+        assert [r.id for r in hierarchy.get_children(4)] == [5, 6, 7, 8]
+        assert hierarchy.get_children(1) == []
+
+    def test_search(self):
+        hierarchy = make_hierarchy()
+        assert [r.id for r in hierarchy.search_regions("ION 1")] == [1, 10, 11, 12]
+
+
+class TestRegionEndpoints:
+    """Region endpoints served from the indexes"""
+
+    def test_static_bodies_are_reused(self, synthetic_specimen, regions_file):
+        from app.main import app
+
+        client = TestClient(app)
+        base = f"/api/specimens/{synthetic_specimen}"
+        response = client.get(f"{base}/regions?max_results=5")
+        assert response.status_code == 200
+        data = response.json()
+        assert [r["id"] for r in data["regions"]] == [1, 2, 3, 4, 5]
+        assert data["total_count"] == data["filtered_count"] == 12
+        assert data["statistics"]["regions_by_level"]["level_2"] == 3
+        hits = response_cache.hits
+        assert client.get(f"{base}/regions?max_results=5").content == response.content
+        assert response_cache.hits == hits + 1
+
+        hierarchy = client.get(f"{base}/regions-hierarchy").json()
+        assert hierarchy["statistics"] == {"total_regions": 12, "regions_by_level": {
+            "level_1": 1, "level_2": 3, "level_3": 12, "level_4": 12}}
+        hits = response_cache.hits
+        assert client.get(f"{base}/regions-hierarchy").json() == hierarchy
+        assert response_cache.hits == hits + 1
+
+    def test_filters(self, synthetic_specimen, regions_file):
+        from app.main import app
+
+        client = TestClient(app)
+        url = f"/api/specimens/{synthetic_specimen}/regions"
+        data = client.get(f"{url}?parent_id=8").json()
+        assert [r["id"] for r in data["regions"]] == [9, 10, 11, 12]
+        assert data["filtered_count"] == 4
+        data = client.get(f"{url}?level=2&search=region 1").json()
+        assert [r["id"] for r in data["regions"]] == [1]
@@ -0,0 +1,92 @@
+"""
+Tests for atlas region overlays on image tiles
+"""
+
+import io
+import os
+import sys
+import numpy as np
+import pytest
+from PIL import Image
+from fastapi.testclient import TestClient
+
+# Add backend to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models.specimen import ViewType
+from app.services.imaris_handler import ImarisHandler
+from app.services.region_service import (FALLBACK_REGION_COLORS, OVERLAY_BOUNDARY,
+                                         OVERLAY_FILL, get_label_colors,
+                                         label_boundaries, overlay_labels)
+from app.services.tile_cache import TileCache
+
+
+class TestLabelColors:
+    """Label colour table and overlay blending"""
+
+    def test_colors_from_regions(self, regions_file):
+        colors = get_label_colors()
+        assert colors.shape == (13, 4)
+        assert tuple(colors[0]) == (0, 0, 0, 0)  # Background is transparent
+        assert tuple(colors[3]) == (0x12, 0x34, 0x56, 255)  # Own colour
+        fallback = FALLBACK_REGION_COLORS[1]
+        assert tuple(colors[1, :3]) == tuple(int(fallback[i:i + 2], 16) for i in (0, 2, 4))
+        assert get_label_colors() is colors
+
+    def test_boundaries(self):
+        labels = np.array([[1, 1, 2, 2],
+                           [1, 1, 2, 2],
+                           [1, 1, 1, 1]])
+        np.testing.assert_array_equal(label_boundaries(labels), [[0, 1, 1, 0],
+                                                                 [0, 1, 1, 1],
+                                                                 [0, 0, 1, 1]])
+
+    def test_overlay(self):
+        colors = np.array([[0, 0, 0, 0], [255, 0, 0, 255]], dtype=np.uint8)
+        gray = np.full((2, 3), 100, dtype=np.uint8)
+        labels = np.array([[0, 1, 7], [1, 1, 1]])
+        fill = overlay_labels(gray, labels, OVERLAY_FILL, 0.5, colors)
+        assert fill.shape == (2, 3, 3)
+        assert tuple(fill[0, 0]) == (100, 100, 100)  # Background untouched
+        assert tuple(fill[0, 2]) == (100, 100, 100)  # Unknown label
+        assert tuple(fill[1, 0]) == (178, 50, 50)
+        edges = overlay_labels(gray, labels, OVERLAY_BOUNDARY, 1.0, colors)
+        assert tuple(edges[1, 2]) == (255, 0, 0)    # Next to the unknown label
+        assert tuple(edges[1, 0]) == (255, 0, 0)    # Next to background
+        # Labels are cropped or padded to the image tile
+        assert overlay_labels(np.zeros((3, 4), np.uint8), labels, OVERLAY_FILL,
+                              1.0, colors).shape == (3, 4, 3)
+        with pytest.raises(ValueError):
+            overlay_labels(gray, labels, "outline", 0.5, colors)
+
+
+class TestOverlayTiles:
+    """Image tiles with the atlas blended server side"""
+
+    def test_overlay_endpoint(self, synthetic_specimen, regions_file, monkeypatch):
+        from app.main import app
+        from app.api import tiles
+        from app.config import settings
+
+        monkeypatch.setattr(tiles, "tile_cache", TileCache(l1_bytes=1024 * 1024, redis_url=""))
+        client = TestClient(app)
+        url = (f"/api/specimens/{synthetic_specimen}/image/coronal/0/0/0/0"
+               f"?tile_size=32&format=png&min=0&max=300")
+        with ImarisHandler(settings.get_image_path(synthetic_specimen)) as image:
+            raw = image.get_tile(ViewType.CORONAL, 0, 0, 0, 0, 0, 32)[::-1, :]
+        with ImarisHandler(settings.get_atlas_path(synthetic_specimen)) as atlas:
+            labels = atlas.get_tile(ViewType.CORONAL, 0, 0, 0, 0, 0, 32)
+        plain = np.asarray(Image.open(io.BytesIO(client.get(url).content)))
+
+        for mode in (OVERLAY_FILL, OVERLAY_BOUNDARY):
+            response = client.get(url + f"&overlay={mode}&overlay_alpha=0.6")
+            assert response.status_code == 200
+            assert response.headers["X-Cache"] == "MISS"
+            decoded = Image.open(io.BytesIO(response.content))
+            assert decoded.mode == "RGB"
+            np.testing.assert_array_equal(np.asarray(decoded),
+                                          overlay_labels(plain, labels, mode, 0.6))
+        assert np.asarray(decoded).shape == raw.shape + (3,)
+
+        assert client.get(url + "&overlay=outline").status_code == 400
+        assert client.get(url + "&overlay=fill&overlay_alpha=2").status_code == 422
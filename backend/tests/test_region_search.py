@@ -0,0 +1,105 @@
+"""
+Tests for the ranked region search index
+"""
+
+import os
+import sys
+from fastapi.testclient import TestClient
+
+# Add backend to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models.region import Region
+from app.services.region_search import RegionSearchIndex, normalize
+
+
+def make_region(i, name, abbreviation, name_zh=None):
+    return Region(id=i, name=name, abbreviation=abbreviation, level1="", level2="",
+                  level3="", level4="", value=i, name_zh=name_zh)
+
+
+REGIONS = [
+    make_region(1, "primary visual cortex", "V1", "初级视觉皮层"),
+    make_region(2, "secondary visual cortex", "V2", "次级视觉皮层"),
+    make_region(3, "visual thalamus", "LGN"),
+    make_region(4, "cerebellum", "Cb", "小脑"),
+    make_region(5, "Nucleus accumbens", "Acb"),
+    make_region(6, "Ventral tegmental area", "VTA"),
+    make_region(7, "caudate nucleus", "Cd", "尾状核"),
+]
+
+
+def ids(regions):
+    return [r.id for r in regions]
+
+
+class TestRegionSearchIndex:
+    """Ranking and matching rules"""
+
+    index = RegionSearchIndex(REGIONS)
+
+    def test_normalize(self):
+        assert normalize("  Núcleo_Accumbens-(shell) ") == "nucleo accumbens shell"
+        assert normalize("ＶＩ") == "vi"  # Full-width forms
+        assert normalize(None) == ""
+
+    def test_exact_abbreviation_first(self):
+        assert ids(self.index.search("v1"))[0] == 1
+        assert ids(self.index.search("VTA"))[0] == 6
+
+    def test_prefix_before_word_prefix_before_substring(self):
+        # "visual thalamus" starts with the query; the cortices contain it as a word
+        assert ids(self.index.search("visual")) == [3, 1, 2]
+        assert ids(self.index.search("nucleus")) == [5, 7]
+        assert ids(self.index.search("vis cor")) == [1, 2]
+        assert ids(self.index.search("ortex")) == [1, 2]
+        assert ids(self.index.search("ac"))[:1] == [5]
+
+    def test_fuzzy(self):
+        assert ids(self.index.search("cerebelum")) == [4]
+        assert ids(self.index.search("cerebelum", fuzzy=False)) == []
+        assert self.index.search("zzzz") == []
+
+    def test_chinese_names(self):
+        assert ids(self.index.search("小脑")) == [4]
+        assert ids(self.index.search("视觉皮层")) == [1, 2]
+        assert ids(self.index.search("尾状")) == [7]
+
+    def test_limit(self):
+        assert len(self.index.search("a", limit=2)) == 2
+        assert self.index.search("   ") == []
+
+    def test_large_atlas(self):
+        regions = [make_region(i, f"structure {i} of lobe {i % 37}", f"S{i}")
+                   for i in range(1, 5001)]
+        index = RegionSearchIndex(regions)
+        assert ids(index.search("s4321"))[0] == 4321
+        assert ids(index.search("structure 4321"))[0] == 4321
+        assert len(index.search("lobe 3", limit=20)) == 20
+
+
+class TestSearchEndpoint:
+    """/regions/search is routed and ranked"""
+
+    def test_search(self, synthetic_specimen, regions_file):
+        from app.main import app
+
+        client = TestClient(app)
+        response = client.get(f"/api/specimens/{synthetic_specimen}/regions/search",
+                              params={"q": "r12", "max_results": 3})
+        assert response.status_code == 200
+        data = response.json()
+        assert [r["id"] for r in data["results"]] == [12]
+        response = client.get(f"/api/specimens/{synthetic_specimen}/regions/search",
+                              params={"q": "region 1", "max_results": 3})
+        assert [r["id"] for r in response.json()["results"]] == [1, 10, 11]
+
+    def test_listing_search_matches(self, synthetic_specimen, regions_file):
+        from app.main import app
+
+        client = TestClient(app)
+        url = f"/api/specimens/{synthetic_specimen}/regions"
+        for q in ("r12", "region 1", "regoin 2"):
+            found = client.get(f"{url}/search", params={"q": q}).json()["results"]
+            listed = client.get(url, params={"search": q}).json()["regions"]
+            assert [r["id"] for r in listed] == [r["id"] for r in found]
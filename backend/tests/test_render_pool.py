@@ -0,0 +1,152 @@
+"""
+Tests for process-pool tile rendering with results in shared memory
+"""
+
+import os
+import signal
+import sys
+import threading
+import pytest
+from fastapi.testclient import TestClient
+
+# Add backend to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models.specimen import ViewType
+from app.services.intensity import RenderParams
+from app.services.render_pool import RenderPool
+from app.services.tile_cache import TileCache
+
+
+@pytest.fixture
+def pool(synthetic_specimen):
+    pool = RenderPool(processes=2, slot_bytes=1024 * 1024)
+    yield synthetic_specimen, pool
+    pool.close()
+
+
+class TestRenderPool:
+    """Renderer processes produce the same tiles as the API process"""
+
+    def test_same_bytes_as_in_process(self, pool):
+        from app.services.tile_service import TileService
+
+        specimen_id, pool = pool
+        service = TileService()
+        args = (specimen_id, ViewType.CORONAL, 0, 1, 5, 0, 0, 32)
+        for format in ("jpeg", "png"):
+            assert (pool.call("extract_image_tile", *args, format=format, render=RenderParams())
+                    == service.extract_image_tile(*args, format=format, render=RenderParams()))
+        assert (pool.call("extract_atlas_tile", specimen_id, ViewType.SAGITTAL, 1, 0, 0, 3)
+                == service.extract_atlas_tile(specimen_id, ViewType.SAGITTAL, 1, 0, 0, 3))
+        stats = pool.stats()
+        assert (stats["jobs"], stats["shared"], stats["piped"]) == (3, 3, 0)
+        assert stats["alive"] == 2
+
+    def test_large_results_are_piped(self, synthetic_specimen):
+        pool = RenderPool(processes=1, slot_bytes=64)
+        try:
+            tile = pool.call("extract_image_tile", synthetic_specimen, ViewType.CORONAL, 0, 0, 5, 0, 0,
+                             format="png")
+            assert len(tile) > 64 and tile.startswith(b"\x89PNG")
+            assert pool.stats()["piped"] == 1
+        finally:
+            pool.close()
+
+    def test_errors_and_restart(self, pool):
+        specimen_id, pool = pool
+        with pytest.raises(IndexError):
+            pool.call("extract_image_tile", specimen_id, ViewType.CORONAL, 0, 0, 500, 0, 0)
+        with pytest.raises(ValueError):
+            pool.call("image_tile_key", specimen_id)
+
+        # A renderer that died is replaced
+        for renderer in pool._renderers:
+            renderer.process.kill()
+            renderer.process.join()
+        with pytest.raises(RuntimeError):
+            pool.call("extract_atlas_tile", specimen_id, ViewType.CORONAL, 0, 5, 0, 0)
+        # The other dead renderer is next in turn, then both are back
+        with pytest.raises(RuntimeError):
+            pool.call("extract_atlas_tile", specimen_id, ViewType.CORONAL, 0, 5, 0, 0)
+        for _ in range(2):
+            pool.call("extract_atlas_tile", specimen_id, ViewType.CORONAL, 0, 5, 0, 0)
+        stats = pool.stats()
+        assert (stats["restarts"], stats["alive"]) == (2, 2)
+
+    def test_hung_renderer_restarted(self, synthetic_specimen):
+        pool = RenderPool(processes=1, slot_bytes=1024 * 1024)
+        try:
+            args = ("extract_atlas_tile", synthetic_specimen, ViewType.CORONAL, 0, 5, 0, 0)
+            pool.call(*args)
+            # A renderer that stops answering frees the calling thread
+            pool.timeout = 0.5
+            os.kill(pool._renderers[0].process.pid, signal.SIGSTOP)
+            with pytest.raises(TimeoutError):
+                pool.call(*args)
+            pool.timeout = 30.0
+            assert pool.call(*args)
+            stats = pool.stats()
+            assert (stats["timeouts"], stats["restarts"], stats["alive"]) == (1, 1, 1)
+        finally:
+            pool.close()
+
+    def test_calls_after_close(self, synthetic_specimen, monkeypatch):
+        from app.services import render_pool
+
+        pool = RenderPool(processes=1, slot_bytes=1024)
+        renderer = pool._renderers[0]
+        release = threading.Event()
+
+        def exiting(*args):
+            release.wait(5.0)
+            raise render_pool._RendererExited("killed")
+
+        # A call in flight when the pool closes, whose renderer then dies
+        monkeypatch.setattr(renderer, "call", exiting)
+        args = ("extract_atlas_tile", synthetic_specimen, ViewType.CORONAL, 0, 5, 0, 0)
+        errors = []
+        in_flight = threading.Thread(target=lambda: errors.append(
+            pytest.raises(RuntimeError, pool.call, *args)))
+        waiting = threading.Thread(target=lambda: errors.append(
+            pytest.raises(RuntimeError, pool.call, *args)))
+        in_flight.start()
+        waiting.start()
+        pool.close()
+        release.set()
+        for thread in (in_flight, waiting):
+            thread.join(timeout=5.0)
+            assert not thread.is_alive()
+        assert len(errors) == 2 and pool.stats()["restarts"] == 0
+        # The dead renderer was neither restarted nor handed out again
+        with pytest.raises(RuntimeError, match="closed"):
+            pool.call(*args)
+        assert pool._idle.get_nowait() is None and pool._idle.empty()
+
+
+class TestProcessMode:
+    """Tile endpoints dispatch to the render pool in process mode"""
+
+    def test_tiles_from_renderers(self, regions_file, pool, monkeypatch):
+        from app.config import settings
+        from app.api import tiles
+        from app.main import app
+        from app.services import render_pool
+
+        # Renderers get the settings of when they started, regions_file included
+        specimen_id, pool = pool
+        client = TestClient(app)
+        urls = [f"/api/specimens/{specimen_id}/image/coronal/0/5/0/0?channel=1&tile_size=32",
+                f"/api/specimens/{specimen_id}/image/coronal/0/5/0/0?tile_size=32&overlay=fill",
+                f"/api/specimens/{specimen_id}/composite/coronal/0/5/0/0?tile_size=32",
+                f"/api/specimens/{specimen_id}/atlas/horizontal/0/0/4/0?tile_size=32"]
+        monkeypatch.setattr(tiles, "tile_cache", TileCache(l1_bytes=0, redis_url=""))
+        expected = [client.get(url).content for url in urls]
+
+        monkeypatch.setattr(settings, "tile_render_mode", "process")
+        monkeypatch.setattr(render_pool, "_render_pool", pool)
+        responses = [client.get(url) for url in urls]
+        assert [r.status_code for r in responses] == [200] * 4
+        assert [r.content for r in responses] == expected
+        assert pool.stats()["jobs"] == 4
+        assert client.get("/api/stats").json()["render_pool"]["jobs"] == 4
@@ -0,0 +1,156 @@
+"""
+Tests for pre-serialised, ETag'd metadata and region responses
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import sys
+import threading
+from fastapi.testclient import TestClient
+
+# Add backend to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.response_cache import (MIN_COMPRESS_BYTES, CachedBody, ResponseCache,
+                                         _accepted_encodings, _etag_matches)
+
+
+class TestCachedBody:
+    """Serialisation, ETags and compressed variants"""
+
+    def test_from_content(self):
+        content = {"regions": [{"id": i, "name": f"Région {i}"} for i in range(100)]}
+        entry = CachedBody.from_content(content)
+        assert json.loads(entry.body) == content
+        assert "Région".encode() in entry.body  # Same as JSONResponse: no ASCII escapes
+        assert entry.etag.startswith('"') and entry.etag.endswith('"')
+        assert gzip.decompress(entry.gzip) == entry.body
+        assert CachedBody.from_content(content).etag == entry.etag
+        assert CachedBody.from_content({"a": 2}).etag != CachedBody.from_content({"a": 1}).etag
+        small = CachedBody.from_content({"a": 1})
+        assert len(small.body) < MIN_COMPRESS_BYTES and small.gzip is None
+
+    def test_headers(self):
+        assert _accepted_encodings("gzip, deflate, br;q=0") == {"gzip", "deflate"}
+        assert _accepted_encodings(None) == set()
+        assert _etag_matches('"abc"', '"abc"')
+        assert _etag_matches('W/"abc-gzip", "x"', '"abc"')
+        assert _etag_matches("*", '"abc"')
+        assert not _etag_matches('"abd"', '"abc"')
+        assert not _etag_matches(None, '"abc"')
+
+    def test_lru(self):
+        cache = ResponseCache(max_entries=2)
+        calls = []
+        for key in ("a", "b", "a", "c", "b"):
+            cache.get_or_build(key, lambda k=key: calls.append(k) or {"key": k})
+        assert calls == ["a", "b", "c", "b"]  # "b" was evicted by "c"
+        assert cache.stats()["entries"] == 2
+
+    def test_async_builds_off_the_loop(self):
+        cache = ResponseCache()
+        threads = []
+
+        def build():
+            threads.append(threading.get_ident())
+            return {"a": 1}
+
+        async def main():
+            first = await cache.get_or_build_async("k", build)
+            assert await cache.get_or_build_async("k", build) is first
+            return threading.get_ident()
+
+        assert threads != [asyncio.run(main())] and len(threads) == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+
+
+class TestCachedEndpoints:
+    """Endpoints answer from the cache and honour If-None-Match"""
+
+    def test_image_info(self, synthetic_specimen):
+        from app.main import app
+        from app.config import settings
+        from app.services.response_cache import response_cache
+
+        client = TestClient(app)
+        url = f"/api/specimens/{synthetic_specimen}/image-info"
+        first = client.get(url, headers={"Accept-Encoding": "identity"})
+        assert first.status_code == 200
+        etag = first.headers["ETag"]
+        assert first.headers["Cache-Control"] == settings.metadata_cache_control
+        assert "Content-Encoding" not in first.headers
+
+        hits = response_cache.hits
+        again = client.get(url, headers={"If-None-Match": etag})
+        assert again.status_code == 304
+        assert again.content == b""
+        assert again.headers["ETag"] == etag
+        assert response_cache.hits == hits + 1
+
+        # A rewritten file is a new entry
+        image_path = settings.get_image_path(synthetic_specimen)
+        stat = image_path.stat()
+        os.utime(image_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        misses = response_cache.misses
+        assert client.get(url).status_code == 200
+        assert response_cache.misses == misses + 1
+
+    def test_atlas_info_and_metadata(self, synthetic_specimen, regions_file):
+        from app.main import app
+
+        client = TestClient(app)
+        base = f"/api/specimens/{synthetic_specimen}"
+        info = client.get(f"{base}/atlas-info")
+        assert info.status_code == 200
+        assert info.json()["total_regions"] == 12
+        assert client.get(f"{base}/atlas-info",
+                          headers={"If-None-Match": info.headers["ETag"]}).status_code == 304
+
+        metadata = client.get(f"{base}/metadata")
+        assert metadata.status_code == 200
+        assert metadata.json()["atlas"]["total_regions"] == 12
+        assert client.get(f"{base}/metadata",
+                          headers={"If-None-Match": metadata.headers["ETag"]}).status_code == 304
+
+    def test_partial_metadata_not_cached(self, synthetic_specimen, regions_file, monkeypatch):
+        from app.api import metadata
+        from app.main import app
+
+        client = TestClient(app)
+        url = f"/api/specimens/{synthetic_specimen}/metadata"
+        get_image_info = metadata.tile_service.get_image_info
+
+        def failing(specimen_id):
+            raise OSError("Transient read error")
+
+        monkeypatch.setattr(metadata.tile_service, "get_image_info", failing)
+        partial = client.get(url)
+        assert partial.status_code == 200 and partial.json()["image"] is None
+        monkeypatch.setattr(metadata.tile_service, "get_image_info", get_image_info)
+        complete = client.get(url, headers={"If-None-Match": partial.headers["ETag"]})
+        assert complete.status_code == 200 and complete.json()["image"] is not None
+
+    def test_regions_reload_when_file_changes(self, synthetic_specimen, regions_file):
+        from app.main import app
+        from tests.conftest import synthetic_regions
+
+        client = TestClient(app)
+        url = f"/api/specimens/{synthetic_specimen}/regions"
+        first = client.get(url, headers={"Accept-Encoding": "identity"})
+        assert first.json()["total_count"] == 12
+        assert len(first.content) > MIN_COMPRESS_BYTES
+        compressed = client.get(url, headers={"Accept-Encoding": "gzip"})
+        assert compressed.headers["Content-Encoding"] == "gzip"
+        assert compressed.headers["ETag"] != first.headers["ETag"]
+        assert compressed.json() == first.json()
+        assert client.get(url, headers={"If-None-Match": compressed.headers["ETag"]}
+                          ).status_code == 304
+
+        regions_file.write_text(json.dumps(synthetic_regions(count=5)), encoding="utf-8")
+        stat = regions_file.stat()
+        os.utime(regions_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        second = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+        assert second.status_code == 200
+        assert second.json()["total_count"] == 5
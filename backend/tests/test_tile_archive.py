@@ -0,0 +1,174 @@
+"""
+Tests for packed tile archives
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import pytest
+from fastapi.testclient import TestClient
+
+# Add backend to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models.specimen import TileKind, ViewType
+from app.services.prerender import pack_specimen
+from app.services.tile_archive import TileArchive, TileArchiveWriter, pack_key
+from app.services.tile_cache import TileCache
+
+
+class TestTileArchiveFile:
+    """Writing archives and looking tiles up in the map"""
+
+    def test_round_trip(self, tmp_path):
+        path = tmp_path / "tiles.pack"
+        tiles = {}
+        with TileArchiveWriter(path, {"tile_size": 32}) as writer:
+            # Added out of key order, the index is sorted on close
+            for z in (3, 1, 2):
+                for y, x in ((32, 0), (0, 32), (0, 0)):
+                    data = f"tile {z} {y} {x}".encode()
+                    writer.add("image", ViewType.CORONAL, 2, z, y, x, 1, "jpeg", data)
+                    tiles[(z, y, x)] = data
+        assert not path.with_name("tiles.pack.tmp").exists()
+
+        archive = TileArchive(path)
+        assert len(archive) == 9
+        assert archive.manifest == {"tile_size": 32}
+        assert list(archive.keys()) == sorted(archive.keys())
+        for (z, y, x), data in tiles.items():
+            tile = archive.get("image", ViewType.CORONAL, 2, z, y, x, 1, "jpeg")
+            assert isinstance(tile, memoryview) and bytes(tile) == data
+        assert archive.get("image", ViewType.CORONAL, 2, 4, 0, 0, 1, "jpeg") is None
+        assert archive.get("image", ViewType.CORONAL, 2, 1, 0, 0, 0, "jpeg") is None
+        assert archive.get("atlas", ViewType.CORONAL, 2, 1, 0, 0, 1, "jpeg") is None
+        assert archive.get("image", ViewType.CORONAL, 2, 1, 0, 0, 1, "png") is None
+        assert archive.hits == 9 and archive.misses == 4
+
+    def test_identical_tiles_stored_once(self, tmp_path):
+        path = tmp_path / "tiles.pack"
+        with TileArchiveWriter(path) as writer:
+            for z in range(10):
+                writer.add("atlas", ViewType.SAGITTAL, 0, z, 0, 0, 0, "png", b"background")
+            writer.add("atlas", ViewType.SAGITTAL, 0, 0, 32, 0, 0, "png", b"labels")
+        assert writer.duplicates == 9
+        assert writer.bytes_written == len(b"background") + len(b"labels")
+        archive = TileArchive(path)
+        assert bytes(archive.get("atlas", ViewType.SAGITTAL, 0, 7, 0, 0, 0, "png")) == b"background"
+
+    def test_duplicate_key_and_abort(self, tmp_path):
+        path = tmp_path / "tiles.pack"
+        with pytest.raises(ValueError):
+            with TileArchiveWriter(path) as writer:
+                writer.add("image", ViewType.CORONAL, 0, 0, 0, 0, 0, "jpeg", b"a")
+                writer.add("image", ViewType.CORONAL, 0, 0, 0, 0, 0, "jpeg", b"b")
+        assert not path.exists()
+        assert not path.with_name("tiles.pack.tmp").exists()
+
+    def test_key_range_and_bad_file(self, tmp_path):
+        with pytest.raises(ValueError):
+            pack_key("image", ViewType.CORONAL, 256, 0, 0, 0, 0, "jpeg")
+        path = tmp_path / "tiles.pack"
+        path.write_bytes(b"\0" * 128)
+        with pytest.raises(ValueError):
+            TileArchive(path)
+
+
+class TestArchiveServing:
+    """The tile endpoints answer from a current archive with the rendered bytes"""
+
+    @pytest.fixture
+    def packed(self, synthetic_specimen, regions_file, monkeypatch):
+        from app.config import settings
+        from app.api import tiles
+        from app.services.tile_archive import tile_archives
+
+        monkeypatch.setattr(settings, "default_tile_size", 32)
+        monkeypatch.setattr(tiles.tile_service, "default_tile_size", 32)
+        monkeypatch.setattr(tiles, "tile_cache", TileCache(l1_bytes=0, redis_url=""))
+        monkeypatch.setattr(tile_archives, "recheck_interval", 0.0)
+        tile_archives.clear()
+        stats = pack_specimen(synthetic_specimen, levels=[1], slice_stride=4,
+                              image_formats=("jpeg", "webp"), progress=lambda msg: None)
+        yield synthetic_specimen, stats
+        tile_archives.clear()
+
+    def test_served_from_archive(self, packed, monkeypatch):
+        from app.config import settings
+        from app.main import app
+
+        specimen_id, stats = packed
+        # Level 1 is (20, 24, 28): 18 slices of one tile each, see test_prerender
+        assert stats.rendered == 18 * (2 * 2 + 2)
+        client = TestClient(app)
+        urls = [f"/api/specimens/{specimen_id}/image/coronal/1/8/0/0?channel=1",
+                f"/api/specimens/{specimen_id}/image/sagittal/1/0/0/12",
+                f"/api/specimens/{specimen_id}/atlas/horizontal/1/0/20/0"]
+        archived = []
+        for url in urls:
+            response = client.get(url, headers={"Accept": "image/webp,*/*"})
+            assert response.status_code == 200
+            assert response.headers["X-Cache"] == "ARCHIVE"
+            assert response.headers["Content-Type"] == "image/webp"
+            archived.append(response.content)
+
+        monkeypatch.setattr(settings, "tile_archives", False)
+        for url, content in zip(urls, archived):
+            response = client.get(url, headers={"Accept": "image/webp,*/*"})
+            assert response.headers["X-Cache"] == "MISS"
+            assert response.content == content
+
+        stats = client.get("/api/stats").json()["tile_archives"]
+        assert stats[specimen_id]["hits"] == 3
+
+    def test_rendered_when_not_archived(self, packed):
+        from app.main import app
+
+        specimen_id, _ = packed
+        client = TestClient(app)
+        base = f"/api/specimens/{specimen_id}/image/coronal/1"
+        # Slice not packed, custom window, other tile size and an overlay
+        for url in (f"{base}/9/0/0", f"{base}/8/0/0?min=0&max=100",
+                    f"{base}/8/0/0?tile_size=16", f"{base}/8/0/0?overlay=fill"):
+            response = client.get(url)
+            assert response.status_code == 200
+            assert response.headers["X-Cache"] == "MISS"
+
+    def test_stale_archive_ignored(self, packed):
+        from app.config import settings
+        from app.main import app
+
+        specimen_id, _ = packed
+        client = TestClient(app)
+        url = f"/api/specimens/{specimen_id}/image/coronal/1/8/0/0"
+        assert client.get(url).headers["X-Cache"] == "ARCHIVE"
+        image_path = settings.get_image_path(specimen_id)
+        os.utime(image_path, ns=(image_path.stat().st_atime_ns, image_path.stat().st_mtime_ns + 10**9))
+        assert client.get(url).headers["X-Cache"] == "MISS"
+
+    def test_recheck_off_the_event_loop(self, packed, monkeypatch):
+        from app.api import tiles
+        from app.services.tile_archive import tile_archives
+
+        specimen_id, _ = packed
+        threads = []
+        get = tile_archives.get
+
+        def recording(*args):
+            threads.append(threading.get_ident())
+            return get(*args)
+
+        monkeypatch.setattr(tile_archives, "recheck_interval", 60.0)
+        monkeypatch.setattr(tile_archives, "get", recording)
+
+        async def main():
+            for _ in range(2):
+                tile = await tiles._archived_tile(TileKind.IMAGE, specimen_id, ViewType.CORONAL,
+                                                  1, 8, 0, 0, 1, None, "jpeg")
+                assert tile is not None
+            return threading.get_ident()
+
+        loop_thread = asyncio.run(main())
+        # Opened in the thread pool, then answered from memory on the loop
+        assert len(threads) == 2 and threads[0] != loop_thread and threads[1] == loop_thread
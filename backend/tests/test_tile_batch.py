@@ -0,0 +1,104 @@
+"""
+Tests for the batch tile endpoint
+"""
+
+import json
+import os
+import struct
+import sys
+import pytest
+from fastapi.testclient import TestClient
+
+# Add backend to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models.specimen import BatchTileDescriptor, ViewType
+from app.services.tile_cache import TileCache
+
+
+def parse_frames(content: bytes):
+    """Split a batch response into (header, body) pairs"""
+    frames, pos = [], 0
+    while pos < len(content):
+        (n,) = struct.unpack_from(">I", content, pos)
+        header = json.loads(content[pos + 4:pos + 4 + n])
+        pos += 4 + n
+        (n,) = struct.unpack_from(">I", content, pos)
+        frames.append((header, content[pos + 4:pos + 4 + n]))
+        pos += 4 + n
+    return frames
+
+
+@pytest.fixture
+def client(synthetic_specimen, monkeypatch):
+    from app.main import app
+    from app.api import tiles
+
+    monkeypatch.setattr(tiles, "tile_cache", TileCache(l1_bytes=4 * 1024 * 1024, redis_url=""))
+    return TestClient(app)
+
+
+class TestTileBatch:
+    """Batch responses match the single tile endpoints"""
+
+    def test_tiles_match_single_endpoints(self, client, synthetic_specimen):
+        tiles = [
+            {"view": "coronal", "level": 0, "z": 4, "y": 0, "x": 0, "tile_size": 32},
+            {"view": "sagittal", "level": 1, "z": 0, "y": 0, "x": 3, "channel": 1,
+             "tile_size": 16, "format": "png", "min": 1000, "max": 1200},
+            {"kind": "atlas", "view": "horizontal", "level": 0, "z": 0, "y": 5, "x": 0,
+             "tile_size": 32},
+        ]
+        response = client.post(f"/api/specimens/{synthetic_specimen}/tiles:batch",
+                               json={"tiles": tiles})
+        assert response.status_code == 200
+        assert response.headers["X-Tile-Count"] == "3"
+        frames = parse_frames(response.content)
+        assert sorted(h["index"] for h, _ in frames) == [0, 1, 2]
+
+        singles = [
+            "image/coronal/0/4/0/0?tile_size=32",
+            "image/sagittal/1/0/0/3?channel=1&tile_size=16&format=png&min=1000&max=1200",
+            "atlas/horizontal/0/0/5/0?tile_size=32",
+        ]
+        for header, body in frames:
+            single = client.get(f"/api/specimens/{synthetic_specimen}/{singles[header['index']]}")
+            assert header["status"] == 200
+            assert header["content_type"] == single.headers["content-type"]
+            assert body == single.content
+            assert single.headers["X-Cache"] == "HIT"  # Batch populated the tile cache
+
+        again = parse_frames(client.post(f"/api/specimens/{synthetic_specimen}/tiles:batch",
+                                         json={"tiles": tiles}).content)
+        assert all(h["cache"] == "HIT" for h, _ in again)
+
+    def test_errors_are_per_tile(self, client, synthetic_specimen):
+        tiles = [
+            {"view": "coronal", "level": 0, "z": 4, "y": 0, "x": 0, "tile_size": 32},
+            {"view": "coronal", "level": 9, "z": 0, "y": 0, "x": 0},
+            {"view": "coronal", "level": 0, "z": 999, "y": 0, "x": 0},
+            {"view": "coronal", "level": 0, "z": 0, "y": 0, "x": 0, "format": "gif"},
+        ]
+        response = client.post(f"/api/specimens/{synthetic_specimen}/tiles:batch",
+                               json={"tiles": tiles})
+        status = {h["index"]: h["status"] for h, _ in parse_frames(response.content)}
+        assert status == {0: 200, 1: 422, 2: 422, 3: 400}
+
+    def test_request_validation(self, client, synthetic_specimen):
+        url = f"/api/specimens/{synthetic_specimen}/tiles:batch"
+        assert client.post(url, json={"tiles": []}).status_code == 422
+        assert client.post(url, json={"tiles": [{"view": "oblique", "level": 0,
+                                                 "z": 0, "y": 0, "x": 0}]}).status_code == 422
+        assert client.post("/api/specimens/unknown/tiles:batch",
+                           json={"tiles": [{"view": "coronal", "level": 0,
+                                            "z": 0, "y": 0, "x": 0}]}).status_code == 404
+
+    def test_grouping_by_chunks(self, synthetic_specimen):
+        from app.api.tiles import _group_batch_tiles
+
+        # Synthetic chunks are (8, 16, 16): slices 0-7 share chunks, 8 does not
+        pending = [(i, BatchTileDescriptor(view=ViewType.CORONAL, level=0, z=z, y=0, x=0,
+                                           tile_size=16), "jpeg", None, "")
+                   for i, z in enumerate([0, 8, 3, 7, 9])]
+        groups = _group_batch_tiles(synthetic_specimen, pending)
+        assert sorted(sorted(item[0] for item in g) for g in groups) == [[0, 2, 3], [1, 4]]
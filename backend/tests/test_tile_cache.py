@@ -0,0 +1,117 @@
+"""
+Tests for the two-tier encoded tile cache
+"""
+
+import os
+import sys
+import pytest
+from fastapi.testclient import TestClient
+
+# Add backend to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.tile_cache import TileCache, make_tile_key
+
+
+class FakeRedis:
+    """Minimal async stand-in for redis.asyncio.Redis"""
+
+    def __init__(self):
+        self.store = {}
+        self.ttls = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value
+        self.ttls[key] = ex
+
+
+class BrokenRedis:
+    async def get(self, key):
+        raise ConnectionError("redis is down")
+
+    async def set(self, key, value, ex=None):
+        raise ConnectionError("redis is down")
+
+
+class TestTileCache:
+    """Tests for TileCache tiers and degradation"""
+
+    @pytest.mark.asyncio
+    async def test_l2_is_shared_between_processes(self):
+        redis = FakeRedis()
+        worker_a = TileCache(l1_bytes=1024, client=redis, ttl=60)
+        worker_b = TileCache(l1_bytes=1024, client=redis, ttl=60)
+        key = make_tile_key("image", "s", "coronal", 0, 1, 2, 3, 0, 512, "jpeg", 42)
+
+        assert await worker_b.get(key) is None
+        await worker_a.set(key, b"tile")
+        assert redis.ttls[key] == 60
+
+        assert await worker_b.get(key) == b"tile"
+        assert worker_b.l2_hits == 1
+        # Promoted into L1, Redis is not asked again
+        assert await worker_b.get(key) == b"tile"
+        assert worker_b.l2_hits == 1
+
+    @pytest.mark.asyncio
+    async def test_redis_errors_degrade_to_l1(self):
+        cache = TileCache(l1_bytes=1024, client=BrokenRedis())
+        await cache.set("k", b"data")
+        assert await cache.get("k") == b"data"
+        assert await cache.get("other") is None
+        assert cache.l2_errors == 2
+
+    @pytest.mark.asyncio
+    async def test_unreachable_redis_is_backed_off(self):
+        cache = TileCache(l1_bytes=0, redis_url="redis://127.0.0.1:1", retry_interval=60)
+        assert await cache.get("k") is None
+        assert cache.l2_errors == 1
+        # Within the retry interval no connection is attempted
+        assert await cache.get("k") is None
+        await cache.set("k", b"data")
+        assert cache.l2_errors == 1
+
+    @pytest.mark.asyncio
+    async def test_no_redis_configured(self):
+        cache = TileCache(l1_bytes=0, redis_url="")
+        await cache.set("k", b"data")
+        assert await cache.get("k") is None
+        assert cache.l2_errors == 0
+
+
+class TestTileEndpointCaching:
+    """Tile endpoints serve repeated requests from the cache"""
+
+    def test_image_tile_cache_hit(self, synthetic_specimen, monkeypatch):
+        from app.main import app
+        from app.api import tiles
+
+        redis = FakeRedis()
+        monkeypatch.setattr(tiles, "tile_cache", TileCache(l1_bytes=1024 * 1024, client=redis))
+        client = TestClient(app)
+        url = f"/api/specimens/{synthetic_specimen}/image/coronal/0/4/0/0?tile_size=32"
+
+        first = client.get(url)
+        assert first.status_code == 200
+        assert first.headers["X-Cache"] == "MISS"
+        second = client.get(url)
+        assert second.headers["X-Cache"] == "HIT"
+        assert second.content == first.content
+
+        # Other tile parameters must not collide
+        other = client.get(url.replace("/4/0/0", "/5/0/0"))
+        assert other.headers["X-Cache"] == "MISS"
+        assert len(redis.store) == 2
+
+    def test_atlas_tile_cache_hit(self, synthetic_specimen, monkeypatch):
+        from app.main import app
+        from app.api import tiles
+
+        monkeypatch.setattr(tiles, "tile_cache", TileCache(l1_bytes=1024 * 1024, redis_url=""))
+        client = TestClient(app)
+        url = f"/api/specimens/{synthetic_specimen}/atlas/sagittal/0/0/0/3?tile_size=32"
+        assert client.get(url).headers["X-Cache"] == "MISS"
+        assert client.get(url).headers["X-Cache"] == "HIT"
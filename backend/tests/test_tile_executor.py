@@ -0,0 +1,199 @@
+"""
+Tests for the prioritised, bounded tile executor and its use by the tile endpoints
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+
+# Add backend to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.coalesce import MicroBatcher, SingleFlight
+from app.services.tile_cache import TileCache
+from app.services.tile_executor import (
+    PRIORITY_BATCH, PRIORITY_PREFETCH, PRIORITY_VIEWPORT, TileExecutor, TileQueueFull)
+
+
+def _blocked(executor):
+    """Occupy the executor's only worker until the returned event is set"""
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5.0)
+
+    future = executor.submit(block)
+    assert started.wait(5.0)
+    return release, future
+
+
+class TestTileExecutor:
+    """Job order, admission, deadlines and cancellation"""
+
+    def test_priority_order(self):
+        executor = TileExecutor(workers=1, max_queue=10)
+        release, _ = _blocked(executor)
+        order = []
+        futures = [executor.submit(order.append, name, priority=priority)
+                   for name, priority in (("batch", PRIORITY_BATCH), ("prefetch", PRIORITY_PREFETCH),
+                                          ("view1", PRIORITY_VIEWPORT), ("view2", PRIORITY_VIEWPORT))]
+        release.set()
+        for future in futures:
+            future.result(5.0)
+        assert order == ["view1", "view2", "prefetch", "batch"]
+        assert executor.stats()["submitted"] == {"viewport": 3, "prefetch": 1, "batch": 1}
+        executor.close()
+
+    def test_promote(self):
+        executor = TileExecutor(workers=1, max_queue=10)
+        release, running = _blocked(executor)
+        order = []
+        batch = executor.submit(order.append, "batch", priority=PRIORITY_BATCH)
+        prefetch = executor.submit(order.append, "prefetch", priority=PRIORITY_PREFETCH)
+        assert executor.promote(batch, PRIORITY_VIEWPORT)
+        assert not executor.promote(running, PRIORITY_VIEWPORT)  # Already started
+        release.set()
+        prefetch.result(5.0)
+        assert order == ["batch", "prefetch"]
+        executor.close()
+
+    def test_overload(self):
+        executor = TileExecutor(workers=1, max_queue=2)
+        release, _ = _blocked(executor)
+        executor.submit(time.sleep, 0)
+        with pytest.raises(TileQueueFull) as excinfo:
+            executor.submit(time.sleep, 0)
+        assert excinfo.value.depth == 2
+        assert excinfo.value.retry_after >= 1
+        with pytest.raises(TileQueueFull):
+            executor.admit()
+        release.set()
+        executor.close()
+        assert executor.stats()["rejected"] == 2
+
+    def test_deadline_and_cancel(self):
+        executor = TileExecutor(workers=1, max_queue=10)
+        release, _ = _blocked(executor)
+        calls = []
+        expired = executor.submit(calls.append, "expired", timeout=0.01)
+        cancelled = executor.submit(calls.append, "cancelled")
+        kept = executor.submit(calls.append, "kept")
+        assert cancelled.cancel()
+        time.sleep(0.05)
+        release.set()
+        kept.result(5.0)
+        with pytest.raises(TimeoutError):
+            expired.result(5.0)
+        assert calls == ["kept"]
+        stats = executor.stats()
+        assert (stats["expired"], stats["cancelled"]) == (1, 1)
+        executor.close()
+
+    def test_async_run(self):
+        executor = TileExecutor(workers=2, max_queue=10)
+
+        def fail():
+            raise KeyError("level")
+
+        async def main():
+            assert await executor.run(sum, [1, 2, 3]) == 6
+            with pytest.raises(KeyError):
+                await executor.run(fail)
+
+        asyncio.run(main())
+        executor.close()
+
+
+class TestTileEndpoints:
+    """Tile requests through a small executor"""
+
+    @pytest.fixture
+    def executor(self, synthetic_specimen, monkeypatch):
+        from app.api import tiles
+
+        executor = TileExecutor(workers=1, max_queue=4)
+        monkeypatch.setattr(tiles, "tile_executor", executor)
+        monkeypatch.setattr(tiles, "tile_cache", TileCache(l1_bytes=0, redis_url=""))
+        monkeypatch.setattr(tiles, "tile_flights", SingleFlight())
+        monkeypatch.setattr(tiles, "tile_batcher", MicroBatcher(tiles._render_tiles, window=0))
+        yield synthetic_specimen, executor
+        executor.close()
+
+    def test_overload_returns_503(self, executor):
+        from app.main import app
+
+        specimen_id, executor = executor
+        client = TestClient(app)
+        url = f"/api/specimens/{specimen_id}/image/coronal/0/5/0/0?tile_size=32"
+        assert client.get(url).status_code == 200
+
+        executor.max_queue = 0
+        response = client.get(url)
+        assert response.status_code == 503
+        assert int(response.headers["Retry-After"]) >= 1
+        response = client.post(f"/api/specimens/{specimen_id}/tiles:batch",
+                               json={"tiles": [{"view": "coronal", "level": 0, "z": 5, "y": 0, "x": 0}]})
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+
+    def test_request_timeout(self, executor, monkeypatch):
+        from app.config import settings
+        from app.main import app
+
+        specimen_id, executor = executor
+        monkeypatch.setattr(settings, "request_timeout", 0.05)
+        release, _ = _blocked(executor)
+        try:
+            response = TestClient(app).get(f"/api/specimens/{specimen_id}/atlas/coronal/0/5/0/0")
+            assert response.status_code == 504
+        finally:
+            release.set()
+
+    def test_disconnect_cancels_queued_work(self, executor):
+        from app.main import app
+
+        specimen_id, executor = executor
+        release, _ = _blocked(executor)
+        messages = []
+
+        async def main():
+            disconnect = asyncio.Event()
+            requested = False
+
+            async def receive():
+                nonlocal requested
+                if not requested:
+                    requested = True
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                await disconnect.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                messages.append(message)
+
+            scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+                     "method": "GET", "scheme": "http", "server": ("test", 80),
+                     "client": ("client", 1234), "root_path": "", "query_string": b"tile_size=32",
+                     "path": f"/api/specimens/{specimen_id}/image/coronal/0/5/0/0",
+                     "raw_path": b"", "headers": []}
+            request = asyncio.ensure_future(app(scope, receive, send))
+            while executor.stats()["queued"] == 0:
+                await asyncio.sleep(0.005)
+            disconnect.set()
+            await request
+
+        asyncio.run(main())
+        assert messages[0]["status"] == 499
+        release.set()
+        deadline = time.monotonic() + 5.0
+        while executor.stats()["cancelled"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        stats = executor.stats()
+        assert stats["cancelled"] == 1
+        assert stats["completed"] == 1  # Only the blocking job ran
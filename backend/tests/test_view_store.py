@@ -0,0 +1,67 @@
+"""
+Tests for view-optimised derived stores
+"""
+
+import os
+import sys
+import numpy as np
+import pytest
+
+# Add backend to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models.specimen import ViewType
+from app.services.chunk_cache import ChunkCache
+from app.services.imaris_handler import ImarisHandler
+from app.services.view_store import build_view_store, view_store_path
+
+
+class TestViewStore:
+    """Tiles from view stores must equal tiles sliced from the .ims file"""
+
+    @pytest.mark.parametrize("view,zyx", [
+        (ViewType.SAGITTAL, (0, 0, 5)),
+        (ViewType.SAGITTAL, (30, 40, 55)),
+        (ViewType.HORIZONTAL, (0, 7, 0)),
+        (ViewType.HORIZONTAL, (25, 47, 40)),
+    ])
+    def test_tiles_match_source(self, make_ims, view, zyx):
+        path = make_ims()
+        # A tiny block budget forces the build to stream many blocks
+        build_view_store(path, view, tile_size=16, max_block_bytes=16 * 16 * 2 * 3)
+        cache = ChunkCache(max_bytes=64 * 1024 * 1024)
+        with ImarisHandler(path) as plain, \
+                ImarisHandler(path, chunk_cache=cache, use_view_stores=True) as fast:
+            for level in (0, 1):
+                args = (view, level, 1) + tuple(c >> level for c in zyx)
+                np.testing.assert_array_equal(fast.get_tile(*args, tile_size=20),
+                                              plain.get_tile(*args, tile_size=20))
+            assert fast.get_view_dataset(view, 0, 1) is not None
+
+    def test_store_layout(self, make_ims):
+        path = make_ims()
+        store = build_view_store(path, ViewType.SAGITTAL, tile_size=16, levels=[0])
+        assert store == view_store_path(path, ViewType.SAGITTAL)
+        assert store.name == "image.sagittal.h5"
+
+        import h5py
+        with h5py.File(store, 'r') as f:
+            data = f["ResolutionLevel 0/Channel 0/Data"]
+            assert data.shape == (56, 48, 40)      # (x, y, z)
+            assert data.chunks == (1, 16, 16)
+            assert "ResolutionLevel 1" not in f
+
+    def test_stale_store_is_ignored(self, make_ims):
+        path = make_ims()
+        build_view_store(path, ViewType.SAGITTAL, tile_size=16)
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        with ImarisHandler(path, use_view_stores=True) as handler:
+            assert handler.get_view_dataset(ViewType.SAGITTAL, 0, 0) is None
+            tile = handler.get_tile(ViewType.SAGITTAL, 0, 0, 0, 0, 3, tile_size=16)
+            assert tile.shape == (16, 16)
+
+    def test_coronal_has_no_store(self, make_ims):
+        with pytest.raises(ValueError):
+            build_view_store(make_ims(), ViewType.CORONAL)
@@ -0,0 +1,120 @@
+"""
+Tests for the volume reader interface and the Zarr reader
+"""
+
+import os
+import sys
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+# Add backend to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models.specimen import ViewType
+from app.services.chunk_cache import ChunkCache
+from app.services.imaris_handler import ImarisHandler
+from app.services.tile_cache import TileCache
+from app.services.volume_reader import VolumeReader, open_volume, version_path
+
+zarr = pytest.importorskip("zarr")
+
+from app.services.zarr_reader import ZarrReader
+from tests.conftest import write_synthetic_zarr
+
+TILES = [(ViewType.CORONAL, 0, 3, 0, 0), (ViewType.CORONAL, 0, 9, 17, 30),
+         (ViewType.SAGITTAL, 0, 5, 20, 33), (ViewType.HORIZONTAL, 0, 12, 47, 9),
+         (ViewType.SAGITTAL, 1, 0, 0, 27), (ViewType.HORIZONTAL, 1, 19, 3, 2)]
+
+
+class TestZarrReader:
+    """The Zarr reader returns the same tiles and metadata as the Imaris handler"""
+
+    @pytest.mark.parametrize("axes,multiscales", [("czyx", True), ("tczyx", True),
+                                                  ("czyx", False)])
+    def test_matches_imaris(self, make_ims, tmp_path, axes, multiscales):
+        ims_path = make_ims()
+        zarr_path = write_synthetic_zarr(tmp_path / "image.zarr", axes=axes,
+                                         multiscales=multiscales)
+        cache = ChunkCache(max_bytes=16 * 1024 * 1024)
+        with ImarisHandler(ims_path) as ims, ZarrReader(zarr_path, chunk_cache=cache) as reader:
+            assert isinstance(reader, VolumeReader)
+            assert reader.get_resolution_levels() == ims.get_resolution_levels()
+            assert reader.get_channels() == ims.get_channels()
+            for level in ims.get_resolution_levels():
+                assert reader.get_data_shape(level, 1) == ims.get_data_shape(level, 1)
+                assert reader.get_chunks(level, 1) == ims.get_chunks(level, 1)
+            assert reader.get_metadata()["data_type"] == "uint16"
+            for view, level, z, y, x in TILES:
+                for channel in (0, 1):
+                    for _ in range(2):  # Second read assembles cached chunks
+                        np.testing.assert_array_equal(
+                            reader.get_tile(view, level, channel, z, y, x, 16),
+                            ims.get_tile(view, level, channel, z, y, x, 16))
+            assert reader.tile_chunk_footprint(ViewType.SAGITTAL, 0, 1, 5, 20, 33, 16) == \
+                ims.tile_chunk_footprint(ViewType.SAGITTAL, 0, 1, 5, 20, 33, 16)
+            assert reader.get_pixel_value_at_coordinate(0, 1, 4, 5, 6) == \
+                ims.get_pixel_value_at_coordinate(0, 1, 4, 5, 6)
+            if multiscales:
+                np.testing.assert_array_equal(reader.get_histogram(0, 1), ims.get_histogram(0, 1))
+                assert reader.get_histogram_range(0, 1) == ims.get_histogram_range(0, 1)
+            else:
+                assert reader.get_histogram(0, 1) is None
+                assert reader.get_histogram_range(0, 1) is None
+        assert cache.stats()["entries"] > 0
+
+    def test_single_channel_and_errors(self, tmp_path):
+        path = write_synthetic_zarr(tmp_path / "atlas.zarr", axes="zyx", dtype="uint8")
+        with ZarrReader(path) as reader:
+            assert reader.get_channels() == [0]
+            assert reader.get_dataset(0, 0)[...].shape == (40, 48, 56)
+            with pytest.raises(KeyError):
+                reader.get_dataset(2, 0)
+            with pytest.raises(KeyError):
+                reader.get_tile(ViewType.CORONAL, 0, 1, 0, 0, 0, 16)
+            with pytest.raises(IndexError):
+                reader.get_tile(ViewType.CORONAL, 0, 0, 40, 0, 0, 16)
+        assert not reader.is_open
+        with pytest.raises(FileNotFoundError):
+            ZarrReader(tmp_path / "missing.zarr")
+
+    def test_open_volume(self, make_ims, tmp_path):
+        zarr_path = write_synthetic_zarr(tmp_path / "image.zarr")
+        with open_volume(zarr_path) as reader:
+            assert isinstance(reader, ZarrReader)
+        with open_volume(make_ims()) as reader:
+            assert isinstance(reader, ImarisHandler)
+        # The root attributes mark a new version of a store
+        assert version_path(zarr_path) == zarr_path / ".zattrs"
+        assert version_path(tmp_path / "image.ims") == tmp_path / "image.ims"
+
+
+class TestVolumeSelection:
+    """Specimens are served from a Zarr store when one is present"""
+
+    def test_zarr_preferred(self, synthetic_specimen, monkeypatch):
+        from app.main import app
+        from app.api import tiles
+        from app.config import settings
+
+        monkeypatch.setattr(tiles, "tile_cache", TileCache(l1_bytes=1024 * 1024, redis_url=""))
+        client = TestClient(app)
+        url = (f"/api/specimens/{synthetic_specimen}/image/sagittal/0/5/20/33"
+               f"?channel=1&tile_size=16&format=png&min=0&max=2000")
+        from_ims = client.get(url)
+        assert from_ims.status_code == 200
+
+        specimen_dir = settings.get_specimen_path(synthetic_specimen)
+        write_synthetic_zarr(specimen_dir / "image.zarr")
+        assert settings.get_image_path(synthetic_specimen) == specimen_dir / "image.zarr"
+        from_zarr = client.get(url)
+        assert from_zarr.status_code == 200
+        assert from_zarr.headers["X-Cache"] == "MISS"  # New volume, new cache key
+        assert from_zarr.content == from_ims.content
+
+        info = client.get(f"/api/specimens/{synthetic_specimen}/image-info").json()
+        assert info["dimensions"] == [40, 48, 56]
+        assert info["file_size"] > 0
+
+        monkeypatch.setattr(settings, "volume_formats", ["ims"])
+        assert settings.get_image_path(synthetic_specimen) == specimen_dir / "image.ims"
@@ -0,0 +1,117 @@
+"""
+Tests for the .ims to Zarr converter
+"""
+
+import os
+import sys
+import numpy as np
+import pytest
+
+# Add backend to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models.specimen import ViewType
+from app.services.imaris_handler import ImarisHandler
+
+zarr = pytest.importorskip("zarr")
+
+from app.services import zarr_convert
+from app.services.zarr_convert import PROGRESS_FILE, ConversionOptions, convert_to_zarr
+from app.services.zarr_reader import ZarrReader
+
+OPTIONS = ConversionOptions(tile_size=16, chunk_depth=2, views=("sagittal", "horizontal"),
+                            codec="lz4", shuffle="bit", max_block_bytes=8 * 1024)
+TILES = [(ViewType.CORONAL, 0, 9, 17, 30), (ViewType.SAGITTAL, 0, 5, 20, 33),
+         (ViewType.HORIZONTAL, 0, 12, 47, 9), (ViewType.SAGITTAL, 1, 0, 0, 27)]
+
+
+def assert_same_volume(ims_path, store_path):
+    with ImarisHandler(ims_path) as ims, ZarrReader(store_path, use_view_stores=True) as reader:
+        assert reader.get_resolution_levels() == ims.get_resolution_levels()
+        for level in ims.get_resolution_levels():
+            for channel in ims.get_channels():
+                np.testing.assert_array_equal(reader.get_dataset(level, channel)[...],
+                                              ims.get_dataset(level, channel)[...])
+        for view, level, z, y, x in TILES:
+            if view != ViewType.CORONAL:
+                assert reader.get_view_dataset(view, level, 1) is not None
+            np.testing.assert_array_equal(reader.get_tile(view, level, 1, z, y, x, 16),
+                                          ims.get_tile(view, level, 1, z, y, x, 16))
+        np.testing.assert_array_equal(reader.get_histogram(1, 0), ims.get_histogram(1, 0))
+        assert reader.get_histogram_range(1, 0) == ims.get_histogram_range(1, 0)
+
+
+class TestConvertToZarr:
+    """Converted stores read back identical to the source"""
+
+    def test_convert(self, make_ims):
+        ims_path = make_ims()
+        messages = []
+        store = convert_to_zarr(ims_path, options=OPTIONS, report_interval=0,
+                                progress=messages.append)
+        assert store == ims_path.with_suffix(".zarr")
+        assert not store.with_name("image.zarr.partial").exists()
+        assert not (store / PROGRESS_FILE).exists()
+        group = zarr.open_group(str(store), mode="r")
+        assert group["0"].chunks == (1, 2, 16, 16)
+        assert group["views/sagittal/0"].chunks == (1, 1, 16, 16)
+        assert group["0"].compressor.cname == "lz4"
+        assert "MB/s" in messages[-1]
+        assert_same_volume(ims_path, store)
+
+        # Converting again replaces the store
+        convert_to_zarr(ims_path, options=ConversionOptions(tile_size=32))
+        assert zarr.open_group(str(store), mode="r")["0"].chunks == (1, 1, 32, 32)
+        assert not store.with_name("image.zarr.old").exists()
+
+    def test_resume(self, make_ims, monkeypatch):
+        ims_path = make_ims()
+        convert_block = zarr_convert._convert_block
+        calls = []
+
+        def interrupted(*args):
+            if len(calls) == 10:
+                raise KeyboardInterrupt
+            calls.append(args)
+            return convert_block(*args)
+
+        monkeypatch.setattr(zarr_convert, "_convert_block", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            convert_to_zarr(ims_path, options=OPTIONS)
+        partial = ims_path.with_name("image.zarr.partial")
+        assert (partial / PROGRESS_FILE).exists()
+        assert not ims_path.with_suffix(".zarr").exists()
+
+        # Only the blocks not logged as written are copied again
+        counted = []
+        monkeypatch.setattr(zarr_convert, "_convert_block",
+                            lambda *args: counted.append(args) or convert_block(*args))
+        store = convert_to_zarr(ims_path, options=OPTIONS)
+        assert len(calls) == 10 and counted
+        assert not set(map(repr, calls)) & set(map(repr, counted))
+        assert_same_volume(ims_path, store)
+
+    def test_changed_options_restart(self, make_ims, monkeypatch):
+        ims_path = make_ims()
+        monkeypatch.setattr(zarr_convert, "_convert_block",
+                            lambda *args: (_ for _ in ()).throw(KeyboardInterrupt))
+        with pytest.raises(KeyboardInterrupt):
+            convert_to_zarr(ims_path, options=OPTIONS)
+        monkeypatch.undo()
+        messages = []
+        store = convert_to_zarr(ims_path, options=ConversionOptions(tile_size=16),
+                                progress=messages.append)
+        assert any("Discarding partial store" in m for m in messages)
+        with ZarrReader(store) as reader, ImarisHandler(ims_path) as ims:
+            np.testing.assert_array_equal(reader.get_dataset(0, 1)[...], ims.get_dataset(0, 1)[...])
+
+    def test_parallel_workers(self, make_ims):
+        ims_path = make_ims()
+        store = convert_to_zarr(ims_path, options=OPTIONS, workers=2)
+        assert_same_volume(ims_path, store)
+
+    def test_invalid_options(self):
+        with pytest.raises(ValueError):
+            ConversionOptions(codec="snappy")
+        with pytest.raises(ValueError):
+            ConversionOptions(views=("coronal",))
@@ -113,9 +113,15 @@ export class VISoRAPI {
     z: number,
     x: number,
     y: number,
-    channel: number = 0
+    channel: number = 0,
+    render?: { min?: number; max?: number; gamma?: number; transfer?: string }
   ): string {
-    return `${API_BASE_URL}/api/specimens/${specimenId}/image/${view}/${level}/${z}/${x}/${y}?channel=${channel}`
+    let url = `${API_BASE_URL}/api/specimens/${specimenId}/image/${view}/${level}/${z}/${x}/${y}?channel=${channel}`
+    // Server-side contrast: omitted values use the channel's default window
+    for (const [key, value] of Object.entries(render || {})) {
+      if (value !== undefined) url += `&${key}=${encodeURIComponent(value)}`
+    }
+    return url
   }
 
   static getAtlasTileUrl(
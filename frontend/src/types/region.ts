@@ -12,6 +12,7 @@ export interface Region {
   parent_id: number | null
   children: Region[]
   color?: string
+  name_zh?: string | null
   visible?: boolean
   selected?: boolean
 }
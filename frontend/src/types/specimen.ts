@@ -30,6 +30,7 @@ export interface ImageInfo {
   file_size_bytes: number
   pixel_size_um: [number, number, number]
   voxel_count: number
+  intensity_windows?: Record<string, [number, number]> // Default [min, max] per channel
   // Legacy properties for backward compatibility
   file_size?: number
   tile_size?: number
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Build view-optimised copies of a specimen's image and atlas for fast
+sagittal and horizontal tiles.
+
+For each requested view this writes e.g. data/<specimen>/image.sagittal.h5
+next to image.ims: the same voxels transposed so the view's slice axis comes
+first and chunked (1, tile_size, tile_size). The backend picks the stores up
+automatically (setting USE_VIEW_STORES, on by default) and ignores them once
+the source file changes, so rerun this script after replacing data.
+
+Example:
+  python scripts/build_view_stores.py --specimen macaque_brain_RM009
+  python scripts/build_view_stores.py --specimen macaque_brain_RM009 \\
+    --views sagittal --levels 0,1,2 --no-atlas
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add the backend app to Python path
+backend_dir = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(backend_dir))
+
+from app.config import settings
+from app.models.specimen import ViewType
+from app.services.view_store import VIEW_STORE_AXES, build_view_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build view-optimised stores for a specimen.")
+    parser.add_argument("--specimen", type=str, required=True, help="Specimen ID")
+    parser.add_argument("--data-path", type=str, default=None,
+                        help="Data directory (default: DATA_PATH / backend settings)")
+    parser.add_argument("--views", type=str, default="sagittal,horizontal",
+                        help="Comma separated views (default: sagittal,horizontal)")
+    parser.add_argument("--levels", type=str, default=None,
+                        help="Comma separated resolution levels (default: all)")
+    parser.add_argument("--tile-size", type=int, default=settings.default_tile_size,
+                        help="In-plane chunk size, match the served tile size")
+    parser.add_argument("--compression", type=str, default="gzip", choices=["gzip", "none"])
+    parser.add_argument("--max-block-mb", type=int, default=256,
+                        help="Memory budget per streamed block in MB (default 256)")
+    parser.add_argument("--no-atlas", action="store_true", help="Skip atlas.ims")
+    args = parser.parse_args()
+
+    if args.data_path:
+        settings.data_path = Path(args.data_path)
+    views = [ViewType(v.strip()) for v in args.views.split(",") if v.strip()]
+    for view in views:
+        if view not in VIEW_STORE_AXES:
+            parser.error(f"View {view.value} reads contiguous tiles already, no store needed")
+    levels = [int(l) for l in args.levels.split(",")] if args.levels else None
+
+    sources = [settings.get_image_path(args.specimen)]
+    if not args.no_atlas:
+        sources.append(settings.get_atlas_path(args.specimen))
+
+    t0 = time.perf_counter()
+    for source in sources:
+        if not source.exists():
+            print(f"Skipping missing file: {source}")
+            continue
+        for view in views:
+            print(f"Building {view.value} store for {source}")
+            store = build_view_store(
+                source, view, tile_size=args.tile_size, levels=levels,
+                compression=None if args.compression == "none" else args.compression,
+                max_block_bytes=args.max_block_mb * 1024 * 1024,
+                progress=lambda msg: print(f"  {msg}"))
+            print(f"Wrote {store} ({store.stat().st_size / 1e6:.1f} MB)")
+    print(f"Done in {time.perf_counter() - t0:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -51,6 +51,10 @@ def convert_xlsx_to_json(xlsx_path: str, output_path: str) -> None:
             "parent_id": None,  # Will be computed based on hierarchy
             "children": []
         }
+        # Optional Chinese name, searched by the zh locale
+        name_zh = row.get('Structure (zh)')
+        if isinstance(name_zh, str) and name_zh.strip():
+            region["name_zh"] = name_zh.strip()
         regions.append(region)
         
         # Build hierarchy structure
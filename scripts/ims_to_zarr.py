@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Convert a specimen's image.ims / atlas.ims into multiscale OME-Zarr stores.
+
+Writes data/<specimen>/image.zarr next to image.ims with every resolution
+level chunked (1, chunk_depth, tile_size, tile_size) and Blosc compressed,
+plus optional view copies for sagittal/horizontal tiles. The backend serves
+the .zarr stores in place of the .ims files once they exist (setting
+VOLUME_FORMATS). Conversion streams block by block with bounded memory,
+runs blocks in parallel processes and resumes an interrupted run; pass
+--restart to start over.
+
+Example:
+  python scripts/ims_to_zarr.py --specimen macaque_brain_RM009
+  python scripts/ims_to_zarr.py --specimen macaque_brain_RM009 \\
+    --views sagittal,horizontal --codec lz4 --shuffle bit --workers 8
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add the backend app to Python path
+backend_dir = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(backend_dir))
+
+from app.config import settings
+from app.services.zarr_convert import CODECS, SHUFFLES, ConversionOptions, convert_to_zarr
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a specimen's .ims files to OME-Zarr.")
+    parser.add_argument("--specimen", type=str, required=True, help="Specimen ID")
+    parser.add_argument("--data-path", type=str, default=None,
+                        help="Data directory (default: DATA_PATH / backend settings)")
+    parser.add_argument("--views", type=str, default="",
+                        help="Comma separated view copies to add: sagittal,horizontal (default: none)")
+    parser.add_argument("--levels", type=str, default=None,
+                        help="Comma separated resolution levels (default: all)")
+    parser.add_argument("--tile-size", type=int, default=settings.default_tile_size,
+                        help="In-plane chunk size, match the served tile size")
+    parser.add_argument("--chunk-depth", type=int, default=1,
+                        help="Planes per chunk of the main arrays (default 1)")
+    parser.add_argument("--codec", type=str, default="zstd", choices=CODECS)
+    parser.add_argument("--clevel", type=int, default=5, help="Compression level 0-9 (default 5)")
+    parser.add_argument("--shuffle", type=str, default="byte", choices=list(SHUFFLES))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Parallel copy processes (default: CPU count)")
+    parser.add_argument("--max-block-mb", type=int, default=64,
+                        help="Memory budget per block in MB, times 2 per worker (default 64)")
+    parser.add_argument("--report-interval", type=float, default=10.0,
+                        help="Seconds between throughput reports (default 10)")
+    parser.add_argument("--restart", action="store_true",
+                        help="Discard a partial store instead of resuming it")
+    parser.add_argument("--no-atlas", action="store_true", help="Skip atlas.ims")
+    args = parser.parse_args()
+
+    if args.data_path:
+        settings.data_path = Path(args.data_path)
+    try:
+        options = ConversionOptions(
+            tile_size=args.tile_size, chunk_depth=args.chunk_depth,
+            views=tuple(v.strip() for v in args.views.split(",") if v.strip()),
+            levels=tuple(int(l) for l in args.levels.split(",")) if args.levels else None,
+            codec=args.codec, clevel=args.clevel, shuffle=args.shuffle,
+            max_block_bytes=args.max_block_mb * 1024 * 1024)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # The sources are always the .ims files, even when a store already exists
+    specimen_path = settings.get_specimen_path(args.specimen)
+    sources = [specimen_path / "image.ims"]
+    if not args.no_atlas:
+        sources.append(specimen_path / "atlas.ims")
+
+    t0 = time.perf_counter()
+    for source in sources:
+        if not source.exists():
+            print(f"Skipping missing file: {source}")
+            continue
+        print(f"Converting {source}")
+        store = convert_to_zarr(source, options=options, workers=args.workers,
+                                restart=args.restart, report_interval=args.report_interval,
+                                progress=lambda msg: print(f"  {msg}", flush=True))
+        size = sum(p.stat().st_size for p in store.rglob("*") if p.is_file())
+        print(f"Wrote {store} ({size / 1e6:.1f} MB, "
+              f"{size / source.stat().st_size:.0%} of the source size)")
+    print(f"Done in {time.perf_counter() - t0:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
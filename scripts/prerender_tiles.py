@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Pre-render a specimen's tiles to static files that nginx serves directly.
+
+Walks the tile grid of every view and level (every --slice-stride-th slice),
+renders each tile with the backend's own TileService and writes it to
+tiles/<specimen>/..., the layout nginx/nginx.conf looks up with try_files
+before falling back to the backend. Tiles already on disk are skipped, so an
+interrupted run continues where it stopped; when the data or rendering
+settings change the specimen's tiles are discarded and rendered again.
+
+With --archive the tiles are packed into data/<specimen>/tiles.pack instead,
+which the backend memory-maps and serves itself while it is current.
+
+Example:
+  python scripts/prerender_tiles.py --specimen macaque_brain_RM009 --levels 3,4,5
+  python scripts/prerender_tiles.py --specimen macaque_brain_RM009 \\
+    --views coronal --slice-stride 10 --workers 8 --no-atlas
+  python scripts/prerender_tiles.py --specimen macaque_brain_RM009 --levels 4,5 --archive
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add the backend app to Python path
+project_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_dir / "backend"))
+
+from app.config import settings
+from app.models.specimen import ViewType
+from app.services.prerender import pack_specimen, prerender_specimen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render static tiles for a specimen.")
+    parser.add_argument("--specimen", type=str, required=True, help="Specimen ID")
+    parser.add_argument("--data-path", type=str, default=None,
+                        help="Data directory (default: DATA_PATH / backend settings)")
+    parser.add_argument("--output", type=str, default=str(project_dir / "tiles"),
+                        help="Tile root served by nginx (default: tiles/ in the project)")
+    parser.add_argument("--archive", action="store_true",
+                        help="Pack the tiles into one archive served by the backend instead")
+    parser.add_argument("--archive-path", type=str, default=None,
+                        help="Archive to write (default: data/<specimen>/tiles.pack)")
+    parser.add_argument("--views", type=str, default="sagittal,coronal,horizontal",
+                        help="Comma separated views (default: all)")
+    parser.add_argument("--levels", type=str, default=None,
+                        help="Comma separated resolution levels (default: all)")
+    parser.add_argument("--slice-stride", type=int, default=1,
+                        help="Render every n-th slice along each view's slice axis (default 1)")
+    parser.add_argument("--channels", type=str, default=None,
+                        help="Comma separated image channels (default: all)")
+    parser.add_argument("--formats", type=str, default=None,
+                        help="Image tile formats (default: jpeg plus NEGOTIATED_TILE_FORMATS)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Parallel render processes (default: CPU count)")
+    parser.add_argument("--report-interval", type=float, default=10.0,
+                        help="Seconds between progress reports (default 10)")
+    parser.add_argument("--no-atlas", action="store_true", help="Skip atlas tiles")
+    parser.add_argument("--no-image", action="store_true", help="Skip image tiles")
+    args = parser.parse_args()
+
+    if args.data_path:
+        settings.data_path = Path(args.data_path)
+    views = [ViewType(v.strip()) for v in args.views.split(",") if v.strip()]
+    levels = [int(l) for l in args.levels.split(",")] if args.levels else None
+    channels = [int(c) for c in args.channels.split(",")] if args.channels else None
+    formats = [f.strip() for f in args.formats.split(",")] if args.formats else None
+    kinds = [kind for kind, skip in (("image", args.no_image), ("atlas", args.no_atlas)) if not skip]
+
+    t0 = time.perf_counter()
+    try:
+        options = dict(kinds=kinds, views=views, levels=levels, slice_stride=args.slice_stride,
+                       image_formats=formats, channels=channels, workers=args.workers,
+                       report_interval=args.report_interval,
+                       progress=lambda msg: print(msg, flush=True))
+        if args.archive:
+            stats = pack_specimen(args.specimen, args.archive_path, **options)
+        else:
+            stats = prerender_specimen(args.specimen, args.output, **options)
+    except (FileNotFoundError, ValueError) as e:
+        parser.error(str(e))
+    dt = time.perf_counter() - t0
+    print(f"Done in {dt:.1f} s: {stats.rendered} tiles rendered "
+          f"({stats.rendered / max(dt, 1e-9):.0f} tiles/s), {stats.skipped} skipped")
+
+
+if __name__ == "__main__":
+    main()